@@ -0,0 +1,6111 @@
+#!/usr/bin/python
+
+from __future__ import print_function
+
+import sys
+import os
+import re
+import math
+import copy
+import json
+import time
+import glob
+import gzip
+import mmap
+import shutil
+import tempfile
+import grp
+import hashlib
+import itertools
+import signal
+import socket
+import argparse
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import textwrap
+try:
+    from subprocess import check_output
+    from subprocess import Popen, PIPE
+except ImportError:
+    print('\nERROR: Must load at least anaconda_2.3 environment on Ikt\n')
+    sys.exit()
+try:
+    from ConfigParser import RawConfigParser
+except ImportError:
+    from configparser import RawConfigParser
+try:
+    raw_input
+except NameError:
+    raw_input = input
+
+'''
+  Patrick J. Lestrange 2017
+        
+  gaussian-sub.py: Builds a PBS submission script to run
+                   Gaussian on the Hyak Ikt/Mox clusters.
+
+                   Also used as a teaching aid in UW's
+                   CHEM 465/565 Computations in Chemistry.
+
+  Maintained by Andrew Wildman
+'''
+
+#----------------------------------------------------------------------------
+# The commands the prompts depend on are started in the background as soon
+# as the script starts and only waited for when their output is needed.
+# Anything that takes longer than PROBE_TIMEOUT seconds is killed and the
+# script carries on with a fallback.
+PROBE_TIMEOUT = float(os.environ.get('GAUSSIAN_SUB_PROBE_TIMEOUT', 30))
+ENVIRONMENT_PROBES = ['hostname', 'whoami', 'groups']
+INVENTORY_PROBES = ['sinfo -h -e -O "partition,nodes,cpus,memory"',
+                    'hyakalloc 2>/dev/null',
+                    'scontrol show config 2>/dev/null']
+QUEUE_PROBES = ['sinfo -h -O "partition,cpus,memory,statecompact,nodes"',
+                'squeue -h -t PD -O "partition:60,numcpus"']
+
+# Cluster inventory (partitions, node types and allocation limits) is cached
+# on disk so that sinfo and hyakalloc only run once every INVENTORY_TTL
+# seconds. Use --refresh-inventory to throw the cache away.
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME',
+                         os.path.expanduser('~/.cache')), 'gaussian-sub')
+INVENTORY_TTL = int(os.environ.get('GAUSSIAN_SUB_INVENTORY_TTL', 6*60*60))
+
+# --choose ranks every allocation, queue and node type by when a job
+# would start, from the node states and pending jobs right now. Without
+# enough idle nodes the wait is the work queued ahead of the job over
+# the cores of that node type, times QUEUE_TURNOVER hours for the work
+# already running to clear. Nodes in UNUSABLE_STATES don't count.
+QUEUE_TURNOVER = 12
+UNUSABLE_STATES = ['down', 'drain', 'drng', 'fail', 'failg', 'maint',
+                   'resv', 'inval', 'futr', 'unk', 'npc', 'boot', 'pow_dn']
+
+# Input files are checked in a pool of worker processes once there are
+# at least PARALLEL_MIN_FILES per worker.
+MAX_WORKERS = 16
+PARALLEL_MIN_FILES = 50
+
+# Named submission profiles live in an INI file, one section per profile,
+# with the same keys as the long command line options, e.g.
+#   [mox-stf-28core-g16]
+#   queue = batch
+#   allocation = hyak-stf
+#   cores = 28
+#   version = g16.b01
+CONFIG_DIR = os.path.join(os.environ.get('XDG_CONFIG_HOME',
+                          os.path.expanduser('~/.config')), 'gaussian-sub')
+PROFILE_FILE = os.environ.get('GAUSSIAN_SUB_PROFILES',
+                              os.path.join(CONFIG_DIR, 'profiles.ini'))
+PROFILE_KEYS = ['queue', 'allocation', 'nodes', 'scratch', 'email',
+                'cores', 'memory', 'version', 'hours', 'output', 'disk',
+                'stage_out', 'instrument', 'post']
+
+# With --scratch node the Gaussian scratch files go to a directory on the
+# compute node's own disk instead of the shared filesystem. The .chk file
+# is copied there before the run and, along with any other STAGE_OUT
+# extensions, copied back when the job exits.
+NODE_SCRATCH = '${TMPDIR:-/tmp}'
+STAGE_OUT = 'chk'
+
+# With --instrument every run writes <input>.perf.json next to its log:
+# when each phase of the job started and ended, the memory and CPU time
+# of the Gaussian processes every INSTRUMENT_INTERVAL seconds and the
+# time spent in each link.
+INSTRUMENT_INTERVAL = 30
+
+# --post runs 'gaussian-sub.py post' on each input when its job ends,
+# which can also be run by hand on finished jobs. The POST_ACTIONS are:
+#   summary  : <input>.summary.json with the energies, final geometry,
+#              frequencies and termination from the log
+#   prune    : gzip the numbered .log copies the ckpt restarts leave and
+#              remove Gaussian scratch files (Gau-*) nobody has touched
+#              for POST_SCRATCH_DAYS days
+#   formchk  : turn the .chk into a .fchk
+#   compress : gzip the .chk (or the .fchk)
+# Only the summary is made for a run that didn't finish normally.
+POST_ACTIONS = ['summary', 'prune', 'formchk', 'compress']
+POST_DEFAULT = 'summary,prune'
+POST_SCRATCH_DAYS = 3
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# --spread shares the jobs out over all of the user's allocations and
+# their ckpt accounts. The usage and limits of each account come from
+# sshare and squeue, or from the JSON file in GAUSSIAN_SUB_ACCOUNTING
+# instead (see FakeAccounting). Jobs that were written or submitted but
+# haven't started are kept in BUDGET_FILE so they count against their
+# account before Slurm charges for them, scripts that were never
+# submitted only for BUDGET_HOLD hours.
+ACCOUNTING = os.environ.get('GAUSSIAN_SUB_ACCOUNTING')
+BUDGET_FILE = os.path.join(CACHE_DIR, 'budget.json')
+BUDGET_HOLD = 24
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# --submit hands the scripts to sbatch from SUBMIT_WORKERS threads, at no
+# more than SUBMIT_RATE calls a second between them so the controller's
+# RPC rate limit isn't hit. sbatch errors matching TRANSIENT_ERRORS are
+# retried up to SUBMIT_RETRIES times, waiting SUBMIT_BACKOFF seconds and
+# twice as long after every attempt. The controller may have queued the
+# job before an error matching UNCERTAIN_ERRORS, so squeue is asked for
+# the job's --comment token before it is submitted again. Every job ID
+# goes in LEDGER_FILE, one JSON record per line.
+SUBMIT_WORKERS = 4
+SUBMIT_RATE = 5.0
+SUBMIT_RETRIES = 5
+SUBMIT_BACKOFF = 2.0
+TRANSIENT_ERRORS = (r'temporarily|timed out|try again|unable to contact'
+                    r'|connection refused|socket|transport endpoint'
+                    r'|slurm_persist_conn|rpc|too many')
+UNCERTAIN_ERRORS = r'timed out|transport endpoint'
+LEDGER_FILE = os.environ.get('GAUSSIAN_SUB_LEDGER',
+                             os.path.join(CACHE_DIR, 'submissions.jsonl'))
+
+# 'gaussian-sub.py status' shows the ledger jobs from the last STATUS_DAYS
+# days. Each .log is read from the offset kept in STATUS_FILE, so only
+# what Gaussian wrote since the last look is scanned, STATUS_BLOCK bytes
+# at a time. PROGRESS has the (field, marker, pattern) to look for, only
+# the last marker in the new text matters.
+STATUS_FILE = os.path.join(CACHE_DIR, 'status.json')
+STATUS_DAYS = 3
+STATUS_BLOCK = 16*1024*1024
+PROGRESS = [('scf',    ' Cycle ',     r' Cycle\s+(\d+)'),
+            ('step',   'Step number', r'Step number\s+(\d+)'),
+            ('energy', 'SCF Done:',   r'SCF Done:\s+E\(\S+\)\s+=\s+(\S+)')]
+
+# 'gaussian-sub.py workflow file.json' submits a chain of steps in one go,
+# each step waiting on the ones before it with --dependency=afterok. The
+# file gives WORKFLOW_KEYS that apply to every step and a list of steps,
+# each with a name, its inputs (names or glob patterns) and any of the
+# WORKFLOW_KEYS to change for that step. A step without 'after' waits for
+# the steps that write the checkpoints its inputs read:
+#
+#   {"allocation": "hyak-stf", "cores": 28, "hours": 4,
+#    "steps": [{"name": "opt",  "inputs": ["water_opt.com"]},
+#              {"name": "freq", "inputs": ["water_freq.com"]},
+#              {"name": "td",   "inputs": "water_td_*.com", "array": true,
+#               "hours": 2, "after": ["opt"]}]}
+WORKFLOW_KEYS = ['allocation', 'queue', 'nodes', 'cores', 'memory', 'hours',
+                 'version', 'email', 'scratch', 'disk', 'stage_out', 'array',
+                 'pack', 'slots', 'throttle', 'max_array_size',
+                 'instrument', 'post']
+
+# 'gaussian-sub.py generate' fills GENERATE_FIELDs like {geometry} in a
+# template, naming the inputs GENERATED_NAME and their job arrays
+# GENERATED_PART from the prefix and a count. Inputs are written and put
+# in arrays GENERATE_BATCH at a time.
+GENERATE_FIELD = r'\{(\w+)\}'
+GENERATE_BATCH = 5000
+GENERATED_NAME = '%s_%06d'
+GENERATED_PART = '%s_part%03d.sh'
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# What the input parser recognizes in a route section. Anything that is
+# not a method or basis set ends up in GaussianInput.keywords.
+JOB_TYPES = ['opt', 'freq', 'irc', 'scan', 'td', 'stable', 'nmr', 'polar',
+             'force']
+METHOD_PATTERN = (r'^(r|u|ro)?(hf|b3lyp|b3p86|b3pw91|blyp|bp86|pbe\w*|pw91\w*'
+                  r'|m0\d\w*|m11\w*|mn1\d\w*|wb97\w*|cam-b3lyp|lc-\w+'
+                  r'|b2plyp\w*|hse\w*|tpss\w*|x3lyp|apfd|b97\w*|svwn\w*'
+                  r'|mp[2-5]\w*|ccsd\w*|ccd|qcisd\w*|bd\w*|cis\w*|sac-ci'
+                  r'|eom\w*|cas\w*|am1|pm3\w*|pm6|pm7|mndo|indo|cndo|zindo'
+                  r'|dftb\w*|uff|dreiding|amber|g[1-4]\w*|cbs-\w+|w1\w*)'
+                  r'(\(.*\))?$')
+BASIS_PATTERN = (r'^(sto-\dg|\d-\d+\+*g.*|(aug-|jun-|jul-|may-)?cc-p\w*'
+                 r'|def2-?\w+|lanl2\w*|sdd\w*|gen|genecp|midix\w*|dgdzvp\w*'
+                 r'|ugbs\w*|d95\w*|shc|cep-\w+|tzvp|svp|qzvp)(\(.*\))?$')
+ELEMENTS = ('X H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V '
+            'Cr Mn Fe Co Ni Cu Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru '
+            'Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba La Ce Pr Nd Pm Sm Eu Gd Tb '
+            'Dy Ho Er Tm Yb Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At '
+            'Rn').split()
+
+# Job types that Gaussian can restart from the checkpoint file with their
+# own Restart option.
+RESTART_JOBS = ['opt', 'irc', 'freq']
+
+# Input files parsed so far in this run, by path.
+parsed_inputs = {}
+
+# SCRIPT_INDEX records of the inputs in this run, by path.
+input_records = {}
+
+# Background commands started so far in this run, by command.
+probes = {}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# Resource estimates. Methods are put in the first class whose match
+# pattern fits, and for that class
+#   %mem  = max(min_gb, words * NBasis**power * 8 bytes) * job factors
+#   disk  = max(min_disk_gb, disk_words * NBasis**disk_power * 8 bytes)
+#   cores = NBasis / bf_per_core
+# Classes and job factors can be added or overridden in CALIBRATION_FILE:
+#   [dlpno]
+#   match = ^dlpno
+#   words = 0.5
+#   power = 3
+#   min_gb = 8
+#   bf_per_core = 30
+#   disk_words = 0.1
+#   disk_power = 4
+#   min_disk_gb = 20
+#   linda = no
+#
+#   [jobs]
+#   freq = 4
+CALIBRATION_FILE = os.environ.get('GAUSSIAN_SUB_CALIBRATION',
+                                  os.path.join(CONFIG_DIR, 'calibration.ini'))
+CALIBRATION = [
+    ('semiempirical', {'match': r'^(am1|pm\d|mndo|indo|cndo|zindo|dftb)',
+                       'words': 0, 'power': 2, 'min_gb': 1,
+                       'disk_words': 0, 'disk_power': 2, 'min_disk_gb': 1,
+                       'bf_per_core': 200, 'linda': False}),
+    ('coupled',       {'match': r'^(r|u|ro)?(ccsd|ccd|qcisd|bd|eom|sac-ci)',
+                       'words': 0.05, 'power': 4, 'min_gb': 8,
+                       'disk_words': 0.5, 'disk_power': 4, 'min_disk_gb': 50,
+                       'bf_per_core': 15, 'linda': False}),
+    ('mp2',           {'match': r'^(r|u|ro)?mp[2-5]',
+                       'words': 1, 'power': 3, 'min_gb': 4,
+                       'disk_words': 0.125, 'disk_power': 4, 'min_disk_gb': 20,
+                       'bf_per_core': 20, 'linda': True}),
+    ('scf',           {'match': r'.',
+                       'words': 16, 'power': 2, 'min_gb': 2,
+                       'disk_words': 64, 'disk_power': 2, 'min_disk_gb': 10,
+                       'bf_per_core': 25, 'linda': True}),
+]
+JOB_MEMORY_FACTORS = {'freq': 3.0, 'td': 2.0, 'nmr': 2.0, 'polar': 2.0}
+
+# Basis functions on (H-He, Li-Ne, Na-Ar, K and beyond) for basis sets
+# that aren't built up from their name like the Pople ones.
+BASIS_FUNCTIONS = {
+    'sto-3g'     : (1, 5, 9, 18),
+    'cc-pvdz'    : (5, 14, 18, 32),    'aug-cc-pvdz': (9, 23, 27, 41),
+    'cc-pvtz'    : (14, 30, 34, 59),   'aug-cc-pvtz': (23, 46, 50, 75),
+    'cc-pvqz'    : (30, 55, 59, 91),   'aug-cc-pvqz': (46, 80, 84, 116),
+    'def2svp'    : (5, 14, 18, 31),    'def2-svp'   : (5, 14, 18, 31),
+    'def2tzvp'   : (6, 31, 37, 67),    'def2-tzvp'  : (6, 31, 37, 67),
+    'def2tzvpp'  : (14, 31, 37, 67),   'def2-tzvpp' : (14, 31, 37, 67),
+    'def2qzvp'   : (30, 57, 64, 111),  'def2-qzvp'  : (30, 57, 64, 111),
+    'lanl2dz'    : (2, 9, 8, 18),
+}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# Walltime predictions. Every generated job is recorded in HISTORY_FILE
+# with the features of its input, and sacct fills in how long it took.
+# Records that never get a runtime are dropped after HISTORY_DAYS.
+HISTORY_FILE = os.path.join(CACHE_DIR, 'history.json')
+HISTORY_DAYS = 60
+PARALLEL_EXPONENT = 0.8
+WALLTIME_Z = 1.65
+WALLTIME_MARGIN = 1.2
+
+# 'gaussian-sub.py scale-study input.com' runs a copy of the input cut
+# down to SCALING_CYCLES SCF cycles on a sweep of core and Linda node
+# counts. Their timings are fitted to
+#   T = a + b/(cores*nodes) + c*(nodes-1)
+# and the fastest configuration that still runs at SCALING_EFFICIENCY
+# of the speed of one core is kept in SCALING_FILE. It is recommended
+# for later inputs with the same class of method and NBasis band, split
+# at SCALING_BANDS.
+SCALING_FILE = os.path.join(CONFIG_DIR, 'scaling.json')
+SCALING_CYCLES = 3
+SCALING_EFFICIENCY = 0.6
+SCALING_BANDS = [100, 250, 500, 1000, 2000]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+# Inputs that have already been run are not submitted again. Each input
+# that a script is written for goes in RESULT_INDEX under a hash of what
+# it calculates, with coordinates rounded to RESULT_DIGITS decimals and
+# without the COSMETIC_LINK0 lines, which don't change the result.
+RESULT_INDEX = os.path.join(CACHE_DIR, 'results.json')
+RESULT_DIGITS = 6
+COSMETIC_LINK0 = ['mem', 'nprocshared', 'nproc', 'cpu', 'gpucpu',
+                  'lindaworkers', 'nprocl', 'usessh', 'chk', 'rwf', 'int',
+                  'd2e', 'save', 'nosave', 'errorsave']
+
+# Running over the same inputs again only reparses, checks and writes
+# scripts for the ones that are new or have changed. SCRIPT_INDEX has
+# the content hash of each input, what was estimated from it and the
+# settings, script and job ID it was last written with. Changing the
+# calibration or this script starts the index over.
+SCRIPT_INDEX = os.path.join(CACHE_DIR, 'scripts.json')
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_command(command, probe=None):
+    """Run a shell command and return its standard output as text.
+
+    When a probe dict is given the process is kept in it, so that it
+    can be killed from another thread.
+    """
+
+    if probe is None:
+        process = Popen(command,stdout=PIPE,shell=True)
+    else:
+        # In its own process group so a hung command can be killed
+        # along with everything it started.
+        process = Popen(command,stdout=PIPE,shell=True,preexec_fn=os.setsid)
+        probe['process'] = process
+    output = process.communicate()[0]
+    if not isinstance(output, str):
+        output = output.decode('utf-8', 'replace')
+    return output
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def start_probe(command):
+    """Start a shell command in the background, unless it already is."""
+
+    if command in probes: return
+    probe = {'output': None}
+    def read():
+        probe['output'] = run_command(command, probe)
+    probe['thread'] = threading.Thread(target=read)
+    probe['thread'].daemon = True
+    probe['thread'].start()
+    probes[command] = probe
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def probe_output(command):
+    """Wait for a background command and return its standard output.
+
+    The command is started if it wasn't already. Returns None, after
+    killing the command, if it doesn't finish within PROBE_TIMEOUT.
+    """
+
+    start_probe(command)
+    probe = probes[command]
+    probe['thread'].join(PROBE_TIMEOUT)
+    if probe['thread'].is_alive():
+        try:
+            os.killpg(probe['process'].pid, signal.SIGKILL)
+        except (KeyError, OSError):
+            pass
+        print('WARNING: "%s" did not answer within %g seconds'
+              % (command, PROBE_TIMEOUT))
+        return None
+    return probe['output']
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def inventory_is_fresh(gen):
+    """Whether there is a cached inventory younger than INVENTORY_TTL."""
+
+    try:
+        with open(inventory_path(gen)) as f:
+            created = json.load(f)['created']
+    except (IOError, OSError, ValueError, KeyError):
+        return False
+    return 0 <= time.time() - created < INVENTORY_TTL
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_json(path, data):
+    """Atomically write data as JSON, creating the directory if needed."""
+
+    write_text(path, json.dumps(data))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_text(path, text):
+    """Write a file through a temporary file and a rename.
+
+    Anything reading the file, sbatch included, sees either the old or
+    the new contents, never half of it. The directory is created if
+    needed and the file gets the usual permissions for a new file.
+    """
+
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(tmp, 0o666 & ~mask)
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_output(path, text, dry_run=False):
+    """Write one of the generated files, or print it for a dry run."""
+
+    if dry_run:
+        sys.stdout.write('==> %s <==\n%s\n' % (path, text))
+    else:
+        write_text(path, text)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def inventory_path(gen):
+    """Location of the cached inventory for this cluster."""
+
+    return os.path.join(CACHE_DIR, 'inventory-%s.json' % gen)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def fetch_inventory():
+    """Query sinfo and hyakalloc once for everything the prompts need."""
+
+    inventory = {'created'    : time.time(),
+                 'partitions' : [],
+                 'node_types' : {},
+                 'allocations': []}
+
+    outputs = [probe_output(command) for command in INVENTORY_PROBES]
+    nodes_output, allocation_output, config_output = outputs
+    # Something hung, don't keep what we got for INVENTORY_TTL
+    if None in outputs:
+        inventory['partial'] = True
+
+    # One line per partition and node configuration:
+    #   PARTITION  NODES  CPUS  MEMORY(MB)
+    for line in (nodes_output or '').splitlines():
+        specs = line.split()
+        if len(specs) != 4 or not specs[1].isdigit(): continue
+        partition = specs[0].rstrip('*')
+        nodes, cpus = int(specs[1]), int(specs[2])
+        memory = int(specs[3].rstrip('+'))
+        if partition not in inventory['partitions']:
+            inventory['partitions'].append(partition)
+        inventory['node_types'].setdefault(partition, []).append(
+            [nodes, cpus, memory])
+
+    # hyakalloc prints one line per allocation; the node count and
+    # memory per node are the second and third columns.
+    for line in (allocation_output or '').splitlines():
+        specs = line.split()
+        if len(specs) >= 3 and specs[1].isdigit():
+            inventory['allocations'].append(specs)
+
+    # Largest job array the controller will accept.
+    for line in (config_output or '').splitlines():
+        specs = line.split('=')
+        if specs[0].strip() == 'MaxArraySize' and specs[-1].strip().isdigit():
+            inventory['max_array_size'] = int(specs[-1])
+
+    return inventory
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def load_inventory(gen, refresh=False):
+    """Return the cluster inventory, from the cache while it is fresh."""
+
+    path = inventory_path(gen)
+    if not refresh and inventory_is_fresh(gen):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    inventory = fetch_inventory()
+    # Don't cache a failed query, otherwise every run for the next
+    # INVENTORY_TTL seconds would see an empty cluster.
+    if inventory['node_types'] and not inventory.get('partial'):
+        try:
+            write_json(path, inventory)
+        except (IOError, OSError):
+            pass
+    return inventory
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def invalidate_inventory(gen):
+    """Remove the cached inventory so the next run queries Slurm again."""
+
+    try:
+        os.remove(inventory_path(gen))
+    except OSError:
+        pass
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def allocation_limits(inventory, name):
+    """Number of nodes and smallest memory (Gb) in an allocation.
+
+    Without hyakalloc this falls back on the nodes in the partition.
+    """
+
+    for specs in inventory['allocations']:
+        if name in ' '.join(specs):
+            return int(specs[1]), int(specs[2][:-1])
+    if not inventory['allocations']:
+        node_types = inventory['node_types'].get(name, [])
+        if node_types:
+            return (sum(nodes for nodes, cpus, memory in node_types),
+                    min(memory for nodes, cpus, memory in node_types)//1000)
+    return 0, 0
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def nodes_per_core_count(inventory, partition):
+    """Map the number of cores on a node type to how many such nodes exist."""
+
+    nodes_per_cpu = {}
+    for nodes, cpus, memory in inventory['node_types'].get(partition, []):
+        nodes_per_cpu[cpus] = nodes_per_cpu.get(cpus, 0) + nodes
+    return nodes_per_cpu
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def memory_per_node(inventory, partition, n_cores):
+    """Memory (Mb) of each node type in a partition with n_cores cores."""
+
+    return [memory for nodes, cpus, memory in
+            inventory['node_types'].get(partition, []) if cpus == n_cores]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def user_allocations(groups, partitions):
+    """The hyak-* groups of the user that have nodes to run on."""
+
+    allocs = []
+    for group in groups:
+        if 'hyak-' in group:
+            if 'test' not in group and 'highmem' not in group:
+                if group.split('-')[1] in partitions or group.split('-')[1] == 'genpool':
+                    allocs.append(group)
+    return allocs
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def fetch_queue_state():
+    """Node states and pending work right now, from one sinfo and squeue.
+
+    Returns {partition: {'types': {(cpus, memory): {state: nodes}},
+                         'pending': cpus of the pending jobs}}.
+    This is never cached, it is only good for the next few minutes.
+    """
+
+    nodes_command, pending_command = QUEUE_PROBES
+
+    state = {}
+    #   PARTITION  CPUS  MEMORY(MB)  STATE  NODES
+    for line in (probe_output(nodes_command) or '').splitlines():
+        specs = line.split()
+        if len(specs) != 5 or not specs[4].isdigit(): continue
+        partition = specs[0].rstrip('*')
+        node_type = (int(specs[1]), int(specs[2].rstrip('+')))
+        node_state = specs[3].rstrip('*~#!%$@^-')
+        types = state.setdefault(partition, {'types': {}, 'pending': 0})
+        states = types['types'].setdefault(node_type, {})
+        states[node_state] = states.get(node_state, 0) + int(specs[4])
+
+    # Jobs that can run on several partitions count against all of them
+    for line in (probe_output(pending_command) or '').splitlines():
+        specs = line.split()
+        if len(specs) != 2 or not specs[1].isdigit(): continue
+        for partition in specs[0].split(','):
+            if partition in state:
+                state[partition]['pending'] += int(specs[1])
+    return state
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def expected_start(partition_state, node_type, nodes):
+    """Hours until a job on nodes nodes of node_type is expected to start."""
+
+    types = partition_state['types']
+    usable = dict((key, sum(n for s, n in states.items()
+                            if s not in UNUSABLE_STATES))
+                  for key, states in types.items())
+    type_cpus = usable[node_type]*node_type[0]
+    total_cpus = sum(n*key[0] for key, n in usable.items())
+    if type_cpus == 0:
+        return None
+
+    idle = types[node_type].get('idle', 0)
+    pending = partition_state['pending']
+    if idle >= nodes and pending == 0:
+        return 0.0
+    # Pending work is shared out over the node types by their size
+    ahead = pending*float(type_cpus)/total_cpus
+    backlog = ahead + nodes*node_type[0] - idle*node_type[0]
+    return max(0.0, backlog) / type_cpus * QUEUE_TURNOVER
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def choose_submission(estimates, inventory, allocations,
+                      queues=('batch', 'ckpt'), cores=None, state=None):
+    """Rank where to run the inputs by how soon they would start.
+
+    Every allocation and queue is tried with each node type that has
+    the memory the most demanding input needs and enough cores, on one
+    node or, when the method can use Linda, several. Returns a list of
+    dicts with allocation, queue, partition, cores, memory (Mb), nodes,
+    idle, pending and start (hours), soonest first. Batch is preferred
+    over ckpt and smaller nodes over bigger ones when the start is the
+    same. estimates are estimate_steps() for each input.
+    """
+
+    if state is None:
+        state = fetch_queue_state()
+    choices = []
+    for allocation in allocations:
+        for queue in queues:
+            partition = allocation.split('-')[1]
+            if partition == 'genpool': partition = 'hpc'
+            if queue == 'ckpt': partition = 'ckpt'
+            if partition not in state: continue
+            need = recommend_from_estimates(estimates, inventory,
+                                            partition)
+            linda = all(estimate['linda'] for estimate in need['estimates'])
+            for node_type in sorted(state[partition]['types']):
+                n_cpus, memory = node_type
+                if memory//1000 - 10 < need['memory']: continue
+                if cores and n_cpus != cores: continue
+                nodes = 1
+                if n_cpus < need['nprocshared']:
+                    if not linda: continue
+                    nodes = int(math.ceil(float(need['nprocshared']) / n_cpus))
+                    if nodes > 4: continue
+                start = expected_start(state[partition], node_type, nodes)
+                if start is None: continue
+                choices.append({
+                    'allocation': allocation,
+                    'queue'     : queue,
+                    'partition' : partition,
+                    'cores'     : n_cpus,
+                    'memory'    : memory,
+                    'nodes'     : nodes,
+                    'idle'      : state[partition]['types'][node_type].get(
+                                      'idle', 0),
+                    'pending'   : state[partition]['pending'],
+                    'start'     : start})
+    choices.sort(key=lambda c: (round(c['start'], 2), c['queue'] != 'batch',
+                                c['cores']*c['nodes'], c['memory']))
+    return choices
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_choices(choices, max_rows=10):
+    """Show the best places to run, soonest first."""
+
+    print('%-16s %-6s %5s %5s %7s %6s %9s %10s' % ('Allocation', 'Queue',
+          'Cores', 'Nodes', 'Mem(Gb)', 'Idle', 'Pending', 'Start(hr)'))
+    for choice in choices[:max_rows]:
+        print('%-16s %-6s %5d %5d %7d %6d %9d %10.1f' % (choice['allocation'],
+              choice['queue'], choice['cores'], choice['nodes'],
+              choice['memory']//1000, choice['idle'], choice['pending'],
+              choice['start']))
+    print()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class BudgetError(Exception):
+    """Jobs that don't fit in what is left of the user's allocations."""
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def slurm_account(allocation, queue):
+    """The partition and account for a job on allocation and queue."""
+
+    short_name = re.split('-', allocation)[1]
+    partition, account = short_name, short_name
+    if account == 'genpool':
+        partition = 'hpc'
+    if queue == 'ckpt':
+        partition = queue
+        account = short_name+'-ckpt'
+    return partition, account
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def tres_cpu(tres):
+    """The cpu value of a TRES list like 'cpu=960,mem=4000G', or None."""
+
+    match = re.search(r'(?:^|,)cpu=(\d+)', tres or '')
+    return int(match.group(1)) if match else None
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class SlurmAccounting(object):
+    """Usage and limits of the Slurm accounts, from sshare and squeue.
+
+    sshare gives the core-minute limit of each account (GrpTRESMins),
+    the decayed usage Slurm checks it against (GrpTRESRaw) and what the
+    running jobs still have to use (TRESRunMins). squeue gives the cores
+    held by the running jobs of each account and the user's jobs that
+    haven't started yet.
+    """
+
+    def usage(self, accounts):
+        """{account: {'limit', 'used', 'running', 'cores'}}, in core-hours.
+
+        limit is None for an account without a core-hour limit.
+        """
+
+        names = ','.join(accounts)
+        share_command = ('sshare -h -P -A %s -o '
+                         'Account,User,GrpTRESMins,GrpTRESRaw,TRESRunMins '
+                         '2>/dev/null'
+                         % names)
+        cores_command = 'squeue -h -t R -A %s -o "%%a %%C"' % names
+        start_probe(share_command)
+        start_probe(cores_command)
+
+        usage = dict((account, {'limit': None, 'used': 0.0, 'running': 0.0,
+                                'cores': 0}) for account in accounts)
+        # The account's own line is the one without a user
+        for line in (probe_output(share_command) or '').splitlines():
+            specs = line.split('|')
+            if len(specs) != 5 or specs[1].strip(): continue
+            account = specs[0].strip()
+            if account not in usage: continue
+            limit = tres_cpu(specs[2])
+            if limit is not None:
+                usage[account]['limit'] = limit/60.0
+            usage[account]['used'] = (tres_cpu(specs[3]) or 0)/60.0
+            usage[account]['running'] = (tres_cpu(specs[4]) or 0)/60.0
+        for line in (probe_output(cores_command) or '').splitlines():
+            specs = line.split()
+            if len(specs) == 2 and specs[0] in usage and specs[1].isdigit():
+                usage[specs[0]]['cores'] += int(specs[1])
+        return usage
+
+    def pending(self):
+        """Job IDs of the user's pending jobs, None if squeue didn't say."""
+
+        output = probe_output('squeue -h -t PD -u %s -o %%i' % user_name())
+        if output is None: return None
+        # Array jobs show up as 123_[4-9]
+        return set(line.strip().split('_')[0]
+                   for line in output.splitlines() if line.strip())
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class FakeAccounting(object):
+    """Usage and limits from a JSON file instead of Slurm, e.g.
+
+        {"accounts": {"stf": {"limit": 50000, "used": 1200,
+                              "running": 300, "cores": 56},
+                      "stf-ckpt": {"used": 40}},
+         "pending": ["123456"]}
+
+    in core-hours, with the same meaning as for SlurmAccounting. Point
+    GAUSSIAN_SUB_ACCOUNTING at one to try --spread without a cluster.
+    """
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.data = json.load(f)
+
+    def usage(self, accounts):
+        usage = {}
+        for account in accounts:
+            values = self.data.get('accounts', {}).get(account, {})
+            usage[account] = {'limit'  : values.get('limit'),
+                              'used'   : values.get('used', 0.0),
+                              'running': values.get('running', 0.0),
+                              'cores'  : values.get('cores', 0)}
+        return usage
+
+    def pending(self):
+        return set(str(job_id) for job_id in self.data.get('pending', []))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def accounting_backend():
+    """Where the account usage comes from, see ACCOUNTING."""
+
+    if ACCOUNTING:
+        return FakeAccounting(ACCOUNTING)
+    return SlurmAccounting()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_budget_ledger(pending=None):
+    """The jobs in BUDGET_FILE that haven't started yet.
+
+    pending is the set of job IDs still pending, the entries of any
+    other job are dropped, or all of them are kept when it is None.
+    Scripts that were written but not submitted are kept BUDGET_HOLD
+    hours.
+    """
+
+    try:
+        with open(BUDGET_FILE) as f:
+            entries = json.load(f)
+    except (IOError, OSError, ValueError):
+        return []
+    now = time.time()
+    kept = []
+    for entry in entries:
+        if entry.get('job_id'):
+            if pending is not None and entry['job_id'] not in pending:
+                continue
+        elif now - entry['added'] > BUDGET_HOLD*3600:
+            continue
+        kept.append(entry)
+    return kept
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def queue_budget(spec, scripts, results=None):
+    """Add the jobs just written for spec to BUDGET_FILE.
+
+    results are the (script, job ID, error) from submit_scripts(), the
+    scripts sbatch refused are left out. Without them the scripts count
+    against the account for BUDGET_HOLD hours.
+    """
+
+    job_ids = dict((os.path.abspath(script), job_id)
+                   for script, job_id, error in results or [])
+    partition, account = slurm_account(spec.allocation, spec.queue)
+    cores = spec.cores*spec.nodes
+    sizes = [1]*len(scripts)
+    if spec.array:
+        sizes = [min(spec.max_array_size, len(spec.inputs)-offset)
+                 for offset in range(0, len(spec.inputs),
+                                     spec.max_array_size)]
+    elif spec.pack:
+        sizes = [1]
+
+    entries = read_budget_ledger()
+    for script, size in zip(scripts, sizes):
+        path = os.path.abspath(spec.path(script))
+        if results is not None and job_ids.get(path) is None:
+            continue
+        entries.append({'account'   : account,
+                        'queue'     : spec.queue,
+                        'cores'     : cores*min(size, spec.throttle or size),
+                        'core_hours': cores*size*spec.hours,
+                        'job_id'    : job_ids.get(path),
+                        'script'    : path,
+                        'added'     : time.time()})
+    try:
+        write_json(BUDGET_FILE, entries)
+    except (IOError, OSError):
+        pass
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def account_budgets(allocations, inventory, cores=1, memory=0,
+                    backend=None, state=None):
+    """What is left of every account the user can run a job on.
+
+    Each allocation has a batch account, on its own nodes, and a ckpt
+    account, on the idle nodes of the whole cluster. Only accounts with
+    nodes of at least cores cores and memory Gb are returned, as dicts
+    with allocation, queue, account, pool (the cores it shares with
+    other accounts), capacity and free (cores), and limit, used,
+    running, queued and left (core-hours, limit and left are None
+    without a limit). Jobs written or submitted but not started yet
+    are queued.
+    """
+
+    if backend is None:
+        backend = accounting_backend()
+    if state is None:
+        state = fetch_queue_state()
+    pending = backend.pending()
+    queued = read_budget_ledger(pending)
+    if pending is not None:
+        try:
+            write_json(BUDGET_FILE, queued)
+        except (IOError, OSError):
+            pass
+
+    budgets = []
+    for allocation in allocations:
+        for queue in ('batch', 'ckpt'):
+            partition, account = slurm_account(allocation, queue)
+            fits = [(nodes, cpus) for nodes, cpus, mem in
+                    inventory['node_types'].get(partition, [])
+                    if cpus >= cores and mem//1000 >= memory]
+            if not fits: continue
+            if queue == 'batch':
+                pool = account
+                capacity = allocation_limits(inventory, partition)[0] * \
+                           max(cpus for nodes, cpus in fits)
+            else:
+                pool = 'ckpt'
+                types = state.get(partition, {}).get('types', {})
+                capacity = sum(states.get('idle', 0)*cpus
+                               for (cpus, mem), states in types.items()
+                               if cpus >= cores and mem//1000 >= memory)
+            budgets.append({'allocation': allocation,
+                            'queue'     : queue,
+                            'account'   : account,
+                            'pool'      : pool,
+                            'capacity'  : capacity,
+                            'queued'    : sum(entry['core_hours']
+                                              for entry in queued
+                                              if entry['account'] == account)})
+    if not budgets:
+        return budgets
+
+    usage = backend.usage([budget['account'] for budget in budgets])
+    for budget in budgets:
+        budget.update(usage[budget['account']])
+        budget['free'] = budget['capacity'] - sum(
+            entry['cores'] for entry in queued
+            if entry['account'] == budget['account'] or
+               budget['pool'] == 'ckpt' and entry['queue'] == 'ckpt')
+        if budget['pool'] != 'ckpt':
+            budget['free'] -= budget['cores']
+        budget['left'] = None
+        if budget['limit'] is not None:
+            budget['left'] = budget['limit'] - budget['used'] - \
+                             budget['running'] - budget['queued']
+    return budgets
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def spread_jobs(spec, budgets, outputs=None):
+    """Share the inputs of spec out over the accounts in budgets.
+
+    Each job goes to the account with the most free cores, batch before
+    ckpt, or once nothing is free to the one with the least work queued
+    for its size, but never to one without the core-hours for it left.
+    Returns a list of (spec, outputs), one for each account used, with
+    outputs the script names for that spec like write_jobs() takes.
+    Raises BudgetError if the jobs don't all fit.
+    """
+
+    if spec.pack:
+        raise BudgetError('--spread shares out separate jobs, use --array '
+                          'instead of --pack')
+    if not budgets:
+        raise BudgetError('None of your allocations has nodes with %d cores '
+                          'and %d Gb of memory' % (spec.cores, spec.memory))
+    cores = spec.cores*spec.nodes
+    hours = cores*spec.hours
+    free = dict((budget['pool'], budget['free']) for budget in budgets)
+    queued = [budget['queued'] for budget in budgets]
+    left = [budget['left'] for budget in budgets]
+    shares = [[] for budget in budgets]
+
+    def backlog(k):
+        return (budgets[k]['capacity'] <= 0,
+                queued[k]/max(budgets[k]['capacity'], 1))
+
+    for i in range(len(spec.inputs)):
+        usable = [k for k in range(len(budgets))
+                  if left[k] is None or left[k] >= hours]
+        if not usable:
+            raise BudgetError('Only %d of the %d jobs fit in the core-hours '
+                              'left on %s' % (i, len(spec.inputs),
+                              ', '.join(b['account'] for b in budgets)))
+        idle = [k for k in usable if free[budgets[k]['pool']] >= cores]
+        if idle:
+            best = min(idle, key=lambda k: (budgets[k]['queue'] != 'batch',
+                                            -free[budgets[k]['pool']]))
+        else:
+            best = min(usable, key=backlog)
+        free[budgets[best]['pool']] -= cores
+        queued[best] += hours
+        if left[best] is not None:
+            left[best] -= hours
+        shares[best].append(i)
+
+    per_input = outputs and len(outputs) == len(spec.inputs)
+    used = [k for k in range(len(budgets)) if shares[k]]
+    jobs = []
+    for k in used:
+        share = copy.copy(spec)
+        share.allocation = budgets[k]['allocation']
+        share.queue = budgets[k]['queue']
+        share.inputs = [spec.inputs[i] for i in shares[k]]
+        share_outputs = outputs
+        if per_input:
+            share_outputs = [outputs[i] for i in shares[k]]
+        elif spec.array and len(used) > 1:
+            share_outputs = ['%s_%s.sh' % (array_name(spec, outputs[0]
+                             if outputs else None), budgets[k]['account'])]
+        jobs.append((share, share_outputs))
+    return jobs
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_budgets(budgets):
+    """One line for every account the user can run on."""
+
+    print('%-16s %-6s %-12s %11s %11s %11s %11s %11s' % ('Allocation',
+          'Queue', 'Account', 'Free/Cores', 'Limit(hr)', 'Used(hr)',
+          'Queued(hr)', 'Left(hr)'))
+    for budget in budgets:
+        print('%-16s %-6s %-12s %11s %11s %11.0f %11.0f %11s' % (
+              budget['allocation'], budget['queue'], budget['account'],
+              '%d/%d' % (max(budget['free'], 0), budget['capacity']),
+              '-' if budget['limit'] is None else '%.0f' % budget['limit'],
+              budget['used']+budget['running'], budget['queued'],
+              '-' if budget['left'] is None else '%.0f' % budget['left']))
+    print()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_budget(argv):
+    """gaussian-sub.py budget [--cores N] [--memory GB] [--json]"""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py budget',
+        description='Free cores and core-hours left on each of your '
+                    'allocations and their ckpt accounts')
+    parser.add_argument('-c', '--cores', type=int, default=1,
+        help='only count nodes with at least this many cores')
+    parser.add_argument('-m', '--memory', type=int, default=0,
+        help='only count nodes with at least this much memory (Gb)')
+    parser.add_argument('--json', action='store_true',
+        help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    start_probe('hostname')
+    start_probe('groups')
+    for command in QUEUE_PROBES:
+        start_probe(command)
+    host = probe_output('hostname') or socket.gethostname()
+    inventory = load_inventory('mox' if 'mox' in host else 'ikt')
+    allocations = user_allocations(user_groups(), inventory['partitions'])
+    try:
+        budgets = account_budgets(allocations, inventory, args.cores,
+                                  args.memory)
+    except (IOError, OSError, ValueError) as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(budgets, indent=1))
+    elif not budgets:
+        print('None of your allocations has nodes with %d cores and %d Gb'
+              % (args.cores, args.memory))
+    else:
+        print_budgets(budgets)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class GaussianInput(object):
+    """The parts of a Gaussian input file that this script cares about.
+
+    link0    : list of (command, value) from the % lines, lower case
+               commands, value is None for flags like %UseSSH
+    route    : the route section joined onto one line
+    method   : e.g. 'b3lyp', 'ccsd(t)', None if it can't be found
+    basis    : e.g. '6-31g(d)', None for semi-empirical or unknown
+    keywords : {keyword: options} for everything else in the route,
+               options is '' when the keyword has none
+    title    : title section joined onto one line
+    charge, multiplicity : ints, None when read from the checkpoint
+    atoms    : list of (element, x, y, z), coordinates are None for
+               Z-matrix input
+    trailing : blank line separated sections after the molecule
+               (Z-matrix variables, basis sets, ...)
+    link1    : True when more job steps follow a --Link1-- line
+    steps    : a GaussianInput for each job step, the first is this one
+    fingerprint : input_fingerprint(), once it has been worked out
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.link0 = []
+        self.route = ''
+        self.method = None
+        self.basis = None
+        self.keywords = {}
+        self.title = ''
+        self.charge = None
+        self.multiplicity = None
+        self.atoms = []
+        self.trailing = []
+        self.link1 = False
+        self.steps = [self]
+        self.fingerprint = None
+
+    def link0_value(self, *commands):
+        """Value of the last of these Link 0 commands, or None."""
+
+        value = None
+        for command, val in self.link0:
+            if command in commands: value = val
+        return value
+
+    def has_link0(self, *commands):
+        return any(command in commands for command, val in self.link0)
+
+    def memory_mb(self):
+        """%mem in Mb, None if not given or not understood."""
+
+        return parse_memory(self.link0_value('mem'))
+
+    def nproc(self):
+        """Number of cores from %nprocshared or %cpu, 1 if not given."""
+
+        nproc = self.link0_value('nprocshared', 'nproc')
+        if nproc is not None and nproc.isdigit():
+            return int(nproc)
+        cpus = self.link0_value('cpu')
+        if cpus is not None:
+            return len(expand_cpu_list(cpus))
+        return 1
+
+    def job_types(self):
+        """The job type keywords in the route, ['sp'] if there are none."""
+
+        jobs = [job for job in JOB_TYPES if job in self.keywords]
+        if self.method and re.match(r'^(cis|td|eom)', self.method) and \
+           'td' not in jobs:
+            jobs.append('td')
+        return jobs or ['sp']
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_memory(value):
+    """Convert a Gaussian memory specification like 10GB to Mb.
+
+    A bare number is in words (8 bytes), as in Gaussian. Returns None if
+    the value can't be understood.
+    """
+
+    if value is None: return None
+    match = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)([BW]?)\s*$', value.upper())
+    if match is None: return None
+    number, prefix, unit = match.groups()
+    try:
+        number = float(number)
+    except ValueError:
+        return None
+    if unit != 'B': number *= 8
+    return number * {'':1e-6, 'K':1e-3, 'M':1, 'G':1e3, 'T':1e6}[prefix]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def expand_cpu_list(cpus):
+    """Expand a %cpu list like 0-7,16-23 or 0-14/2 into core numbers."""
+
+    cores = []
+    for part in cpus.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/', 1)
+            step = int(step) if step.isdigit() else 1
+        bounds = part.split('-')
+        if not all(bound.strip().isdigit() for bound in bounds): continue
+        first, last = int(bounds[0]), int(bounds[-1])
+        cores.extend(range(first, last+1, step))
+    return cores
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def split_route(route):
+    """Split a route section into keywords, keeping (...) together."""
+
+    # Gaussian allows spaces around = and before the option list.
+    route = re.sub(r'\s*=\s*', '=', route)
+    route = re.sub(r'\s*\(\s*', '(', route)
+    route = re.sub(r'\s*\)', ')', route)
+    route = re.sub(r'\s*,\s*', ',', route)
+    tokens, token, depth = [], '', 0
+    for char in route:
+        if char == '(': depth += 1
+        if char == ')': depth = max(0, depth-1)
+        if depth == 0 and (char.isspace() or char == ','):
+            if token: tokens.append(token)
+            token = ''
+        else:
+            token += char
+    if token: tokens.append(token)
+    return tokens
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def split_outside_parentheses(token, separator):
+    """Split token at the first separator that is not inside (...)."""
+
+    depth = 0
+    for i, char in enumerate(token):
+        if char == '(': depth += 1
+        if char == ')': depth -= 1
+        if char == separator and depth == 0:
+            return token[:i], token[i+1:]
+    return token, None
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_route(model, route):
+    """Fill in the route, method, basis and keywords of a model."""
+
+    model.route = route
+    tokens = split_route(route.lower())
+    if tokens and re.match(r'^#[pnt]?$', tokens[0]):
+        tokens = tokens[1:]
+    elif tokens and tokens[0].startswith('#'):
+        tokens[0] = re.sub(r'^#[pnt]?', '', tokens[0])
+
+    for token in tokens:
+        method, basis = split_outside_parentheses(token, '/')
+        if basis is not None and '=' not in method:
+            model.method, model.basis = method, basis
+        elif model.method is None and re.match(METHOD_PATTERN, token):
+            model.method = token
+        elif model.basis is None and re.match(BASIS_PATTERN, token):
+            model.basis = token
+        else:
+            name, options = split_outside_parentheses(token, '=')
+            if options is None and token.endswith(')') and '(' in token:
+                name, options = token.split('(', 1)
+                options = '('+options
+            if options and options.startswith('(') and options.endswith(')'):
+                options = options[1:-1]
+            model.keywords[name] = options or ''
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_gaussian_input(path):
+    """Read a Gaussian input file into a GaussianInput.
+
+    The file is streamed line by line. Every job step after a --Link1--
+    line gets a GaussianInput of its own in steps, a step that reads
+    its geometry from the checkpoint takes the atoms of the step before.
+    """
+
+    model = GaussianInput(path)
+    step, state = model, {'section': 'link0', 'route': [], 'title': [],
+                          'block': []}
+
+    with open(path, 'r') as f:
+        for line in f:
+            if '!' in line:
+                line = line.split('!', 1)[0]
+            line = line.rstrip()
+            stripped = line.strip()
+            if stripped[:2] == '--' and stripped.lower() == '--link1--':
+                finish_step(step, state)
+                model.link1 = True
+                step = GaussianInput(path)
+                if model.steps[-1].atoms:
+                    step.atoms = model.steps[-1].atoms
+                model.steps.append(step)
+                state = {'section': 'link0', 'route': [], 'title': [],
+                         'block': []}
+                continue
+            parse_step_line(step, state, line, stripped)
+
+    finish_step(step, state)
+    return model
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_step_line(model, state, line, stripped):
+    """Add one line of a job step to its model.
+
+    state holds the section the step is in and the lines of the
+    section so far.
+    """
+
+    section = state['section']
+    if section == 'link0':
+        if stripped.startswith('%'):
+            command, value = split_outside_parentheses(stripped[1:], '=')
+            if value is None and ' ' in command:
+                command, value = command.split(None, 1)
+            model.link0.append((command.strip().lower(),
+                                value and value.strip()))
+        elif stripped.startswith('#'):
+            state['section'] = 'route'
+            state['route'].append(stripped)
+        return
+
+    if section == 'route':
+        if stripped:
+            state['route'].append(stripped)
+            return
+        parse_route(model, ' '.join(state['route']))
+        geom = model.keywords.get('geom', '')
+        state['section'] = 'trailing' if 'allcheck' in geom else 'title'
+        return
+
+    if section == 'title':
+        if stripped:
+            state['title'].append(stripped)
+            return
+        model.title = ' '.join(state['title'])
+        state['section'] = 'charge'
+        return
+
+    if section == 'charge':
+        if not stripped: return
+        values = stripped.replace(',', ' ').split()
+        try:
+            model.charge = int(values[0])
+            model.multiplicity = int(values[1])
+        except (IndexError, ValueError):
+            pass
+        geom = model.keywords.get('geom', '')
+        if 'check' in geom:
+            state['section'] = 'trailing'
+        else:
+            # Not the geometry of the step before after all
+            state['section'], model.atoms = 'atoms', []
+        return
+
+    if section == 'atoms':
+        if not stripped:
+            state['section'] = 'trailing'
+            return
+        model.atoms.append(parse_atom(stripped))
+        return
+
+    # Anything left over is kept as blank line separated blocks.
+    if stripped:
+        state['block'].append(line)
+    elif state['block']:
+        model.trailing.append('\n'.join(state['block']))
+        state['block'] = []
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def finish_step(model, state):
+    """Fill in whatever section a job step ended in."""
+
+    if state['section'] == 'route':
+        parse_route(model, ' '.join(state['route']))
+    if state['section'] == 'title':
+        model.title = ' '.join(state['title'])
+    if state['block']:
+        model.trailing.append('\n'.join(state['block']))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_atom(line):
+    """Turn a molecule specification line into (element, x, y, z).
+
+    Handles labels like C1, C-CA--0.25 or C(Fragment=1), atomic numbers
+    and Z-matrix lines, for which the coordinates are None.
+    """
+
+    fields = line.split()
+    # Fast path for the usual "C  0.0  0.0  0.0"
+    if len(fields) == 4 and fields[0].isalpha():
+        try:
+            return (fields[0].capitalize(), float(fields[1]),
+                    float(fields[2]), float(fields[3]))
+        except ValueError:
+            pass
+
+    fields = line.replace(',', ' ').split()
+    label = re.split(r'[-(]', fields[0], 1)[0]
+    if label.isdigit() and int(label) < len(ELEMENTS):
+        element = ELEMENTS[int(label)]
+    else:
+        element = re.sub(r'[^A-Za-z]', '', label).capitalize()
+    numbers = []
+    for field in fields[1:]:
+        try:
+            numbers.append(float(field))
+        except ValueError:
+            numbers.append(None)
+    # Cartesian lines are "label x y z", optionally with a freeze flag
+    # in front of the coordinates.
+    coords = [x for x in numbers[-3:] if x is not None]
+    if len(numbers) in (3, 4) and len(coords) == 3 and \
+       (len(numbers) == 3 or numbers[0] in (0, -1)):
+        return (element, coords[0], coords[1], coords[2])
+    return (element, None, None, None)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def load_input(path):
+    """Parse an input file once per run and hand back the same model."""
+
+    if path not in parsed_inputs:
+        parsed_inputs[path] = parse_gaussian_input(path)
+    return parsed_inputs[path]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def count_basis_functions(model):
+    """Estimate the number of basis functions for a parsed input.
+
+    Uses BASIS_FUNCTIONS for named basis sets and builds up Pople basis
+    sets from their parts. Unknown basis sets (including gen) are
+    counted like 6-31G(d).
+    """
+
+    basis = (model.basis or '6-31g(d)').lower()
+    per_row = BASIS_FUNCTIONS.get(re.sub(r'^(u|r|ro)', '', basis))
+    if per_row is None:
+        per_row = pople_basis_functions(basis)
+    if per_row is None:
+        per_row = pople_basis_functions('6-31g(d)')
+
+    n_basis = 0
+    for atom in model.atoms:
+        n_basis += per_row[element_row(atom[0])]
+    return n_basis
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def element_row(element):
+    """0 for H-He, 1 for Li-Ne, 2 for Na-Ar and 3 for anything heavier."""
+
+    try:
+        z = ELEMENTS.index(element)
+    except ValueError:
+        return 1
+    if z <= 2: return 0
+    if z <= 10: return 1
+    if z <= 18: return 2
+    return 3
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def pople_basis_functions(basis):
+    """Basis functions per row for Pople basis sets like 6-311++G(2d,p)."""
+
+    match = re.match(r'^(3-21|6-31|6-311)(\+{0,2})g(\*{0,2})(\((.*)\))?$',
+                     basis)
+    if match is None: return None
+    core, diffuse, stars, _, polarization = match.groups()
+    per_row = list({'3-21': (2, 9, 13, 23), '6-31': (2, 9, 13, 23),
+                    '6-311': (3, 13, 21, 31)}[core])
+    if len(diffuse) >= 1:
+        per_row[1:] = [n+4 for n in per_row[1:]]
+    if len(diffuse) == 2:
+        per_row[0] += 1
+    if stars:
+        polarization = {'*': 'd', '**': 'd,p'}[stars]
+    if polarization:
+        # 6-31G uses Cartesian d functions, 6-311G pure ones.
+        sizes = {'p': 3, 'd': 6 if core != '6-311' else 5, 'f': 10}
+        heavy, _, light = polarization.partition(',')
+        for functions, rows in ((heavy, slice(1, None)), (light, slice(0, 1))):
+            for number, shell in re.findall(r'(\d*)([pdf])', functions):
+                extra = int(number or 1)*sizes[shell]
+                per_row[rows] = [n+extra for n in per_row[rows]]
+    return tuple(per_row)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_calibration():
+    """The calibration table, with any user additions merged in.
+
+    Returns (classes, job_factors) where classes is a list of
+    (name, settings) in the order they are matched against the method.
+    """
+
+    classes = [(name, dict(values)) for name, values in CALIBRATION]
+    job_factors = dict(JOB_MEMORY_FACTORS)
+
+    table = RawConfigParser()
+    table.read(CALIBRATION_FILE)
+    for name in table.sections():
+        if name == 'jobs':
+            for job, factor in table.items(name):
+                job_factors[job] = float(factor)
+            continue
+        values = dict(classes).get(name, dict(CALIBRATION[-1][1]))
+        for key, value in table.items(name):
+            if key == 'match':
+                values[key] = value
+            elif key == 'linda':
+                values[key] = value.lower() in ('1', 'yes', 'true', 'on')
+            else:
+                values[key] = float(value)
+        classes = [(n, v) for n, v in classes if n != name]
+        # User classes are tried before the built in ones.
+        classes.insert(0, (name, values))
+    return classes, job_factors
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def estimate_resources(model, calibration=None):
+    """Estimate %mem (Gb), scratch disk (Gb) and cores for one input.
+
+    %mem is max(min_gb, words * N**power * 8 bytes), with N the number
+    of basis functions, times the factors for each job type. The disk
+    is worked out the same way from disk_words and disk_power. The
+    number of cores is N / bf_per_core.
+    """
+
+    classes, job_factors = calibration or read_calibration()
+    method = model.method or 'hf'
+    for name, values in classes:
+        if re.match(values['match'], method):
+            break
+
+    n_basis = count_basis_functions(model)
+    factor = 1.0
+    for job in model.job_types():
+        factor *= job_factors.get(job, 1.0)
+    memory = values['words'] * n_basis**values['power'] * 8 / 1e9
+    memory = int(math.ceil(max(values['min_gb'], memory) * factor))
+    disk = values['disk_words'] * n_basis**values['disk_power'] * 8 / 1e9
+    disk = int(math.ceil(max(values['min_disk_gb'], disk)))
+    cores = int(math.ceil(float(n_basis) / values['bf_per_core']))
+
+    return {'class'   : name,
+            'n_basis' : n_basis,
+            'memory'  : memory,
+            'disk'    : disk,
+            'cores'   : max(1, cores),
+            'linda'   : values['linda']}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def estimate_steps(model, calibration=None):
+    """estimate_resources() for an input with one or more job steps.
+
+    The memory, disk and cores are the most any --Link1-- step needs,
+    the rest comes from the most demanding step. A step never needs
+    less than its own %mem and %nprocshared, the job script would
+    otherwise lower them. step is the number of the most demanding
+    step, counting from 1, nproc the most cores any step asks for and
+    steps the estimate for every step.
+    """
+
+    calibration = calibration or read_calibration()
+    steps = []
+    for step in model.steps:
+        estimate = estimate_resources(step, calibration)
+        memory_mb = step.memory_mb()
+        if memory_mb is not None:
+            estimate['memory'] = max(estimate['memory'],
+                                     int(math.ceil(memory_mb/1000.0)))
+        estimate['cores'] = max(estimate['cores'], step.nproc())
+        steps.append(estimate)
+    biggest = max(steps, key=lambda estimate: (estimate['memory'],
+                                               estimate['cores']))
+    estimate = dict(biggest)
+    for key in ('memory', 'disk', 'cores'):
+        estimate[key] = max(step[key] for step in steps)
+    estimate['step'] = steps.index(biggest)+1
+    estimate['nproc'] = max(step.nproc() for step in model.steps)
+    estimate['steps'] = steps
+    return estimate
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def recommend_resources(models, inventory, partition, max_linda_nodes=4):
+    """Pick %mem, %nprocshared, node type and node count for a set of inputs.
+
+    The recommendation covers the most demanding job step of the most
+    demanding input. When a scale-study has measured inputs like it,
+    its core and node counts are used instead of the estimate. Returns
+    a dict with memory (%mem in Gb), disk (scratch in Gb), nprocshared,
+    cores (of the node type), nodes, linda, scaling (the scale-study
+    result or None) and the per input estimates.
+    """
+
+    calibration = read_calibration()
+    return recommend_from_estimates([estimate_steps(model, calibration)
+                                     for model in models],
+                                    inventory, partition, max_linda_nodes)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def recommend_from_estimates(estimates, inventory, partition,
+                             max_linda_nodes=4):
+    """recommend_resources() from estimate_steps() of each input."""
+
+    memory = max(estimate['memory'] for estimate in estimates)
+    cores = max(estimate['cores'] for estimate in estimates)
+    disk = max(estimate['disk'] for estimate in estimates)
+    linda = all(estimate['linda'] for estimate in estimates)
+
+    # Node types as (cores, memory in Gb after the OS overhead)
+    node_types = sorted(set((cpus, mem//1000 - 10) for nodes, cpus, mem in
+                            inventory['node_types'].get(partition, [])))
+    nodes = 1
+    if node_types:
+        fits = [node for node in node_types if node[1] >= memory]
+        if not fits:
+            fits = [max(node_types, key=lambda node: node[1])]
+        big = [node for node in fits if node[0] >= cores]
+        if big:
+            node = big[0]
+        else:
+            node = max(fits)
+            if linda:
+                nodes = min(max_linda_nodes,
+                            int(math.ceil(float(cores) / node[0])))
+        node_cores, memory = node[0], min(memory, node[1])
+    else:
+        node_cores = cores
+    nprocshared = min(cores, node_cores)
+
+    scaling = read_scaling().get(scaling_key(
+        max(estimates, key=lambda estimate: estimate['cores'])))
+    if scaling:
+        # Not below a %nprocshared the inputs ask for themselves
+        nproc = max(estimate.get('nproc', 1) for estimate in estimates)
+        nprocshared = min(max(scaling['cores'], nproc), node_cores)
+        nodes = scaling['nodes'] if linda else 1
+
+    return {'memory'     : memory,
+            'disk'       : disk,
+            'nprocshared': nprocshared,
+            'cores'      : node_cores,
+            'nodes'      : nodes,
+            'linda'      : nodes > 1,
+            'scaling'    : scaling,
+            'estimates'  : estimates}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_estimates(inputs, recommendation, max_rows=20, show_all=False):
+    """Show what was estimated for each input and the recommendation.
+
+    The inputs are only listed one by one if there are at most max_rows
+    of them, or with show_all.
+    """
+
+    if len(inputs) <= max_rows or show_all:
+        print('%-30s %-13s %6s %8s %8s %6s' % ('Input', 'Class', 'NBasis',
+                                               '%mem(Gb)', 'Disk(Gb)', 'Cores'))
+        for gauss_input, estimate in zip(inputs, recommendation['estimates']):
+            print('%-30s %-13s %6d %8d %8d %6d' % (gauss_input,
+                  estimate['class'], estimate['n_basis'], estimate['memory'],
+                  estimate['disk'], estimate['cores']))
+            steps = estimate.get('steps', [])
+            for i, step in enumerate(steps if len(steps) > 1 else []):
+                print('%-30s %-13s %6d %8d %8d %6d' % ('  step %d' % (i+1),
+                      step['class'], step['n_basis'], step['memory'],
+                      step['disk'], step['cores']))
+    print(textwrap.fill(textwrap.dedent("""\
+        Recommended: %%mem=%dGB and %%nprocshared=%d on %d node(s)
+        with %d cores%s""" % (recommendation['memory'],
+        recommendation['nprocshared'], recommendation['nodes'],
+        recommendation['cores'],
+        ' using Linda' if recommendation['linda'] else '')),100))
+    scaling = recommendation.get('scaling')
+    if scaling:
+        print(textwrap.fill(textwrap.dedent("""\
+            From a scale-study of %s: %d core(s) on %d node(s) run at
+            %.0f%% efficiency""" % (os.path.basename(scaling['input']),
+            scaling['cores'], scaling['nodes'],
+            100*scaling['efficiency'])),100))
+        if recommendation['nprocshared'] < recommendation['cores']:
+            print('Use --pack to run %d of these on a node at once'
+                  % (recommendation['cores'] // recommendation['nprocshared']))
+    print()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_history():
+    """Load the index of past jobs.
+
+    'pending' maps the key of each submitted job to its record until
+    sacct reports it finished, it is then moved to the 'done' list.
+    """
+
+    try:
+        with open(HISTORY_FILE) as f:
+            history = json.load(f)
+        if 'pending' in history and 'done' in history:
+            return history
+    except (IOError, OSError, ValueError):
+        pass
+    return {'pending': {}, 'done': []}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def history_key(workdir, job_name, task=None):
+    """Key of a job in the history, task is the job array index."""
+
+    key = os.path.join(workdir, job_name)
+    if task is not None: key += '[%d]' % task
+    return key
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def input_features(model, calibration=None):
+    """The features of an input that its runtime is predicted from."""
+
+    classes, job_factors = calibration or read_calibration()
+    method = model.method or 'hf'
+    method_class = [name for name, values in classes
+                    if re.match(values['match'], method)][0]
+    return {'class'  : method_class,
+            'method' : method,
+            'basis'  : model.basis,
+            'n_basis': count_basis_functions(model),
+            'n_atoms': len(model.atoms),
+            'jobs'   : '+'.join(sorted(model.job_types()))}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def record_jobs(jobs, cores):
+    """Add jobs that are about to be submitted to the history.
+
+    jobs is a list of (key, gauss_input), each running on cores cores.
+    Their runtimes are filled in from sacct by update_history() once
+    they have finished.
+    """
+
+    history = read_history()
+    pending = history['pending']
+    calibration = read_calibration()
+    now = time.time()
+    for key, gauss_input in jobs:
+        pending[key] = {'features' : input_features(load_input(gauss_input),
+                                                    calibration),
+                        'cores'    : cores,
+                        'submitted': now,
+                        'elapsed'  : None}
+    # Forget jobs that never showed up in sacct.
+    for key in list(pending):
+        if now - pending[key]['submitted'] > HISTORY_DAYS*86400:
+            del pending[key]
+    try:
+        write_json(HISTORY_FILE, history)
+    except (IOError, OSError):
+        pass
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_elapsed(elapsed):
+    """Convert a Slurm time like 1-02:03:04 or 03:04.5 to seconds."""
+
+    days, _, clock = elapsed.rpartition('-')
+    seconds = 0.0
+    for part in clock.split(':'):
+        seconds = seconds*60 + float(part or 0)
+    return seconds + int(days or 0)*86400
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_memory_size(size):
+    """Convert a sacct memory size like 1234K or 2.5G to Mb."""
+
+    match = re.match(r'^([0-9.]+)([KMGT]?)$', size.strip())
+    if match is None: return None
+    return float(match.group(1)) * {'': 1e-6, 'K': 1e-3, 'M': 1,
+                                    'G': 1e3, 'T': 1e6}[match.group(2)]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def history_command(history):
+    """The sacct call that looks up every pending job, None if there are none."""
+
+    pending = history['pending']
+    if not pending: return None
+
+    oldest = min(record['submitted'] for record in pending.values())
+    start = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(oldest-60))
+    return ('sacct -n -P -S %s -o JobID,JobName,WorkDir,Elapsed,'
+            'MaxRSS,ReqCPUS,State 2>/dev/null' % start)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def update_history():
+    """Fill in Elapsed, MaxRSS and ReqCPUS of finished jobs from sacct.
+
+    All of the jobs still waiting for a runtime are looked up with a
+    single sacct call.
+    """
+
+    history = read_history()
+    pending = history['pending']
+    command = history_command(history)
+    if command is None: return history
+
+    jobs, maxrss = {}, {}
+    for line in (probe_output(command) or '').splitlines():
+        fields = line.split('|')
+        if len(fields) != 7: continue
+        job_id, name, workdir, elapsed, rss, cpus, state = fields
+        if '.' in job_id:
+            size = parse_memory_size(rss)
+            if size is not None:
+                parent = job_id.split('.')[0]
+                maxrss[parent] = max(size, maxrss.get(parent, 0))
+            continue
+        task = None
+        if re.match(r'^\d+_\d+$', job_id):
+            task = int(job_id.split('_')[1])
+        jobs[job_id] = (history_key(workdir, name, task), elapsed, cpus,
+                        state)
+
+    # Newest first, in case an input was submitted more than once.
+    changed = False
+    for job_id, (key, elapsed, cpus, state) in sorted(jobs.items(),
+            key=lambda job: int(job[0].split('_')[0]), reverse=True):
+        if key not in pending: continue
+        if state.split()[0] in ('PENDING', 'RUNNING', 'REQUEUED'): continue
+        # Only jobs that ran to completion say how long a job needs.
+        record = pending.pop(key)
+        changed = True
+        if not state.startswith('COMPLETED'): continue
+        record['elapsed'] = parse_elapsed(elapsed)
+        record['maxrss'] = maxrss.get(job_id)
+        if cpus.isdigit(): record['cores'] = int(cpus)
+        history['done'].append(record)
+
+    if changed:
+        try:
+            write_json(HISTORY_FILE, history)
+        except (IOError, OSError):
+            pass
+    return history
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def predict_walltime(features, cores, history):
+    """Suggest a walltime in hours for an input, or None.
+
+    Past jobs with the same class of method and job types are fitted to
+    log(core-seconds) = a + b*log(NBasis), assuming the runtime falls as
+    cores**PARALLEL_EXPONENT. The suggestion is the prediction plus
+    WALLTIME_Z standard deviations of the fit, and at least
+    WALLTIME_MARGIN above the prediction. Returns (hours, number of
+    past jobs used). features is input_features() of the input.
+    """
+
+    points = []
+    for record in history['done']:
+        past = record['features']
+        if record['elapsed'] <= 0: continue
+        if past['class'] != features['class']: continue
+        if past['jobs'] != features['jobs']: continue
+        work = record['elapsed'] * max(1, record['cores'])**PARALLEL_EXPONENT
+        points.append((math.log(max(1, past['n_basis'])), math.log(work)))
+    if not points:
+        return None, 0
+
+    x0 = math.log(max(1, features['n_basis']))
+    n = len(points)
+    mean_x = sum(x for x, y in points)/n
+    mean_y = sum(y for x, y in points)/n
+    sxx = sum((x-mean_x)**2 for x, y in points)
+    if n < 3 or sxx < 1e-6:
+        # Too little spread to fit a slope, assume N**3 scaling and
+        # don't trust it much.
+        slope, spread = 3.0, math.log(2.0)
+    else:
+        slope = sum((x-mean_x)*(y-mean_y) for x, y in points)/sxx
+        slope = min(max(slope, 1.0), 5.0)
+        residuals = [y - mean_y - slope*(x-mean_x) for x, y in points]
+        spread = math.sqrt(sum(r**2 for r in residuals)/(n-2)) if n > 2 \
+                 else math.log(2.0)
+    log_work = mean_y + slope*(x0-mean_x)
+    seconds = math.exp(log_work) / max(1, cores)**PARALLEL_EXPONENT
+    seconds *= max(math.exp(WALLTIME_Z*spread), WALLTIME_MARGIN)
+    # Round up to the next quarter hour.
+    hours = math.ceil(seconds/900.0)/4.0
+    return max(hours, 0.25), n
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def format_walltime(hours):
+    """Hours as a Slurm time limit, H:MM:00."""
+
+    minutes = int(math.ceil(hours*60))
+    return '%d:%02d:00' % (minutes//60, minutes%60)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def build_parser():
+    """Command line options; every prompt has a matching option."""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py', add_help=False,
+        usage='%(prog)s [options] input{.com,.gjf} [input ...]')
+    parser.add_argument('files', nargs='*', help=argparse.SUPPRESS)
+    parser.add_argument('-h', '--help', action='store_true',
+        help='show this message and exit')
+    parser.add_argument('-q', '--queue', choices=['batch', 'ckpt', 'bf'],
+        help='queue to submit to (batch or ckpt)')
+    parser.add_argument('-a', '--allocation',
+        help='allocation to use, e.g. hyak-stf')
+    parser.add_argument('-N', '--nodes', type=int,
+        help='number of nodes')
+    parser.add_argument('--scratch', choices=['y', 'n', 'node'],
+        help='put the Gaussian scratch files in the submit directory (y), '
+             'on /gscratch/scrubbed (n) or on the node\'s own disk (node)')
+    parser.add_argument('--disk', type=int, metavar='GB',
+        help='node-local scratch for each run with --scratch node '
+             '(default: estimated from the inputs)')
+    parser.add_argument('--instrument', action='store_true', default=None,
+        help='record the phase timings, memory and CPU use and per-link '
+             'timings of each run in a .perf.json next to its log')
+    parser.add_argument('--post', action='store_true', default=None,
+        help='summarize each run and tidy up after it when the job ends')
+    parser.add_argument('--post-actions', metavar='ACTION[,ACTION]',
+        help='what --post does, any of %s (default: %s)'
+             % (', '.join(POST_ACTIONS), POST_DEFAULT))
+    parser.add_argument('--stage-out', metavar='EXT[,EXT]',
+        help='scratch files to copy back with --scratch node '
+             '(default: %s)' % STAGE_OUT)
+    parser.add_argument('--email',
+        help='UW NetID to send job notifications to')
+    parser.add_argument('-c', '--cores', type=int,
+        help='cores to use on each node')
+    parser.add_argument('-m', '--memory',
+        help='memory, in Gb, to use on each node (or all)')
+    parser.add_argument('-v', '--version',
+        help='Gaussian version, e.g. g16.b01')
+    parser.add_argument('-t', '--hours', type=float,
+        help='walltime in hours (default: predicted from past jobs)')
+    parser.add_argument('-o', '--output',
+        help='name of the .sh script (single input only)')
+    parser.add_argument('--array', action='store_true',
+        help='write one job array script for all of the inputs')
+    parser.add_argument('--throttle', type=int, metavar='N',
+        help='run at most N tasks of the job array at once')
+    parser.add_argument('--pack', action='store_true',
+        help='run all of the inputs, several at a time, in one job')
+    parser.add_argument('--slots', type=int, metavar='N',
+        help='number of Gaussian runs at a time with --pack '
+             '(default: from the estimated resources)')
+    parser.add_argument('--choose', action='store_true',
+        help='pick the allocation, queue and node type that would start '
+             'the job soonest')
+    parser.add_argument('--spread', action='store_true',
+        help='share the jobs out over all of your allocations and their '
+             'ckpt accounts, within what is left of each')
+    parser.add_argument('--split-steps', action='store_true',
+        help='run each --Link1-- step of an input as its own job, sized '
+             'for that step, after the step before')
+    parser.add_argument('--submit', action='store_true',
+        help='submit the scripts with sbatch and record the job IDs')
+    parser.add_argument('--dry-run', action='store_true',
+        help='print the scripts instead of writing them')
+    parser.add_argument('--no-cache', action='store_true',
+        help='run inputs again even if the same calculation has finished')
+    parser.add_argument('--rebuild', action='store_true',
+        help='parse, check and write every input again, even the ones '
+             'whose scripts are up to date')
+    parser.add_argument('--link-cached', action='store_true',
+        help='link the .log of an input that has already been run to the '
+             'existing result')
+    parser.add_argument('--estimate', action='store_true',
+        help='only print the estimated resources for each input')
+    parser.add_argument('-p', '--profile',
+        help='read defaults from a saved profile')
+    parser.add_argument('--save-profile', metavar='PROFILE',
+        help='save the answers from this run as a profile')
+    parser.add_argument('--list-profiles', action='store_true',
+        help='list the saved profiles and exit')
+    parser.add_argument('-y', '--defaults', action='store_true',
+        help='never prompt, use the default for anything not given')
+    parser.add_argument('--refresh-inventory', action='store_true',
+        help='query sinfo/hyakalloc again instead of using the cache')
+    return parser
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_profiles():
+    """Load the profile file, if there is one."""
+
+    profiles = RawConfigParser()
+    profiles.read(PROFILE_FILE)
+    return profiles
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def save_profile(name, values):
+    """Add or replace a profile in the profile file.
+
+    Empty values are kept so that the profile answers those prompts
+    with their defaults.
+    """
+
+    profiles = read_profiles()
+    if profiles.has_section(name):
+        profiles.remove_section(name)
+    profiles.add_section(name)
+    for key in PROFILE_KEYS:
+        if values.get(key) is not None:
+            profiles.set(name, key, str(values[key]))
+    directory = os.path.dirname(PROFILE_FILE)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(PROFILE_FILE, 'w') as f:
+        profiles.write(f)
+    print('Saved the %s profile to %s\n' % (name, PROFILE_FILE))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_arguments(argv):
+    """Combine the command line with a saved profile into settings."""
+
+    global settings
+
+    args = build_parser().parse_args(argv)
+    settings = {}
+    if args.profile:
+        profiles = read_profiles()
+        if not profiles.has_section(args.profile):
+            print('ERROR: There is no profile named %s in %s'
+                  % (args.profile, PROFILE_FILE))
+            sys.exit()
+        for key in PROFILE_KEYS:
+            if profiles.has_option(args.profile, key):
+                settings[key] = profiles.get(args.profile, key)
+    # Options given on the command line win over the profile.
+    for key, value in vars(args).items():
+        if value is not None or key not in settings:
+            settings[key] = value
+    return settings
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def ask(key, question):
+    """Answer a prompt from the settings, otherwise ask the user.
+
+    An empty answer means "use the default", which is also what is
+    returned for missing values when running with --defaults.
+    """
+
+    value = settings.get(key)
+    if value is not None:
+        print(question + str(value))
+        return str(value)
+    if settings.get('defaults'):
+        print(question)
+        return ''
+    return raw_input(question)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def user_name():
+    """The login name, from whoami or else the environment."""
+
+    name = (probe_output('whoami') or '').strip()
+    return name or os.environ.get('USER') or os.environ.get('LOGNAME', '')
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def user_groups():
+    """The Unix groups of the user, from groups or the group database."""
+
+    groups = probe_output('groups')
+    if groups is None:
+        username = user_name()
+        groups = ' '.join([grp.getgrgid(os.getgid()).gr_name] +
+                          [group.gr_name for group in grp.getgrall()
+                           if username in group.gr_mem])
+    groups = groups.split(' ')
+    groups[-1] = groups[-1].strip()
+    return groups
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def get_user_input():
+    """Grab input from the user about what type of job to run.
+
+    Returns the answers as a JobSpec.
+    """
+
+    global f_input, gdv, queue, allocation, version, n_nodes
+    global linda, n_cores, walltime, f_output, gen, memory
+    global lclScr, email, memory_write, inventory, pack_slots
+    global scratch_disk
+    gdv = False
+
+    #--------------------------------------
+    # Get everything the prompts need from the system going at once
+    for command in ENVIRONMENT_PROBES:
+        start_probe(command)
+    parse_arguments(sys.argv[1:])
+    if not settings['help'] and not settings['list_profiles']:
+        if settings['refresh_inventory'] or \
+           not any(inventory_is_fresh(g) for g in ('ikt', 'mox')):
+            for command in INVENTORY_PROBES:
+                start_probe(command)
+        if settings['choose'] or settings['spread']:
+            for command in QUEUE_PROBES:
+                start_probe(command)
+        if settings.get('hours') in (None, ''):
+            command = history_command(read_history())
+            if command: start_probe(command)
+    #--------------------------------------
+
+    #--------------------------------------
+    # Determine which generation machine we're on
+    gen  = 'ikt'
+    host = probe_output('hostname') or socket.gethostname()
+    if 'mox' in host: gen = 'mox'
+    #--------------------------------------
+
+    #--------------------------------------
+    # Check arguments
+    args = settings['files']
+    if settings['help']:
+        print_help()
+        sys.exit()  
+    if settings['list_profiles']:
+        for name in read_profiles().sections(): print(name)
+        sys.exit()
+    refresh = settings['refresh_inventory']
+    if refresh:
+        invalidate_inventory(gen)
+        if len(args) == 0:
+            load_inventory(gen, refresh=True)
+            print('Refreshed the cached cluster inventory')
+            sys.exit()
+    if len(args) == 0:
+        print('No files specified')
+        exit()
+    if len(args) != 1: 
+        print("Using the same parameters for all files")
+        print(args)
+        print()
+    #--------------------------------------
+
+    #--------------------------------------
+    # Read partitions, node types and allocation sizes from the cache
+    inventory = load_inventory(gen, refresh=refresh)
+    #--------------------------------------
+    
+    #--------------------------------------
+    # Check that the argument is a .com or .gjf and that it exists.
+    f_input = []
+    for fil in args:
+        f_temp= fil.split('.')
+        if not os.path.isfile(fil):
+            print('ERROR: The input file '+fil+' does not exist')
+            sys.exit()
+        if len(f_temp) != 2:
+            print('ERROR: The filename must include the extension')
+            sys.exit()
+        if f_temp[-1] != 'com' and f_temp[-1] != 'gjf':
+            print('ERROR: The file extension must be .com or .gjf')
+            sys.exit()
+        f_input.append(f_temp)
+    #--------------------------------------
+    
+    #--------------------------------------
+    # Check that the user has the right permissions to use Gaussian.
+    groups = user_groups()
+    if 'ligroup-gaussian' not in groups: 
+        print(textwrap.fill(textwrap.dedent("""\
+            ERROR: You must be part of the ligroup-gaussian Unix group 
+            to use Gaussian. Contact Prof. Xiaosong Li (xsli@uw.edu) to 
+            be added to the group."""), 60))
+        sys.exit()
+    if 'ligroup-gdv' in groups: gdv = True
+    #--------------------------------------
+
+    #--------------------------------------
+    # Work out where the job would start soonest and use that for
+    # whatever hasn't been answered yet.
+    if settings['choose']:
+        print('Checking which partitions and node types are free...')
+        queues = ['batch', 'ckpt']
+        if settings.get('queue'):
+            queues = ['ckpt' if settings['queue'] == 'bf' else settings['queue']]
+        allocs = user_allocations(groups, inventory['partitions'])
+        if settings.get('allocation'):
+            allocs = [settings['allocation']]
+        cores = settings.get('cores')
+        records = load_input_records([str(fil[0])+'.'+str(fil[1])
+                                      for fil in f_input],
+                                     settings['rebuild'])
+        choices = choose_submission(
+            [record['estimate'] for record in records],
+            inventory, allocs, queues, int(cores) if cores else None)
+        if len(choices) == 0:
+            print('No node type has enough memory for these inputs\n')
+        else:
+            print_choices(choices)
+            best = choices[0]
+            print('Starting soonest on %s with the %s queue (%.1f hr)\n'
+                  % (best['allocation'], best['queue'], best['start']))
+            for key in ['queue', 'allocation', 'cores', 'nodes']:
+                if settings.get(key) in (None, ''):
+                    settings[key] = best[key]
+    #--------------------------------------
+
+    #--------------------------------------
+    # Determine which queue to submit to.
+    queue = ask('queue', textwrap.fill(textwrap.dedent("""\
+            Which queue would you like to submit to?
+            [batch] - (default) or [ckpt] : """),100))
+    if queue == '': queue = 'batch'
+    if queue == 'bf': queue = 'ckpt'
+    if queue != 'batch' and queue != 'ckpt':
+        print('ERROR: Invalid option for a queue. Must be batch or ckpt')
+        sys.exit()
+    print('Using the '+queue+' queue\n')
+    #--------------------------------------
+    
+    #--------------------------------------
+    # Determine which group's nodes to use.
+    allocation = ''
+    if queue == 'batch' or queue == 'ckpt':
+        allocs = user_allocations(groups, inventory['partitions'])
+        print('Whose allocation would you like to use?')
+        for allocation in allocs:
+            print('['+allocation+']',end=' ') 
+        print(': ',end='')
+        allocation = ask('allocation', '')
+        if allocation == '':
+            print(textwrap.fill(textwrap.dedent("""\
+                ERROR: You must specify an allocation"""),100))
+            sys.exit()
+            #allocation = 'hyak-stf'
+        elif allocation not in allocs:
+            print(textwrap.fill(textwrap.dedent("""\
+                ERROR: You must choose an allocation that you 
+                are a part of"""),100))
+            sys.exit()
+        print('Submitting to the '+allocation+' allocation\n')
+    #--------------------------------------
+
+    #--------------------------------------
+    # Ask how many nodes to use.
+    if queue == 'batch':
+        print('Checking how many nodes are in this allocation...')
+        allocation_name = allocation.split('-')
+        if allocation_name[1] == 'genpool':
+            allocation_name[1] = 'hpc'
+        max_nodes, smallest_mem = allocation_limits(inventory,
+                                                    allocation_name[1])
+        partition = allocation_name[1]
+    else:
+        max_nodes = 1000
+        partition = 'ckpt'
+
+    # Work out what the inputs need from their route sections
+    print('Estimating resources from the input files...')
+    inputs = [str(fil[0])+'.'+str(fil[1]) for fil in f_input]
+    records = load_input_records(inputs, settings['rebuild'])
+    recommendation = recommend_from_estimates(
+        [record['estimate'] for record in records], inventory, partition)
+    print_estimates(inputs, recommendation,
+                    show_all=settings.get('estimate'))
+    if settings['estimate']:
+        sys.exit()
+
+    n_nodes = ask('nodes', 'How many nodes do you want to use? (default=%d) : '
+                  % recommendation['nodes'])
+    if n_nodes == '':
+        n_nodes = recommendation['nodes']
+    else:
+        n_nodes = int(n_nodes)
+
+    if max_nodes == 0:
+        print(textwrap.fill(textwrap.dedent("""\
+            ERROR: There are no nodes available for this allocation"""),100))
+        sys.exit()
+    elif n_nodes < 1 or n_nodes >= max_nodes:
+        print(textwrap.fill(textwrap.dedent("""\
+            ERROR: You must select at least one node and
+            less than %d""" % max_nodes),100))
+        sys.exit()
+
+    if n_nodes > 1:
+        linda = True
+    else:
+        linda = False
+
+    if linda:
+        print(textwrap.fill(textwrap.dedent("""\
+            NOTE: You must include "%lindaworker" in your input file when 
+            using more than one node. Some version also require including
+            %UseSSH in your Gaussian input file."""),60)) 
+    #--------------------------------------
+    # Ask to set the local scratch during printing
+    lclScr = ask('scratch', 'Set scratch locally? (y, n or node): ')
+    writeScr = None
+    if lclScr == '' or lclScr == 'n': lclScr = 0
+    elif lclScr == 'node': lclScr = 2
+    else: lclScr = 1
+
+    #--------------------------------------
+    #Ask about where to send email notifications
+    whoami = user_name()
+    email = ask('email', "Is %s@uw.edu the correct email, else what is?: " %whoami)    
+    if email == '': email = whoami
+
+    #--------------------------------------
+    # Ask how many cores/memory on each node to use.
+    print('Checking what types of nodes are in this allocation...')
+    nodes_per_cpu = nodes_per_core_count(inventory, partition)
+    if len(nodes_per_cpu) == 0:
+        print(textwrap.fill(textwrap.dedent("""\
+            ERROR: Could not find any nodes in the %s partition. Try
+            again with --refresh-inventory""" % partition),100))
+        sys.exit()
+    default_cores = recommendation['cores']
+    if default_cores not in nodes_per_cpu:
+        default_cores = min(nodes_per_cpu)
+    n_cores = ask('cores', textwrap.fill(textwrap.dedent("""\
+              How many cores do you want to use
+              on each node? (default=%d) : """ % default_cores).strip()))
+
+    if n_cores == '':
+        n_cores = default_cores
+    else:
+        n_cores = int(n_cores)
+
+    if n_cores > max(nodes_per_cpu):
+        print(textwrap.fill(textwrap.dedent("""\
+            You cannot request more than the maximum
+            number of cores on this allocation. (%d)""" % (max(nodes_per_cpu))),100))
+        exit()
+
+    try:
+        max_nodes = nodes_per_cpu[n_cores]
+    except KeyError:
+        for cores in sorted(nodes_per_cpu):
+            if n_cores < cores:
+                max_nodes = nodes_per_cpu[cores]
+                print(textwrap.fill(textwrap.dedent("""\
+                    Requesting all the cores on the smallest node (%d)
+                    that fits the requested number (%d)""" % (cores, n_cores)),100))
+                n_cores = cores
+                break
+
+    if n_nodes > max_nodes:
+        n_nodes = max_nodes
+        print('You requested too many nodes with '+n_cores+' cores')
+        print('Resetting to maximum number of nodes with that many cores (%d)' %(max_nodes))
+
+
+    print('Checking available memory for the requested nodes...')
+    # - 10 for os overhead
+    mem_types = [mem//1000 - 10 for mem in
+                 memory_per_node(inventory, partition, n_cores)]
+    max_mem = max(mem_types)
+
+    # Split the node into slots for --pack
+    pack_slots = 1
+    if settings['pack']:
+        if n_nodes > 1:
+            print('ERROR: --pack runs all of the inputs on a single node')
+            sys.exit()
+        pack_slots = settings['slots'] or \
+            min(n_cores // recommendation['nprocshared'], len(f_input),
+                (max_mem - 10) // recommendation['memory'])
+        pack_slots = max(1, min(pack_slots, n_cores))
+
+    # The job script sets %mem 10 Gb below what is requested from Slurm
+    default_mem = min(recommendation['memory']*pack_slots + 10, max_mem)
+
+    memory_answer = ask('memory', textwrap.fill(textwrap.dedent("""\
+              How much memory, in Gb, do you want to use on each
+              node? (default=%d, all=All Available) : """ 
+              % default_mem).strip()))
+    if memory_answer == '':
+        memory = default_mem
+        memory_write=str(memory)+'G'
+    elif memory_answer == 'all':
+        memory = 0
+        memory_write='0'
+    else:
+        memory = int(memory_answer)
+        memory_write=str(memory)+'G'
+        if memory > max_mem:
+            print(textwrap.fill(textwrap.dedent("""\
+                You cannot request more than the maximum
+                memory on this type of node. (%d)""" % (max_mem)),100))
+            exit()
+
+    print('Using %d node(s) with %d cores and %d Gb\n' % 
+        (n_nodes, n_cores, memory))
+
+    if settings['pack']:
+        print('Running %d inputs at a time with %d cores and %d Gb each\n'
+              % (pack_slots, n_cores // pack_slots,
+                 ((memory or max_mem) - 10) // pack_slots))
+    #--------------------------------------
+
+    #--------------------------------------
+    # Size the node-local scratch, Gaussian is held to it with MaxDisk
+    scratch_disk = 0
+    if lclScr == 2:
+        disk_answer = ask('disk', textwrap.fill(textwrap.dedent("""\
+                  How much node-local scratch, in Gb, does each run
+                  need? (default=%d) : """ % recommendation['disk']).strip()))
+        if disk_answer == '': scratch_disk = recommendation['disk']
+        else: scratch_disk = int(disk_answer)
+        print('Requesting %d Gb of node-local scratch\n'
+              % (scratch_disk*pack_slots))
+    #--------------------------------------
+
+    #--------------------------------------
+    # Determine which version of Gaussian to use.
+    if gen == 'ikt':
+        g09_versions = ['d01','e01']
+        g16_versions = ['a03']
+        gdv_versions = ['i03','i03p','i04p','i06','i06p','i09']
+    elif gen == 'mox':
+        g09_versions = ['a02','e01']
+        g16_versions = ['a03', 'b01']
+        gdv_versions = ['i03','i03p','i04p','i06p','i10pp','i11p','i13','i13p']
+    print('Which version of Gaussian would you like to use?')
+    for version in g09_versions: print('[g09.'+version+']',end=' ') 
+    for version in g16_versions: print('[g16.'+version+']',end=' ') 
+    if gdv:
+        for version in gdv_versions: print('[gdv.'+version+']',end=' ') 
+    print('- (default) : ',end='')
+    version = ask('version', '')
+    if version == '':
+        if gdv: version = 'gdv.'+gdv_versions[-1]
+        else: version = 'g16.'+g16_versions[-1]
+    version_name = version.split('.')
+    if len(version_name) != 2:
+        print("Can't recognize the specificed version")
+        sys.exit()
+    bad_version = False
+    if version_name[0] == 'g09':
+        if version_name[1] not in g09_versions:
+            bad_version = True
+    elif version_name[0] == 'g16':
+        if version_name[1] not in g16_versions:
+            bad_version = True
+    elif version_name[0] == 'gdv':
+        if version_name[1] not in gdv_versions:
+            bad_version = True
+    else:
+        bad_version = True
+    if bad_version:
+        print('Choose a valid version of Gaussian. Not %s.%s' 
+            % (version_name[0], version_name[1]))
+        sys.exit()
+    print('Using the '+version+' version of Gaussian\n')  
+    #--------------------------------------
+
+    #--------------------------------------
+    # Check what the max walltime should be.
+    max_time = 750000
+    lim = 240
+    if queue != 'bf' and queue != 'ckpt':
+        default = 1
+    else:
+        default = 6
+    unit    = 'hr'
+
+    # Suggest a tighter limit from how long similar jobs took before
+    if settings.get('hours') in (None, ''):
+        history = update_history()
+        predictions = [predict_walltime(record['features'],
+                                        n_cores*n_nodes, history)
+                       for record in records]
+        predictions = [p for p in predictions if p[0] is not None]
+        if len(predictions) == len(inputs):
+            default = max(hours for hours, n_jobs in predictions)
+            print('Predicted %g hr from %d similar past job(s)'
+                  % (default, min(n_jobs for hours, n_jobs in predictions)))
+
+    hours_answer = ask('hours', textwrap.fill(textwrap.dedent("""\
+           For how many hours do you want to run your
+           calculation? (default=%g hr) : """ % default).strip(),100))
+    if hours_answer == '': walltime = default
+    else: walltime = float(hours_answer)
+    if queue == 'bf' and walltime < 6:
+        print(textwrap.fill(textwrap.dedent("""\
+            If you want your job to be resubmitted automatically on
+            the ckpt partition, you need to specify greater than
+            5 hours of runtime. This is just a warning."""),100))
+    print('Running the calculation for %g %s(s)\n' % (walltime, unit))
+
+    #Check on MAXTIME
+    time_lim = max_time / 60 / n_nodes / n_cores
+    if walltime > time_lim  or walltime > lim:#Checking doesn't exceed max time or 10 d
+      print(textwrap.fill(textwrap.dedent("""\
+            WARNING:
+            You have asked for %i hours on %i nodes with %i processing cores.
+            If you are submitting to the stf queue this will exceed your
+            timelimit (%d hours).  To correct this either request less time,
+            fewer nodes, or fewer processing cores. If this causes an issue, 
+            or you have questions please contact hpcc@uw.edu.\n""" % \
+            (walltime, n_nodes, n_cores, min(time_lim, lim))),100))
+
+
+    #--------------------------------------
+
+    #--------------------------------------
+    # Get a name for the .pbs script.
+    extension = 'sh'
+    if len(f_input) == 1:
+        f_output = ask('output', textwrap.fill(textwrap.dedent("""\
+                   What should the .%s script be named? 
+                   (default=%s.%s) : """ % ( extension, f_input[0][0].strip(), 
+                                             extension) )))
+        if f_output.endswith('.'+extension):
+            f_output = f_output[:-len(extension)-1]
+        if f_output == '': f_output = [f_input[0][0]+'.'+extension]
+        else: f_output = [f_output+'.'+extension]
+    # AW - assume default if multiple files submitted
+    else:
+        f_output = [f_i[0]+'.'+extension for f_i in f_input]
+    #--------------------------------------
+
+    #--------------------------------------
+    # Measure how the runs use their resources?
+    instrumented = str(settings.get('instrument')).lower() in (
+        'true', 'yes', 'y', '1')
+    #--------------------------------------
+
+    #--------------------------------------
+    # Summarize and tidy up after each run?
+    post = settings.get('post_actions') or settings.get('post') or None
+    if str(post).lower() in ('true', 'yes', 'y', '1'):
+        post = POST_DEFAULT
+    elif str(post).lower() in ('false', 'no', 'n', '0'):
+        post = None
+    if post:
+        try:
+            post = ','.join(post_actions(post))
+        except ValueError as error:
+            print('ERROR: %s' % error)
+            sys.exit()
+    #--------------------------------------
+
+    #--------------------------------------
+    # Remember these answers for next time.
+    if settings['save_profile']:
+        save_profile(settings['save_profile'], {
+            'queue'     : queue,
+            'allocation': allocation,
+            'nodes'     : n_nodes,
+            'scratch'   : ['n', 'y', 'node'][lclScr],
+            'email'     : email,
+            'cores'     : n_cores,
+            'memory'    : memory_answer,
+            'version'   : version,
+            'hours'     : hours_answer,
+            'output'    : '',
+            'disk'      : disk_answer if lclScr == 2 else None,
+            'stage_out' : settings.get('stage_out'),
+            'instrument': 'yes' if instrumented else None,
+            'post'      : post})
+    #--------------------------------------
+
+    return JobSpec(inputs, allocation, queue, n_nodes, n_cores, memory,
+                   walltime, version, email, ['n', 'y', 'node'][lclScr],
+                   scratch_disk, settings.get('stage_out') or STAGE_OUT,
+                   settings['array'], settings['pack'], pack_slots,
+                   settings.get('throttle'),
+                   inventory.get('max_array_size', 1001),
+                   instrument=instrumented, post=post)
+
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def check_input_file(gauss_input, context):
+    """Check one Gaussian input file and return (file, warnings, exit, model).
+
+    context holds the job settings the checks depend on.
+    """
+
+    allocation, gen = context['allocation'], context['gen']
+    linda, n_nodes, pwd = context['linda'], context['n_nodes'], context['pwd']
+    exit = False
+    warnings = []
+
+    model = load_input(gauss_input)
+    found_linda = any(step.has_link0('lindaworkers', 'lindaworker')
+                      for step in model.steps)
+    found_ssh = any(step.has_link0('usessh') for step in model.steps)
+    # Each --Link1-- step has its own Link 0 section, the job has to
+    # fit the most demanding one.
+    nproc = max(step.nproc() for step in model.steps)
+    memory, gb = 0, False
+    for step in model.steps:
+        if not step.has_link0('mem'): continue
+        memory_mb = step.memory_mb()
+        if memory_mb is not None:
+            memory, gb = max(memory, int(memory_mb//1000)), True
+        else:
+            warning = textwrap.dedent("""\
+                This script could not understand the memory specification
+                %%mem=%s. Your calculation may still be fine, but this
+                script won't check. This is just a warning."""
+                % step.link0_value('mem'))
+            warnings.append(warning)
+
+    if model.link1:
+        missing = [str(i+1) for i, step in enumerate(model.steps)
+                   if not (step.has_link0('mem') and
+                           step.has_link0('nprocshared', 'nproc', 'cpu'))]
+        if missing:
+            warning = textwrap.dedent("""\
+                Link 0 commands only last for one job step. Step(s) %s
+                of your input have no %%mem or %%nprocshared line and will
+                run with the Gaussian defaults instead of what the job
+                asks for. This is just a warning.""" % ', '.join(missing))
+            warnings.append(warning)
+
+    checkpoints = []
+    for step in model.steps:
+        if step.link0_value('chk') not in checkpoints + [None]:
+            checkpoints.append(step.link0_value('chk'))
+    for checkpoint in checkpoints:
+        if re.match(r'^[a-z]:', checkpoint.lower()):
+            warning = textwrap.dedent("""\
+                Your checkpoint file includes the C: drive and there is
+                no C: drive on this machine. Please update the path for
+                your checkpoint file.""")
+            warnings.append(warning)
+            exit = True
+        elif ('/' in checkpoint or '\\' in checkpoint) and \
+            os.path.abspath(os.path.dirname(checkpoint)) != pwd:
+            warning = textwrap.dedent("""\
+                The path specified for your checkpoint file is not the 
+                current directory. You may want to change this. This is 
+                just a warning.""")
+            warnings.append(warning)
+ 
+    if gb and allocation == 'hyak-stf':
+        if gen == 'ikt' and memory > 32:
+            warning = textwrap.dedent("""\
+                Generally you don't want to specify more than half the
+                memory on a node. You've asked for %dGb and most STF
+                nodes only have 64Gb.
+                This is just a warning.""" % memory)
+            warnings.append(warning)
+        elif gen == 'mox' and memory > 64:
+            warning = textwrap.dedent("""\
+                Generally you don't want to specify more than half the
+                memory on a node. You've asked for %dGb and most STF
+                nodes only have 128Gb.
+                This is just a warning.""" % memory)
+            warnings.append(warning)
+ 
+    if allocation == 'hyak-stf':
+        if gen == 'ikt' and nproc > 16:
+            warning = textwrap.dedent("""\
+                You should not specify to use more cores than the number
+                available on your node. The STF nodes have 16 cores
+                and you've asked for %d cores. Please lower the number 
+                of cores you've requested in your input file.
+                Not forming PBS script.""" % nproc)
+            warnings.append(warning)
+            exit = True
+        elif gen == 'mox' and nproc > 28:
+            warning = textwrap.dedent("""\
+                You should not specify to use more cores than the number
+                available on your node. The STF nodes have 28 cores
+                and you've asked for %d cores. Please lower the number 
+                of cores you've requested in your input file.
+                Not forming SBATCH script.""" % nproc)
+            warnings.append(warning)
+            exit = True
+  
+    if allocation == 'hyak-stf':
+        if gen == 'ikt' and nproc < 16:
+            warning = textwrap.dedent("""\
+                You usually want to use all the cores on a node. The
+                STF nodes have 16 cores and you've asked for %d core(s).
+                This is just a warning.""" % nproc)
+            warnings.append(warning)
+        elif gen == 'mox' and nproc < 28:
+            warning = textwrap.dedent("""\
+                You usually want to use all the cores on a node. The
+                STF nodes have 28 cores and you've asked for %d cores.
+                This is just a warning.""" % nproc)
+            warnings.append(warning)
+ 
+    if linda and not found_linda:
+        warning = textwrap.dedent("""\
+            Your input file does not contain %lindaworker, but
+            you have asked to use more than one node. Please add this
+            line or request only one node. Not forming PBS script.""")
+        warnings.append(warning)
+        exit = True
+   
+    if linda and not found_ssh:
+        warning = textwrap.dedent("""\
+            Your input file does not contain %UseSSH, but
+            you have asked to use more than one node. This is can be
+            a problem for some versions of Gaussian. Please add this
+            line or request only one node. This is just a warning.""")
+        warnings.append(warning)
+  
+    if found_linda and n_nodes == 1:
+        warning = textwrap.dedent("""\
+            Your input file contains %lindaworker, but you have
+            only asked to use one node. Please remove this line or
+            request more than one node. Not forming PBS script.""")
+        warnings.append(warning)
+        exit = True
+
+    return gauss_input, warnings, exit, model
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def validation_workers(n_inputs):
+    """How many worker processes to check n_inputs files with."""
+
+    return min(multiprocessing.cpu_count(), MAX_WORKERS,
+               n_inputs//PARALLEL_MIN_FILES)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def load_inputs(inputs):
+    """Parse many input files, in a pool of worker processes if worthwhile.
+
+    The models are added to parsed_inputs and returned in the order of
+    inputs.
+    """
+
+    missing = [gauss_input for gauss_input in inputs
+               if gauss_input not in parsed_inputs]
+    n_workers = validation_workers(len(missing))
+    if n_workers < 2:
+        models = [parse_gaussian_input(gauss_input) for gauss_input in missing]
+    else:
+        pool = multiprocessing.Pool(n_workers)
+        try:
+            chunksize = max(1, len(missing)//(4*n_workers))
+            models = pool.map(parse_gaussian_input, missing, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    for gauss_input, model in zip(missing, models):
+        parsed_inputs[gauss_input] = model
+    return [parsed_inputs[gauss_input] for gauss_input in inputs]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def check_input_files(inputs, context):
+    """Check many input files, parsing them in parallel first.
+
+    Returns a list of (file, warnings, exit, model) in the order of
+    inputs.
+    """
+
+    load_inputs(inputs)
+    return [check_input_file(gauss_input, context) for gauss_input in inputs]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_warning_report(results, max_files=10):
+    """Print each distinct warning once, with the files it applies to."""
+
+    files_per_warning = {}
+    order = []
+    for gauss_input, warnings, exit, model in results:
+        for warning in warnings:
+            if warning not in files_per_warning:
+                files_per_warning[warning] = []
+                order.append(warning)
+            if gauss_input not in files_per_warning[warning]:
+                files_per_warning[warning].append(gauss_input)
+
+    if len(order) > 0:
+      print('\n'+'#'*40+'\n'
+           +' '*15+'WARNINGS\n'
+           +'#'*40)
+    for warning in order:
+        print('\n'+textwrap.fill(warning, 60))
+        if len(results) > 1:
+            files = files_per_warning[warning]
+            listed = ' '.join(files[:max_files])
+            if len(files) > max_files:
+                listed += ' ... (%d more)' % (len(files)-max_files)
+            print(textwrap.fill('Files: '+listed, 60,
+                                subsequent_indent='  '))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def check_Gaussian_input(spec, gen):
+    """Read the Gaussian input files and check for problems."""
+
+    context = {'allocation': spec.allocation, 'gen'    : gen,
+               'linda'     : spec.linda,      'n_nodes': spec.nodes,
+               'pwd'       : spec.workdir}
+    inputs = [spec.path(gauss_input) for gauss_input in spec.inputs]
+    results = check_input_files(inputs, context)
+
+    # Print warnings and exit if there are too many errors.
+    print_warning_report(results)
+    failed = [result[0] for result in results if result[2]]
+    if failed:
+      if len(results) > 1:
+          print('\n'+textwrap.fill('Problems found in: '+' '.join(failed), 60))
+      print("\nExiting without writing PBS file.\n")
+      sys.exit()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def input_fingerprint(path):
+    """Hash of the calculation an input asks for, None if it can't be cached.
+
+    Two inputs get the same hash when they only differ in their title,
+    comments, spacing, the order of the route keywords or COSMETIC_LINK0
+    lines. Inputs that read from a checkpoint, Z-matrices and multi-step
+    inputs are never cached.
+    """
+
+    model = load_input(path)
+    if model.fingerprint is None:
+        model.fingerprint = calculation_hash(model)
+    return model.fingerprint or None
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def calculation_hash(model):
+    """input_fingerprint() of a model, '' if it can't be cached."""
+
+    if model.link1 or model.has_link0('oldchk') or not model.atoms or \
+       'check' in model.keywords.get('geom', '') or \
+       'read' in model.keywords.get('guess', ''):
+        return ''
+    if any(atom[1] is None for atom in model.atoms):
+        return ''
+    calculation = {
+        'link0'   : sorted([command, value] for command, value in model.link0
+                           if command not in COSMETIC_LINK0),
+        'method'  : model.method,
+        'basis'   : model.basis,
+        'keywords': model.keywords,
+        'charge'  : [model.charge, model.multiplicity],
+        'atoms'   : [[element]+['%.*f' % (RESULT_DIGITS, x+0.0)
+                                for x in xyz]
+                     for element, xyz in ((atom[0], atom[1:])
+                                          for atom in model.atoms)],
+        'trailing': [' '.join(block.lower().split())
+                     for block in model.trailing]}
+    text = json.dumps(calculation, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def finished_normally(log):
+    """Whether the last line of a Gaussian log is a Normal termination."""
+
+    try:
+        with open(log, 'rb') as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell()-1024))
+            lines = f.read().decode('utf-8', 'replace').split('\n')
+    except (IOError, OSError):
+        return False
+    lines = [line for line in lines if line.strip()]
+    return bool(lines) and 'Normal termination' in lines[-1]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_result_index():
+    """{fingerprint: [{'input', 'log', 'added'}]} from RESULT_INDEX."""
+
+    try:
+        with open(RESULT_INDEX) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def index_results(inputs):
+    """Add inputs and the logs they will write to RESULT_INDEX.
+
+    Returns how many of them could be cached. Nothing is checked here, a
+    log only counts once it has finished normally (see cached_result()).
+    """
+
+    index = read_result_index()
+    now = time.time()
+    added = 0
+    for gauss_input in inputs:
+        fingerprint = input_fingerprint(gauss_input)
+        if fingerprint is None: continue
+        added += 1
+        path = os.path.abspath(gauss_input)
+        entries = [entry for entry in index.get(fingerprint, [])
+                   if entry['input'] != path]
+        entries.append({'input': path,
+                        'log'  : os.path.splitext(path)[0]+'.log',
+                        'added': now})
+        index[fingerprint] = entries
+    try:
+        write_json(RESULT_INDEX, index)
+    except (IOError, OSError):
+        pass
+    return added
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def cached_result(gauss_input, index):
+    """The log of a finished run of the same calculation, or None.
+
+    A log is only used if it finished normally after its input was last
+    changed and that input still has the same fingerprint. Entries whose
+    log never finished are dropped from index after HISTORY_DAYS.
+    """
+
+    fingerprint = input_fingerprint(gauss_input)
+    if fingerprint is None or fingerprint not in index:
+        return None
+    kept, found = [], None
+    for entry in index[fingerprint]:
+        if found is None and finished_normally(entry['log']):
+            try:
+                current = (os.path.getmtime(entry['input']) <=
+                           os.path.getmtime(entry['log']) and
+                           input_fingerprint(entry['input']) == fingerprint)
+            except (IOError, OSError):
+                current = False
+            if current:
+                found = entry['log']
+            else:
+                continue
+        elif time.time() - entry['added'] > HISTORY_DAYS*86400:
+            continue
+        kept.append(entry)
+    index[fingerprint] = kept
+    return found
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_index(argv):
+    """gaussian-sub.py index [directory ...]"""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py index',
+        description='Add the finished calculations in these directories to '
+                    'the result cache')
+    parser.add_argument('directories', nargs='*', default=['.'])
+    args = parser.parse_args(argv)
+
+    inputs = []
+    for directory in args.directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                base, extension = os.path.splitext(name)
+                if extension in ('.com', '.gjf') and \
+                   finished_normally(os.path.join(root, base+'.log')):
+                    inputs.append(os.path.join(root, name))
+    print('Added %d finished calculation(s) to %s'
+          % (index_results(inputs), RESULT_INDEX))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def skip_cached(spec, outputs=None, link=False):
+    """Take the inputs that have already been run out of spec.
+
+    Prints where each of their results is, with link a symbolic link to
+    it is made next to the input when it has no .log of its own. outputs
+    are the script names for the inputs, the ones that are still needed
+    are returned.
+    """
+
+    index = read_result_index()
+    per_input = outputs and len(outputs) == len(spec.inputs)
+    inputs, kept = [], []
+    for i, gauss_input in enumerate(spec.inputs):
+        path = spec.path(gauss_input)
+        log = cached_result(path, index)
+        if log is None:
+            inputs.append(gauss_input)
+            if per_input: kept.append(outputs[i])
+            continue
+        own_log = os.path.splitext(path)[0]+'.log'
+        if os.path.abspath(own_log) == log:
+            print('%s has already been run, see %s' % (gauss_input, own_log))
+        elif link and not os.path.lexists(own_log):
+            os.symlink(log, own_log)
+            print('%s was already run as %s, linked %s to its log'
+                  % (gauss_input, os.path.relpath(log), own_log))
+        else:
+            print('%s is the same calculation as %s'
+                  % (gauss_input, os.path.relpath(log)))
+    if len(inputs) < len(spec.inputs):
+        print('\nSkipping %d input(s) that have already been run, use '
+              '--no-cache to run them again\n'
+              % (len(spec.inputs)-len(inputs)))
+        try:
+            write_json(RESULT_INDEX, index)
+        except (IOError, OSError):
+            pass
+    spec.inputs = inputs
+    return kept if per_input else outputs
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def index_stamp():
+    """What every SCRIPT_INDEX entry depends on besides its input."""
+
+    stamp = []
+    source = os.path.splitext(os.path.abspath(__file__))[0]+'.py'
+    for path in (CALIBRATION_FILE, source):
+        try:
+            stamp.append(os.path.getmtime(path))
+        except OSError:
+            stamp.append(0)
+    return stamp
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_script_index():
+    """{input path: record} from SCRIPT_INDEX, {} if it is out of date."""
+
+    try:
+        with open(SCRIPT_INDEX) as f:
+            index = json.load(f)
+        if index['stamp'] == index_stamp():
+            return index['inputs']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def input_hash(path):
+    """sha1s of an input without its COSMETIC_LINK0 lines, and of them.
+
+    The job scripts set %mem, %nprocshared and %LindaWorkers in the
+    input itself while they run, and a ckpt job adds a %chk as its
+    first line. Leaving those lines out of the first hash keeps a job
+    that has started from making its input look changed. Any other %chk
+    is the user's and stays in, a ckpt job restarts from it. The second
+    hash is of the lines left out: the estimate depends on %mem and
+    %nprocshared, so it is made again when they change.
+    """
+
+    cosmetic = set(COSMETIC_LINK0+['lindaworker']) - set(['chk'])
+    added = os.path.splitext(os.path.abspath(path))[0]+'.chk'
+    content, link0 = hashlib.sha1(), hashlib.sha1()
+    with open(path, 'rb') as f:
+        for n, line in enumerate(f):
+            stripped = line.strip()
+            if stripped[:1] == b'%':
+                command = re.split(br'[=\s]', stripped[1:], 1)[0]
+                command = command.decode('utf-8', 'replace').lower()
+                if command in cosmetic:
+                    link0.update(stripped.lower()+b'\n')
+                    continue
+                if command == 'chk' and n == 0:
+                    value = stripped.split(b'=', 1)[-1].strip()
+                    value = value.decode('utf-8', 'replace')
+                    if value == added or added.endswith(os.sep+value):
+                        continue
+            content.update(line)
+    return content.hexdigest(), link0.hexdigest()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def load_input_records(inputs, rebuild=False):
+    """The SCRIPT_INDEX record of each input, parsing only what changed.
+
+    An input is unchanged when its size and modification time, or else
+    its input_hash(), are what they were when it was indexed. Its record
+    comes from the index with unchanged set. The others are parsed and
+    get a new record with their hashes, estimate_steps() and
+    input_features(), and so are unchanged inputs whose %mem or
+    %nprocshared lines are new. rebuild ignores the index. The records
+    are kept in input_records and returned in the order of inputs.
+    """
+
+    index = {} if rebuild else read_script_index()
+    changed = []
+    for gauss_input in inputs:
+        path = os.path.abspath(gauss_input)
+        if path in input_records: continue
+        info = os.stat(path)
+        record = {'size': info.st_size, 'mtime': info.st_mtime,
+                  'unchanged': False}
+        entry = index.get(path)
+        if entry and entry['size'] == record['size'] and \
+           entry['mtime'] == record['mtime']:
+            record = dict(entry, unchanged=True)
+        else:
+            record['hash'], record['link0'] = input_hash(path)
+            if entry and entry['hash'] == record['hash']:
+                if entry.get('link0') != record['link0']:
+                    changed.append(gauss_input)
+                record = dict(entry, unchanged=True, size=record['size'],
+                              mtime=record['mtime'], link0=record['link0'])
+            else:
+                changed.append(gauss_input)
+        input_records[path] = record
+
+    calibration = read_calibration()
+    for gauss_input, model in zip(changed, load_inputs(changed)):
+        input_records[os.path.abspath(gauss_input)].update(
+            estimate=estimate_steps(model, calibration),
+            features=input_features(model, calibration))
+    return [input_records[os.path.abspath(gauss_input)]
+            for gauss_input in inputs]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def script_settings(spec):
+    """Hash of the settings the scripts for spec are written with."""
+
+    values = dict((key, getattr(spec, key)) for key in WORKFLOW_KEYS)
+    values['workdir'] = spec.workdir
+    text = json.dumps(values, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def skip_unchanged(spec, outputs=None, submit=False, max_files=20):
+    """Take the inputs whose scripts are up to date out of spec.
+
+    A script is up to date when its input hasn't changed since it was
+    written with the same settings and, with submit, it was submitted.
+    Job arrays and task farms are one script for all of their inputs
+    and are always written again. outputs are the script names for the
+    inputs, the ones that are still needed are returned.
+    """
+
+    if spec.array or spec.pack:
+        return outputs
+    settings_hash = script_settings(spec)
+    per_input = outputs and len(outputs) == len(spec.inputs)
+    inputs, kept, skipped = [], [], []
+    for i, gauss_input in enumerate(spec.inputs):
+        script = outputs[i] if per_input else \
+                 os.path.splitext(gauss_input)[0]+'.sh'
+        record = input_records.get(os.path.abspath(spec.path(gauss_input)),
+                                   {})
+        if record.get('unchanged') and \
+           record.get('settings') == settings_hash and \
+           record.get('script') == os.path.abspath(spec.path(script)) and \
+           os.path.isfile(record['script']) and \
+           (record.get('job') or not submit):
+            skipped.append((gauss_input, script))
+            continue
+        inputs.append(gauss_input)
+        if per_input: kept.append(outputs[i])
+
+    if skipped:
+        if len(skipped) <= max_files:
+            for gauss_input, script in skipped:
+                print('%s has not changed since %s was written'
+                      % (gauss_input, script))
+        print('\nSkipping %d input(s) whose scripts are up to date, use '
+              '--rebuild to write them again\n' % len(skipped))
+    spec.inputs = inputs
+    return kept if per_input else outputs
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def index_scripts(written, results=None):
+    """Save the records of this run's inputs to SCRIPT_INDEX.
+
+    written is a list of (spec, scripts) from write_jobs() and results
+    what submit_scripts() did with the scripts.
+    """
+
+    index = read_script_index()
+    job_ids = dict((os.path.abspath(script), job_id)
+                   for script, job_id, error in results or [])
+    for spec, scripts in written:
+        if spec.array or spec.pack: continue
+        settings_hash = script_settings(spec)
+        for gauss_input, script in zip(spec.inputs, scripts):
+            record = input_records.get(os.path.abspath(spec.path(gauss_input)))
+            if record is None: continue
+            script = os.path.abspath(spec.path(script))
+            record.update(settings=settings_hash, script=script,
+                          job=job_ids.get(script))
+    for path, record in input_records.items():
+        index[path] = dict((key, value) for key, value in record.items()
+                           if key != 'unchanged')
+    try:
+        write_json(SCRIPT_INDEX, {'stamp': index_stamp(), 'inputs': index})
+    except (IOError, OSError):
+        pass
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def benchmark_validation(n_files=2000):
+    """Time the input checks on a directory of generated input files."""
+
+    directory = tempfile.mkdtemp(prefix='gaussian-sub-bench-')
+    try:
+        geometry = ''.join('C  %.4f  0.0000  0.0000\n' % (1.5*i)
+                           for i in range(200))
+        inputs = []
+        for i in range(n_files):
+            gauss_input = os.path.join(directory, 'conf%05d.com' % i)
+            with open(gauss_input, 'w') as f:
+                f.write('%%mem=60GB\n%%nprocshared=28\n%%chk=conf%05d.chk\n'
+                        '#p b3lyp/6-31g(d) opt\n\nconformer %d\n\n0 1\n%s\n'
+                        % (i, i, geometry))
+            inputs.append(gauss_input)
+        context = {'allocation': 'hyak-stf', 'gen': 'mox', 'linda': False,
+                   'n_nodes': 1, 'pwd': directory}
+
+        parsed_inputs.clear()
+        start = time.time()
+        for gauss_input in inputs:
+            check_input_file(gauss_input, context)
+        serial = time.time() - start
+        parsed_inputs.clear()
+        start = time.time()
+        check_input_files(inputs, context)
+        parallel = time.time() - start
+
+        print('Validated %d input files' % n_files)
+        print('  one at a time : %8.0f files/s' % (n_files/serial))
+        print('  worker pool   : %8.0f files/s (%d workers)'
+              % (n_files/parallel, max(1, validation_workers(n_files))))
+    finally:
+        shutil.rmtree(directory)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class JobSpec(object):
+    """Everything the job scripts are written from.
+
+    The prompts fill one of these in, other Python code can make them
+    directly and write or submit thousands of jobs without the prompts
+    or a new interpreter for each one:
+
+        import gaussian_sub
+        spec = gaussian_sub.JobSpec(['water.com'], 'hyak-stf', cores=28,
+                                    memory=100, hours=4)
+        text = gaussian_sub.render_script(spec, 'water.com')
+        job_ids = gaussian_sub.submit_jobs([spec])
+
+    inputs         : Gaussian input files, relative to workdir
+    allocation     : e.g. 'hyak-stf'
+    queue          : 'batch' or 'ckpt'
+    nodes          : nodes per job, more than one uses Linda
+    cores          : cores on each node
+    memory         : Gb on each node, 0 for all of it
+    hours          : walltime
+    version        : e.g. 'g16.b01'
+    email          : UW NetID for the job notifications (default: whoami)
+    scratch        : 'n' for /gscratch/scrubbed, 'y' for the workdir or
+                     'node' for the node's own disk
+    disk           : Gb of node-local scratch for each run
+    stage_out      : scratch files to copy back with scratch='node'
+    array          : write one job array for all of the inputs
+    pack           : run all of the inputs in one job, slots at a time
+    throttle       : most array tasks to run at once
+    max_array_size : largest job array the controller accepts
+    workdir        : where the jobs run (default: current directory)
+    instrument     : write a .perf.json of measurements for each run
+    post           : POST_ACTIONS to run when each job ends, e.g.
+                     'summary,prune'
+    """
+
+    def __init__(self, inputs, allocation, queue='batch', nodes=1, cores=28,
+                 memory=0, hours=1, version='g16.b01', email=None,
+                 scratch='n', disk=0, stage_out=STAGE_OUT, array=False,
+                 pack=False, slots=1, throttle=None, max_array_size=1001,
+                 workdir=None, instrument=False, post=None):
+        self.inputs = list(inputs)
+        self.allocation = allocation
+        self.queue = 'ckpt' if queue == 'bf' else queue
+        self.nodes = nodes
+        self.cores = cores
+        self.memory = memory
+        self.hours = hours
+        self.version = version
+        self.email = email or user_name()
+        self.scratch = scratch
+        self.disk = disk
+        self.stage_out = stage_out
+        self.array = array
+        self.pack = pack
+        self.slots = slots
+        self.throttle = throttle
+        self.max_array_size = max_array_size
+        self.workdir = os.path.abspath(workdir or os.getcwd())
+        self.instrument = instrument
+        self.post = post
+
+    @property
+    def linda(self):
+        return self.nodes > 1
+
+    @property
+    def checkpointed(self):
+        """Whether the job can be preempted and requeued."""
+        return self.queue == 'ckpt'
+
+    def memory_request(self):
+        """Value for #SBATCH --mem, '0' asks for all of it."""
+        if not self.memory: return '0'
+        return '%dG' % self.memory
+
+    def path(self, name):
+        """Where a file named relative to workdir is from here."""
+        return os.path.relpath(os.path.join(self.workdir, name))
+#----------------------------------------------------------------------------
+
+
+#----------------------------------------------------------------------------
+def benchmark_render(n_files=10000, n_slow=200):
+    """Time writing job scripts with the compiled template.
+
+    The old way, a pwd subprocess and a fresh script for every file, is
+    timed on the first n_slow files only.
+    """
+
+    directory = tempfile.mkdtemp(prefix='gaussian-sub-bench-')
+    try:
+        inputs = ['conf%05d.com' % i for i in range(n_files)]
+        spec = JobSpec(inputs, 'hyak-stf', cores=28, memory=100, hours=4,
+                       email='nobody', workdir=directory)
+
+        start = time.time()
+        for gauss_input in inputs[:n_slow]:
+            run_command('pwd')
+            job_name = os.path.splitext(gauss_input)[0]
+            f = open(os.path.join(directory, job_name+'.sh'), 'w')
+            f.write(slurm_header(spec, job_name))
+            f.write(slurm_body(spec, "export inputfile='%s'" % gauss_input))
+            f.close()
+        slow = time.time() - start
+
+        start = time.time()
+        template = compile_script(spec)
+        texts = [render_script(spec, gauss_input, None, template)
+                 for gauss_input in inputs]
+        rendered = time.time() - start
+
+        start = time.time()
+        for gauss_input, text in zip(inputs, texts):
+            write_text(os.path.join(directory, gauss_input[:-4]+'.sh'), text)
+        written = time.time() - start
+
+        print('Rendered %d job scripts' % n_files)
+        print('  subprocess per file : %8.0f scripts/s' % (n_slow/slow))
+        print('  compiled template   : %8.0f scripts/s (%.3f s)'
+              % (n_files/rendered, rendered))
+        print('  + atomic writes     : %8.0f scripts/s (%.3f s)'
+              % (n_files/(rendered+written), rendered+written))
+    finally:
+        shutil.rmtree(directory)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_torque_script(spec, outputs):
+    """Make a .pbs script based on user specifications."""
+
+    for i in range(len(spec.inputs)):
+
+        gauss_input = spec.inputs[i]
+        job_name = os.path.splitext(gauss_input)[0]
+        print('Writing to '+outputs[i]+'\n')
+        pwd = spec.workdir
+        script = []
+ 
+        script.append(textwrap.dedent("""\
+            #!/bin/bash
+            #PBS -N %s
+            #PBS -l nodes=%d:ppn=%d,feature=%dcore""" 
+            % (job_name, spec.nodes, spec.cores, spec.cores))) 
+        if spec.queue != 'bf':
+            script.append('\n#PBS -l walltime=%s\n' % format_walltime(spec.hours))
+        else:
+            script.append('\n#PBS -l walltime=0:%d:00\n' % spec.hours)
+        script.append(textwrap.dedent("""\
+            #PBS -j oe
+            #PBS -o %s
+            #PBS -d %s\n""" % (pwd, pwd)))
+        if spec.queue == 'batch': 
+            script.append('#PBS -W group_list=%s\n' % spec.allocation)
+        script.append(textwrap.dedent("""\
+            #PBS -q %s
+ 
+            # load Gaussian environment
+            module load contrib/%s
+ 
+            # debugging information
+            HYAK_NPE=$(wc -l < $PBS_NODEFILE) 
+            HYAK_NNODES=$(uniq $PBS_NODEFILE | wc -l ) 
+            echo "**** Job Debugging Information ****"
+            echo "This job will run on $HYAK_NPE CPUs on $HYAK_NNODES nodes"
+            echo ""
+            echo Node:CPUs Used 
+            uniq -c $PBS_NODEFILE | awk '{print $2 ":" $1}' 
+            echo "SHARED LIBRARY CHECK"
+            ldd ./test
+            echo "ENVIRONMENT VARIABLES"
+            set
+            echo "**********************************************" """ 
+            % (spec.queue, spec.version)))
+ 
+        if spec.linda:
+            script.append(textwrap.dedent("""\
+                \n
+                # add linda nodes
+                HYAK_NNODES=$(uniq $PBS_NODEFILE | wc -l )
+                nodes=()
+                nodes+=(`uniq -c $PBS_NODEFILE | awk '{print $2}'`)
+                for ((i=0; i<${#nodes[*]}-1; i++));
+                do
+                \tstring+=${nodes[$i]}
+                \tstring+=","
+                done 
+                string+=${nodes[$HYAK_NNODES-1]}
+                sed -i -e "s/%%LindaWorker.*/%%LindaWorker=$string/Ig" %s
+ 
+                # check that the Linda nodes are correct
+                lindaline=(`grep -i 'lindaworker' %s`)
+                if [[ $lindaline == *$string ]]
+                then
+                \techo "Using the correct nodes for Linda"
+                else
+                \techo "Using the wrong nodes for Linda"
+                \techo "Nodes assigned by scheduler = $string"
+                \techo "Line in Gaussian input file = $lindaline"
+                \texit 1
+                fi """ % (gauss_input, gauss_input)))
+ 
+        if spec.queue == 'bf':
+            script.append(textwrap.dedent("""\
+              \n
+              # copy last log file to another name
+              num=`ls -l %s*.log | wc -l`
+              cp %s.log %s$num.log""" % (job_name, job_name, job_name)))
+ 
+        command = gaussian_command(spec.version)
+        script.append(textwrap.dedent("""\
+            \n
+            # run Gaussian
+            %s %s 
+ 
+            exit 0 """ % (command, gauss_input)))
+        write_output(spec.path(outputs[i]), ''.join(script))
+
+        print("""Please run 'qsub %s' to submit to the scheduler\n""" 
+              % outputs[i])
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def restart_input_name(gauss_input):
+    """name_restart.com for name.com, the job script relies on this."""
+
+    base, extension = os.path.splitext(gauss_input)
+    return base+'_restart'+extension
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def restart_route(model):
+    """Route section that picks a job up again from its checkpoint file.
+
+    Optimizations, IRCs and frequency jobs are restarted with their own
+    Restart option, everything else reads the geometry and wavefunction
+    back with Geom=AllCheck Guess=Read.
+    """
+
+    prefix = model.route.split()[0] if model.route else '#'
+    if not re.match(r'^#[pntPNT]?$', prefix): prefix = '#'
+    method, basis = model.method, model.basis
+    keywords = dict(model.keywords)
+    for keyword in ('geom', 'guess'):
+        keywords.pop(keyword, None)
+
+    for job in RESTART_JOBS:
+        if job in keywords:
+            options = [option for option in keywords[job].split(',')
+                       if option and option != 'restart']
+            keywords[job] = ','.join(options+['restart'])
+            break
+    else:
+        keywords['geom'] = 'allcheck'
+        keywords['guess'] = 'read'
+        if basis in ('gen', 'genecp'):
+            basis = None
+            keywords['chkbasis'] = ''
+
+    route = [prefix]
+    if method and basis: route.append(method+'/'+basis)
+    elif method: route.append(method)
+    elif basis: route.append(basis)
+    for keyword in sorted(keywords):
+        options = keywords[keyword]
+        if options: route.append('%s=(%s)' % (keyword, options))
+        else: route.append(keyword)
+    return ' '.join(route)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_restart_input(gauss_input, dry_run=False):
+    """Write the input a preempted ckpt job is restarted with.
+
+    The Link 0 section is kept (with a %chk added if there was none,
+    like the job script does), the route asks for a restart and the
+    title and molecule are read from the checkpoint file. Rigid scans
+    and inputs with --Link1-- steps can't be picked up part way through,
+    so they get no restart input and are rerun from the start.
+    """
+
+    model = load_input(gauss_input)
+    if 'scan' in model.keywords or model.link1:
+        return
+    lines = []
+    if not model.has_link0('chk'):
+        lines.append('%%chk=%s.chk' % os.path.splitext(gauss_input)[0])
+    for command, value in model.link0:
+        if value is None: lines.append('%'+command)
+        else: lines.append('%%%s=%s' % (command, value))
+    lines.append(restart_route(model))
+    lines.append('')
+    # Sections after the molecule still apply to Geom=AllCheck, except
+    # for Z-matrix variables and a basis set that now comes from the
+    # checkpoint file.
+    job = [job for job in RESTART_JOBS if job in model.keywords]
+    if not job and model.basis not in ('gen', 'genecp'):
+        trailing = model.trailing
+        if any(atom[1] is None for atom in model.atoms):
+            trailing = trailing[1:]
+        for section in trailing:
+            lines.extend([section, ''])
+
+    write_output(restart_input_name(gauss_input), '\n'.join(lines)+'\n',
+                 dry_run)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def slurm_header(spec, job_name, directives=()):
+    """The #SBATCH lines for a job, plus any extra directives."""
+
+    partition, account = slurm_account(spec.allocation, spec.queue)
+
+    header = textwrap.dedent("""\
+        #!/bin/bash
+        #SBATCH --job-name=%s
+        #SBATCH --nodes=%d
+        #SBATCH --cpus-per-task=%d""" % (job_name, spec.nodes, spec.cores))
+    header += '\n#SBATCH --time=%s\n' % format_walltime(spec.hours)
+    header += textwrap.dedent("""\
+        #SBATCH --mem=%s
+        #SBATCH --chdir=%s
+        #SBATCH --mail-type=FAIL,END
+        #SBATCH --mail-user=%s@uw.edu
+
+        #SBATCH --partition=%s
+        #SBATCH --account=%s\n"""
+        % (spec.memory_request(), spec.workdir, spec.email, partition,
+           account))
+    if spec.checkpointed:
+        header += '#SBATCH --requeue\n'
+    if spec.scratch == 'node':
+        header += '#SBATCH --tmp=%dG\n' % (spec.disk*spec.slots)
+    for directive in directives:
+        header += '#SBATCH %s\n' % directive
+    return header+'\n'
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def slurm_environment(spec, input_line):
+    """Load Gaussian, print debugging information and set the scratch."""
+
+    body = ''
+    if spec.instrument:
+        body = 'perf_started=$(date +%s.%N)\n'
+    body += textwrap.dedent("""\
+        # load Gaussian environment
+        module load contrib/%s
+        %s
+
+
+        # debugging information
+        echo "**** Job Debugging Information ****"
+        echo "This job will run on $SLURM_JOB_NODELIST"
+        echo ""
+        echo "ENVIRONMENT VARIABLES"
+        set
+        echo "**********************************************" """ 
+        % (spec.version,input_line))
+
+    if spec.scratch == 'node':
+        body += node_scratch(spec)
+
+    elif spec.scratch == 'y':
+        body += textwrap.dedent("""\
+            \n
+            # local scratch
+            export GAUSS_SCRDIR='%s'
+            """ % (spec.workdir))
+
+    else:
+        body += textwrap.dedent("""\
+            \n
+            # scrubbed scratch
+            export scrDir='/gscratch/scrubbed/%s/'
+            mkdir -p $scrDir
+            export GAUSS_SCRDIR=$scrDir
+            """ % (spec.email))
+
+    if spec.post:
+        body += post_run(spec)
+    if spec.instrument:
+        body += instrumentation(spec)
+    return body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def node_scratch(spec):
+    """Put the scratch on the node's own disk, with stage-in and stage-out.
+
+    stage_in copies an input to the scratch, moves its %chk there too
+    and adds MaxDisk to the route. Whatever was asked for in STAGE_OUT
+    is copied back by an EXIT trap, so it also happens when Gaussian
+    fails or the job is killed at the time limit.
+    """
+
+    extensions = (spec.stage_out or STAGE_OUT).replace(',', ' ')
+    extensions = extensions.split()
+    body = textwrap.dedent("""\
+        \n
+        # node-local scratch
+        export GAUSS_SCRDIR=%s/gaussian.$SLURM_JOB_ID
+        mkdir -p $GAUSS_SCRDIR
+        staged=$GAUSS_SCRDIR/.staged
+
+        # copy an input and its checkpoint file to the scratch
+        stage_in() {
+        \tlocal input=$GAUSS_SCRDIR/$(basename $1)
+        \tlocal chk=$(sed -n 's/^%%chk *= *//Ip' $1 | tail -1)
+        \tcp $1 $input
+        \tif [ -n "$chk" ]; then
+        \t\tcase $chk in *.*) ;; *) chk=$chk.chk ;; esac
+        \t\tlocal scratch_chk=$GAUSS_SCRDIR/$(basename $chk)
+        \t\tif [ -f "$chk" ]; then cp $chk $scratch_chk; fi
+        \t\tsed -i "s|^%%chk *=.*|%%chk=$scratch_chk|I" $input
+        \t\techo "$scratch_chk $chk" >> $staged
+        \tfi
+        \tgrep -qi 'maxdisk' $input || \\
+        \t\tsed -i "0,/^ *#/s/^ *#.*/& MaxDisk=%dGB/" $input
+        \techo $input
+        }
+
+        # copy the results back and clean up, even after a failure
+        stage_out() {""" % (NODE_SCRATCH, spec.disk))
+    if spec.instrument:
+        body = body.replace('\tlocal input=',
+                            '\tperf_mark stage_in_start\n\tlocal input=')
+        body = body.replace('\techo $input',
+                            '\tperf_mark stage_in_end\n\techo $input')
+    if 'chk' in extensions:
+        body += ('\n\tif [ -f $staged ]; then'
+                 '\n\t\twhile read scratch_chk chk; do'
+                 '\n\t\t\tcp $scratch_chk $chk 2>/dev/null'
+                 '\n\t\tdone < $staged'
+                 '\n\tfi')
+    others = [ext for ext in extensions if ext != 'chk']
+    if others:
+        body += ('\n\tfor ext in %s; do'
+                 '\n\t\tcp $GAUSS_SCRDIR/*.$ext $SLURM_SUBMIT_DIR/ 2>/dev/null'
+                 '\n\tdone' % ' '.join(others))
+    body += textwrap.dedent("""
+        \trm -rf $GAUSS_SCRDIR
+        }
+        trap stage_out EXIT
+        trap 'exit 1' TERM
+        """)
+    if spec.post:
+        body = body.replace('trap stage_out EXIT',
+                            "trap 'stage_out; post_run' EXIT")
+    return body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def post_run(spec):
+    """A post_run function for 'gaussian-sub.py post' at the end of the job.
+
+    It runs from the EXIT trap, after the stage-out and the .perf.json.
+    """
+
+    launcher = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'gaussian-sub.py')
+    command = '%s %s post --actions %s' % (sys.executable or 'python',
+                                          launcher, spec.post)
+    if spec.scratch != 'node':
+        command += ' --scratch "$GAUSS_SCRDIR"'
+    body = textwrap.dedent("""\
+        \n
+        # summarize the runs and tidy up after them when the job ends
+        post_run() {
+        \t%s ${manifest:+--manifest $manifest} $inputfile
+        }
+        """ % command)
+    if spec.scratch != 'node':
+        body += 'trap post_run EXIT\n'
+    return body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def instrumentation(spec):
+    """Shell functions that measure how a Gaussian run used the node.
+
+    perf_mark notes when a phase starts or ends, perf_watch samples the
+    memory and CPU time of the Gaussian processes every
+    INSTRUMENT_INTERVAL seconds until the run finishes and perf_write
+    puts all of it, with the per-link timings from the log, in a
+    .perf.json next to the log.
+    """
+
+    scratch = {'n': 'scrubbed', 'y': 'submit', 'node': 'node'}[spec.scratch]
+    return textwrap.dedent("""\
+        \n
+        # runtime instrumentation, written to <input>.perf.json
+        perf_interval=%d
+        perf_begin() {
+        \tperf_base=${inputfile%%.*}
+        \trm -f $perf_base.perf.tmp $perf_base.perf.samples
+        }
+        perf_mark() {
+        \techo "$1 $(date +%%s.%%N)" >> $perf_base.perf.tmp
+        }
+
+        # RSS (kb), CPU time (s) and current link of a process tree
+        perf_sample() {
+        \twhile kill -0 $1 2>/dev/null; do
+        \t\tps -e -o pid=,ppid=,rss=,cputime=,comm= | awk -v root=$1 \\
+        \t\t    -v now=$(date +%%s) '
+        \t\t{ parent[$1] = $2; rss[$1] = $3; cpu[$1] = $4; comm[$1] = $5 }
+        \t\tEND {
+        \t\t\tfor (pid in parent) {
+        \t\t\t\tp = pid
+        \t\t\t\twhile (p != root && p in parent && p > 1) p = parent[p]
+        \t\t\t\tif (p != root) continue
+        \t\t\t\ttotal_rss += rss[pid]
+        \t\t\t\tn = split(cpu[pid], f, /[-:]/)
+        \t\t\t\ttotal_cpu += f[n] + 60*f[n-1] + 3600*f[n-2] + (n > 3 ? 86400*f[1] : 0)
+        \t\t\t\tif (comm[pid] ~ /^l[0-9]+\\.exe$/) link = comm[pid]
+        \t\t\t}
+        \t\t\tprintf "%%d %%d %%d %%s\\n", now, total_rss, total_cpu, link ? link : "-"
+        \t\t}' >> $perf_base.perf.samples
+        \t\tsleep $perf_interval
+        \tdone
+        }
+
+        # sample a run until it finishes, returns its exit status
+        perf_watch() {
+        \tperf_sample $1 &
+        \tlocal sampler=$!
+        \twait $1
+        \tperf_status=$?
+        \tperf_mark run_end
+        \tkill $sampler 2>/dev/null
+        \treturn $perf_status
+        }
+
+        perf_write() {
+        \ttouch $perf_base.perf.tmp $perf_base.perf.samples
+        \tgrep -h -e 'Leave Link' -e 'Job cpu time' -e 'Elapsed time' \\
+        \t    $perf_base.log 2>/dev/null | awk -v status=$1 \\
+        \t    -v started=$perf_started -v input=$inputfile \\
+        \t    -v logfile=$perf_base.log -v host=$(hostname) \\
+        \t    -v cores=${per_slot:-$num_threads} -v gbmem=$gbmem \\
+        \t    -v scratch=%s -v job=$SLURM_JOB_ID \\
+        \t    -v task=${SLURM_ARRAY_TASK_ID:--1} \\
+        \t    -v restart=${SLURM_RESTART_COUNT:-0} '
+        \tfunction phase(name, start, end) {
+        \t\tif (start == "" || end == "") return
+        \t\tprintf "%%s\\n    \\"%%s\\": [%%.3f, %%.3f]", sep, name, start, end
+        \t\tsep = ","
+        \t}
+        \tFILENAME == ARGV[1] { t[$1] = $2; next }
+        \tFILENAME == ARGV[2] {
+        \t\tsamples = samples (n++ ? ",\\n    " : "\\n    ") \\
+        \t\t          sprintf("[%%d, %%d, %%d, \\"%%s\\"]", $1, $2, $3, $4)
+        \t\tif ($2 > max_rss) max_rss = $2
+        \t\tnext
+        \t}
+        \t/Leave Link/ {
+        \t\tcount[$3]++
+        \t\tfor (i = 4; i < NF; i++) {
+        \t\t\tif ($i == "cpu:") cpu[$3] += $(i+1)
+        \t\t\tif ($i == "elap:") elap[$3] += $(i+1)
+        \t\t}
+        \t\tnext
+        \t}
+        \t/Job cpu time/ { job_cpu += $4*86400 + $6*3600 + $8*60 + $10 }
+        \t/Elapsed time/ { job_elap += $3*86400 + $5*3600 + $7*60 + $9 }
+        \tEND {
+        \t\tsetup_end = ("stage_in_start" in t) ? t["stage_in_start"] : t["run_start"]
+        \t\trun_start = ("stage_in_end" in t) ? t["stage_in_end"] : t["run_start"]
+        \t\tprintf "{\\n  \\"job_id\\": \\"%%s\\",\\n", job
+        \t\tprintf "  \\"array_task\\": %%s,\\n", (task >= 0 ? task : "null")
+        \t\tprintf "  \\"restart\\": %%d,\\n", restart
+        \t\tprintf "  \\"input\\": \\"%%s\\",\\n  \\"log\\": \\"%%s\\",\\n", input, logfile
+        \t\tprintf "  \\"host\\": \\"%%s\\",\\n  \\"cores\\": %%d,\\n", host, cores
+        \t\tprintf "  \\"memory_gb\\": %%d,\\n  \\"scratch\\": \\"%%s\\",\\n", gbmem, scratch
+        \t\tprintf "  \\"exit_status\\": %%d,\\n  \\"phases\\": {", status
+        \t\tphase("setup", started, setup_end)
+        \t\tphase("stage_in", t["stage_in_start"], t["stage_in_end"])
+        \t\tphase("run", run_start, t["run_end"])
+        \t\tphase("stage_out", t["stage_out_start"], t["stage_out_end"])
+        \t\tprintf "\\n  },\\n  \\"job_cpu_seconds\\": %%.1f,\\n", job_cpu
+        \t\tprintf "  \\"job_elapsed_seconds\\": %%.1f,\\n", job_elap
+        \t\tprintf "  \\"max_rss_kb\\": %%d,\\n  \\"links\\": {", max_rss
+        \t\tsep = ""
+        \t\tfor (id in count) {
+        \t\t\tprintf "%%s\\n    \\"%%s\\": {\\"count\\": %%d, \\"cpu\\": %%.1f, \\"elapsed\\": %%.1f}", \\
+        \t\t\t       sep, id, count[id], cpu[id], elap[id]
+        \t\t\tsep = ","
+        \t\t}
+        \t\tprintf "\\n  },\\n  \\"samples\\": [%%s\\n  ]\\n}\\n", samples
+        \t}' $perf_base.perf.tmp $perf_base.perf.samples - > $perf_base.perf.json.tmp
+        \tmv $perf_base.perf.json.tmp $perf_base.perf.json
+        \trm -f $perf_base.perf.tmp $perf_base.perf.samples
+        }
+        """ % (INSTRUMENT_INTERVAL, scratch))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def perf_exit(spec):
+    """Start measuring $inputfile and write the .perf.json at exit.
+
+    With node-local scratch the EXIT trap also times the stage-out.
+    """
+
+    body = textwrap.dedent("""\
+        \n
+        # write the measurements when the job ends
+        perf_begin
+        perf_exit() {
+        \tlocal status=$?""")
+    if spec.scratch == 'node':
+        body += ('\n\tperf_mark stage_out_start'
+                 '\n\tstage_out'
+                 '\n\tperf_mark stage_out_end')
+    body += '\n\tperf_write ${perf_status:-$status}'
+    if spec.post:
+        body += '\n\tpost_run'
+    body += textwrap.dedent("""
+        }
+        trap perf_exit EXIT
+        """)
+    return body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def gaussian_command(version):
+    """The Gaussian executable for a version like g16.b01."""
+
+    if 'gdv' in version: 
+        return 'gdv'
+    elif 'g16' in version:
+        return 'g16'
+    else:
+        return 'g09'
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def gaussian_run(spec, input_file, log=None):
+    """The command that runs Gaussian on input_file.
+
+    With node-local scratch the input is staged in and read from stdin,
+    so that the log still goes next to the original input.
+    """
+
+    command = gaussian_command(spec.version)
+    if spec.scratch == 'node':
+        input_file = '$(stage_in %s)' % input_file
+        log = log or '${inputfile%.*}.log'
+    if log:
+        return '%s < %s > %s' % (command, input_file, log)
+    return '%s %s' % (command, input_file)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def slurm_body(spec, input_line):
+    """Everything after the #SBATCH lines.
+
+    input_line must set $inputfile, the rest of the script only refers
+    to the input through that variable.
+    """
+
+    body = slurm_environment(spec, input_line)
+    if spec.instrument:
+        body += perf_exit(spec)
+    body += textwrap.dedent("""\
+        \n
+        ## Memory
+        gbmem=`expr $SLURM_MEM_PER_NODE / 1000`
+        gbmem=`expr $gbmem - 10`
+        echo "Parsed memory: $gbmem"
+        sed -i "/^ *%mem *=/Is/.*/%mem=${gbmem}GB/" $inputfile
+        """)
+
+    body += textwrap.dedent("""\
+        \n
+        ## Set number of threads
+        export num_threads=$(echo $SLURM_JOB_CPUS_PER_NODE| cut -f1 -d"(" )
+        sed -i "/^ *%nproc\\(shared\\)\\? *=/Is/.*/%nprocshared=${num_threads}/" $inputfile
+        """)
+
+
+    if spec.linda:
+        body += textwrap.dedent("""\
+            \n
+            # add linda nodes
+            nodes=()
+            nodes+=(`scontrol show hostnames $SLURM_JOB_NODELIST `)
+            for ((i=0; i<${#nodes[*]}-1; i++));
+            do
+            \tstring+=${nodes[$i]}
+            \tstring+=","
+            done 
+            string+=${nodes[$SLURM_NNODES-1]}
+            sed -i -e "s/%LindaWorker.*/%LindaWorker=$string/gI" "$inputfile"
+ 
+            # check that the Linda nodes are correct
+            lindaline=(`grep -i 'lindaworker' $inputfile`)
+            if [[ $lindaline == *$string ]]
+            then
+            \techo "Using the correct nodes for Linda"
+            else
+            \techo "Using the wrong nodes for Linda"
+            \techo "Nodes assigned by scheduler = $string"
+            \techo "Line in Gaussian input file = $lindaline"
+            \texit 1
+            fi """ )
+ 
+    if spec.checkpointed:
+        body += textwrap.dedent("""\
+          \n
+          # copy last log file to another name
+          base=${inputfile%.*}
+          num=`ls -l $base*.log | wc -l`
+          let "num += 1"
+          cp $base.log $base$num.log""")
+
+        # After a preemption Slurm requeues the job with
+        # SLURM_RESTART_COUNT set, and the run carries on from the
+        # checkpoint file with the _restart input.
+        body += textwrap.dedent("""\
+            \n
+            # make sure there is a checkpoint file to restart from
+            grep -qi '^%%chk' $inputfile || sed -i "1i %%chk=${base}.chk" $inputfile
+            chkfile=$(sed -n 's/^%%chk *= *//Ip' $inputfile | tail -1)
+            restartfile=${base}_restart.${inputfile##*.}
+            if [ -f "$restartfile" ]; then
+            \tsed -i -e "/^ *%%mem *=/Is/.*/%%mem=${gbmem}GB/" \\
+            \t       -e "/^ *%%nproc\\(shared\\)\\? *=/Is/.*/%%nprocshared=${num_threads}/" $restartfile
+            fi
+
+            # save what we have if the job is preempted
+            save_state() {
+            \techo "Preempted, saving the state of $inputfile"
+            \tkill -TERM $gaussian_pid 2>/dev/null
+            \twait $gaussian_pid
+            \tsync
+            \texit 1
+            }
+            trap save_state TERM USR1
+
+            # run Gaussian
+            if [ "${SLURM_RESTART_COUNT:-0}" -gt 0 ] && [ -s "$chkfile" ] \\
+               && [ -f "$restartfile" ]; then
+            \techo "Restarting from $chkfile (restart $SLURM_RESTART_COUNT)"
+            \t%s &
+            else
+            \t%s &
+            fi
+            gaussian_pid=$!
+            wait $gaussian_pid
+ 
+            exit 0 """ % (gaussian_run(spec, '$restartfile', '$base.log'),
+                            gaussian_run(spec, '$inputfile')))
+        if spec.instrument:
+            body = body.replace('# run Gaussian\n',
+                                '# run Gaussian\nperf_mark run_start\n')
+            body = body.replace('gaussian_pid=$!\nwait $gaussian_pid\n',
+                                'gaussian_pid=$!\nperf_watch $gaussian_pid\n')
+        return body
+ 
+    run = gaussian_run(spec, '$inputfile')
+    if spec.instrument:
+        run = 'perf_mark run_start\n%s &\nperf_watch $!' % run
+    body += textwrap.dedent("""\
+        \n
+        # run Gaussian
+        %s
+ 
+        exit 0 """ % (run))
+    return body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class ScriptTemplate(object):
+    """A job script with slots for the fields that change between inputs.
+
+    The script is put together once, with field('name') wherever a
+    field goes, and fill() then only has to join the pieces.
+    """
+
+    def __init__(self, text):
+        self.parts = re.split('\x00(\\w+)\x00', text)
+
+    @staticmethod
+    def field(name):
+        return '\x00%s\x00' % name
+
+    def fill(self, **fields):
+        parts = list(self.parts)
+        parts[1::2] = [fields[name] for name in self.parts[1::2]]
+        return ''.join(parts)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def compile_script(spec):
+    """The single input job script for spec, as a ScriptTemplate.
+
+    The fields are job_name and gauss_input.
+    """
+
+    field = ScriptTemplate.field
+    return ScriptTemplate(slurm_header(spec, field('job_name')) +
+        slurm_body(spec, "export inputfile='%s'" % field('gauss_input')))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def render_script(spec, gauss_input, job_name=None, template=None):
+    """The job script for one input, as text.
+
+    Pass the template from compile_script(spec) when rendering many.
+    """
+
+    if job_name is None:
+        job_name = os.path.splitext(gauss_input)[0]
+    if template is None:
+        template = compile_script(spec)
+    return template.fill(job_name=job_name, gauss_input=gauss_input)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_slurm_script(spec, outputs=None, dry_run=False):
+    """Write a .sh script for each input, returns the script names.
+
+    outputs are the script names, the default is the input name with
+    a .sh extension. A dry run prints the scripts instead.
+    """
+
+    # Loop over the input files
+    template = compile_script(spec)
+    jobs, scripts = [], []
+    for i in range(len(spec.inputs)):
+
+        gauss_input = spec.inputs[i]
+        job_name = os.path.splitext(gauss_input)[0]
+        script = outputs[i] if outputs else job_name+'.sh'
+        write_output(spec.path(script),
+                     render_script(spec, gauss_input, job_name, template),
+                     dry_run)
+        if spec.checkpointed:
+            write_restart_input(spec.path(gauss_input), dry_run)
+        jobs.append((history_key(spec.workdir, job_name),
+                     spec.path(gauss_input)))
+        scripts.append(script)
+    if not dry_run:
+        record_jobs(jobs, spec.cores*spec.nodes)
+    return scripts
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def array_name(spec, output=None):
+    """Name for the job array script, without the extension."""
+
+    if output:
+        return re.sub(r'\.sh$', '', output)
+    if len(spec.inputs) == 1:
+        return os.path.splitext(spec.inputs[0])[0]
+    prefix = os.path.commonprefix(
+        [os.path.basename(os.path.splitext(gauss_input)[0])
+         for gauss_input in spec.inputs]).rstrip('_-.')
+    return (prefix or 'gaussian')+'_array'
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_manifest(spec, manifest, dry_run=False):
+    """List the inputs one per line for the array and task farm scripts."""
+
+    write_output(spec.path(manifest), '\n'.join(spec.inputs)+'\n', dry_run)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def render_array(spec, manifest, job_name, offset=0, size=None):
+    """The job array script for size inputs of the manifest, as text.
+
+    Each array task picks the line of the manifest matching its
+    SLURM_ARRAY_TASK_ID, counting from line offset+1.
+    """
+
+    if size is None:
+        size = len(spec.inputs)-offset
+    array = '--array=0-%d' % (size-1)
+    if spec.throttle: array += '%%%d' % spec.throttle
+    input_line = ('export inputfile=$(sed -n '
+                  '"$((SLURM_ARRAY_TASK_ID + %d))p" %s)' 
+                  % (offset+1, manifest))
+    return slurm_header(spec, job_name, [array]) + slurm_body(spec, input_line)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_slurm_array(spec, output=None, dry_run=False):
+    """Write a job array for all of the input files, returns the script names.
+
+    Arrays larger than the controller's MaxArraySize are split into
+    several scripts that share the manifest.
+    """
+
+    name = array_name(spec, output)
+    manifest = name+'.manifest'
+    write_manifest(spec, manifest, dry_run)
+    if spec.checkpointed:
+        for gauss_input in spec.inputs:
+            write_restart_input(spec.path(gauss_input), dry_run)
+
+    max_size = spec.max_array_size
+    chunks = range(0, len(spec.inputs), max_size)
+    jobs, scripts = [], []
+    for offset in chunks:
+        size = min(max_size, len(spec.inputs)-offset)
+        f_array = name+'.sh'
+        if len(chunks) > 1:
+            f_array = '%s_%d.sh' % (name, offset//max_size+1)
+
+        job_name = os.path.basename(f_array[:-len('.sh')])
+        write_output(spec.path(f_array),
+                     render_array(spec, manifest, job_name, offset, size),
+                     dry_run)
+        jobs.extend((history_key(spec.workdir, job_name, task),
+                     spec.path(spec.inputs[offset+task]))
+                    for task in range(size))
+        scripts.append(f_array)
+    if not dry_run:
+        record_jobs(jobs, spec.cores*spec.nodes)
+    return scripts
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_benchmark(argv):
+    """gaussian-sub.py benchmark {validate,render} [N]
+
+    validate times the input checks on N generated inputs (default
+    2000), see benchmark_validation(). render times writing N job
+    scripts (default 10000), see benchmark_render().
+    """
+
+    benchmarks = {'validate': benchmark_validation,
+                  'render'  : benchmark_render}
+    if len(argv) == 0 or argv[0] not in benchmarks:
+        print('Usage: gaussian-sub.py benchmark {%s} [N]'
+              % ','.join(sorted(benchmarks)))
+        sys.exit()
+    if len(argv) > 1:
+        benchmarks[argv[0]](int(argv[1]))
+    else:
+        benchmarks[argv[0]]()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def render_farm(spec, manifest, job_name):
+    """The script that works through all of the inputs on one node, as text.
+
+    spec.slots Gaussian runs share the allocation, each with its own
+    set of cores and an equal part of the memory. Every slot takes the
+    next input from the manifest as soon as its previous run finishes.
+    """
+
+    body = slurm_environment(spec, "export manifest='%s'" % manifest)
+    body += textwrap.dedent("""\
+        \n
+        ## Task farm: run %d inputs at a time, each on its own cores
+        slots=%d
+        total=$(wc -l < $manifest)
+        gbmem=`expr $SLURM_MEM_PER_NODE / 1000`
+        gbmem=`expr \\( $gbmem - 10 \\) / $slots`
+        echo "Parsed memory per slot: $gbmem"
+
+        # cores this job may use, e.g. 0-13,28-41
+        expand_cpus() {
+        \tlocal IFS=,
+        \tfor range in $1; do seq ${range%%-*} ${range##*-}; done
+        }
+        cpus=($(expand_cpus $(awk '/Cpus_allowed_list/ {print $2}' /proc/self/status)))
+        per_slot=`expr ${#cpus[*]} / $slots`
+        if [ $per_slot -lt 1 ]; then per_slot=1; fi
+
+        # hand out the manifest lines one at a time
+        counter=.farm.$SLURM_JOB_ID
+        echo 0 > $counter
+        next_input() {
+        \tflock 9
+        \tn=$(cat $counter)
+        \techo $((n + 1)) > $counter
+        \techo $n
+        } 9> $counter.lock
+
+        run_slot() {
+        \tlocal slot=$1
+        \tlocal slot_cpus=$(IFS=,; echo "${cpus[*]:$((slot * per_slot)):$per_slot}")
+        \tif [ -z "$slot_cpus" ]; then slot_cpus=$(IFS=,; echo "${cpus[*]}"); fi
+        \twhile true; do
+        \t\tn=$(next_input)
+        \t\tif [ $n -ge $total ]; then break; fi
+        \t\tinputfile=$(sed -n "$((n + 1))p" $manifest)
+        \t\tsed -i "/^ *%%mem *=/Is/.*/%%mem=${gbmem}GB/" $inputfile
+        \t\tsed -i "/^ *%%nproc\\(shared\\)\\? *=/Is/.*/%%nprocshared=${per_slot}/" $inputfile""" 
+        % (spec.slots, spec.slots))
+
+    if spec.checkpointed:
+        body += ('\n\t\tbase=${inputfile%.*}'
+                 '\n\t\tnum=`ls -l $base*.log 2>/dev/null | wc -l`'
+                 '\n\t\tlet "num += 1"'
+                 '\n\t\tcp $base.log $base$num.log 2>/dev/null')
+
+    run = 'taskset -c $slot_cpus '+gaussian_run(spec, '$inputfile')
+    if spec.instrument:
+        run = ('perf_begin\n\t\tperf_mark run_start\n\t\t%s &'
+               '\n\t\tperf_watch $!\n\t\tperf_write $perf_status' % run)
+    body += textwrap.dedent("""
+        \t\techo "Slot $slot: running $inputfile on cores $slot_cpus"
+        \t\t%s
+        \tdone
+        }
+
+        # run Gaussian
+        for ((slot=0; slot<$slots; slot++)); do
+        \trun_slot $slot &
+        done
+        wait
+        rm -f $counter $counter.lock
+ 
+        exit 0 """) % run
+    return slurm_header(spec, job_name) + body
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_slurm_farm(spec, output=None, dry_run=False):
+    """Write the manifest and the task farm script, returns [script]."""
+
+    name = array_name(spec, output)
+    manifest = name+'.manifest'
+    f_farm = name+'.sh'
+    write_manifest(spec, manifest, dry_run)
+    write_output(spec.path(f_farm),
+                 render_farm(spec, manifest, os.path.basename(name)), dry_run)
+    return [f_farm]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def write_jobs(spec, outputs=None, dry_run=False):
+    """Write everything the jobs in spec need, returns the script names.
+
+    That is the manifest for arrays and task farms and the restart
+    inputs on ckpt, as well as the scripts. outputs names the scripts,
+    for arrays and task farms only the first one is used. A dry run
+    prints all of it instead and leaves the history and the result
+    index alone.
+    """
+
+    if spec.pack:
+        scripts = write_slurm_farm(spec, outputs[0] if outputs else None,
+                                   dry_run)
+    elif spec.array:
+        scripts = write_slurm_array(spec, outputs[0] if outputs else None,
+                                    dry_run)
+    else:
+        scripts = write_slurm_script(spec, outputs, dry_run)
+    if not dry_run:
+        index_results([spec.path(gauss_input) for gauss_input in spec.inputs])
+    return scripts
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class SubmitError(Exception):
+    """sbatch did not accept a job script.
+
+    transient is True for errors that are worth trying again, like the
+    controller being too busy to answer, and uncertain for the ones
+    after which the job may have been queued all the same.
+    """
+
+    def __init__(self, message, transient=False, uncertain=False):
+        Exception.__init__(self, message)
+        self.transient = transient
+        self.uncertain = uncertain
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def submit_script(script, after=None, comment=None):
+    """Submit a job script with sbatch and return the job ID.
+
+    after is a list of job IDs that have to finish successfully before
+    this one starts, it is cancelled if any of them fail. comment is
+    given to sbatch as --comment.
+    """
+
+    command = ['sbatch', '--parsable']
+    if comment:
+        command.append('--comment='+comment)
+    if after:
+        command += ['--dependency=afterok:'+':'.join(after),
+                    '--kill-on-invalid-dep=yes']
+    try:
+        process = Popen(command+[script], stdout=PIPE, stderr=PIPE)
+    except OSError as error:
+        raise SubmitError('sbatch %s: %s' % (script, error))
+    output, error = process.communicate()
+    if not isinstance(output, str):
+        output = output.decode('utf-8', 'replace')
+        error = error.decode('utf-8', 'replace')
+    if process.returncode != 0:
+        error = error.strip()
+        raise SubmitError('sbatch %s: %s' % (script, error),
+                          re.search(TRANSIENT_ERRORS, error, re.I) is not None,
+                          re.search(UNCERTAIN_ERRORS, error, re.I) is not None)
+    # --parsable prints jobid[;cluster]
+    return output.strip().split(';')[0]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class RateLimiter(object):
+    """Spaces calls out to at most rate a second, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0/rate
+        self.next_call = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def queued_job(comment):
+    """ID of the user's job with this --comment, '' if there is none.
+
+    None if squeue couldn't be asked either.
+    """
+
+    command = ['squeue', '-h', '-t', 'all', '-u', user_name(),
+               '-o', '%F|%k']
+    try:
+        process = Popen(command, stdout=PIPE, stderr=PIPE)
+    except OSError:
+        return None
+    output, error = process.communicate()
+    if process.returncode != 0:
+        return None
+    if not isinstance(output, str):
+        output = output.decode('utf-8', 'replace')
+    for line in output.splitlines():
+        job_id, _, text = line.partition('|')
+        if text.strip() == comment:
+            return job_id.strip()
+    return ''
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def submit_with_retry(script, limiter, after=None):
+    """submit_script(), trying transient failures again with a backoff.
+
+    sbatch can time out after the controller has queued the job, so the
+    job is tagged with a --comment token and, after such an error, only
+    submitted again if squeue doesn't know the token.
+    """
+
+    comment = 'gaussian-sub:'+hashlib.sha1(os.urandom(16)).hexdigest()[:16]
+    for attempt in range(SUBMIT_RETRIES+1):
+        limiter.wait()
+        try:
+            return submit_script(script, after, comment)
+        except SubmitError as error:
+            if error.uncertain:
+                limiter.wait()
+                job_id = queued_job(comment)
+                if job_id:
+                    return job_id
+                if job_id is None:
+                    raise SubmitError('%s, and squeue could not say if the '
+                                      'job was queued anyway' % error)
+            if not error.transient or attempt == SUBMIT_RETRIES:
+                raise
+            time.sleep(SUBMIT_BACKOFF * 2**attempt)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def submit_scripts(scripts, workers=SUBMIT_WORKERS, rate=SUBMIT_RATE,
+                   after=None):
+    """Submit many job scripts and record their job IDs in the ledger.
+
+    Returns a list of (script, job ID, error) in the order of scripts,
+    the job ID is None and error the reason when sbatch refused one.
+    after is passed on to submit_script() for every script.
+    """
+
+    limiter = RateLimiter(rate)
+    lock = threading.Lock()
+    directory = os.path.dirname(LEDGER_FILE)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    ledger = open(LEDGER_FILE, 'a')
+
+    def submit(script):
+        try:
+            job_id = submit_with_retry(script, limiter, after)
+        except SubmitError as error:
+            return script, None, str(error)
+        record = {'job_id'   : job_id,
+                  'script'   : os.path.abspath(script),
+                  'submitted': time.time()}
+        with lock:
+            ledger.write(json.dumps(record)+'\n')
+            ledger.flush()
+        return script, job_id, None
+
+    pool = ThreadPool(max(1, min(workers, len(scripts))))
+    try:
+        return pool.map(submit, scripts, 1)
+    finally:
+        pool.close()
+        pool.join()
+        ledger.close()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def submit_jobs(specs, dry_run=False):
+    """Write and submit the jobs for many specs from one process.
+
+    Returns a list of (script, job ID, error) like submit_scripts().
+    """
+
+    scripts = []
+    for spec in specs:
+        scripts.extend(spec.path(script)
+                       for script in write_jobs(spec, dry_run=dry_run))
+    if dry_run:
+        return [(script, None, None) for script in scripts]
+    return submit_scripts(scripts)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class WorkflowError(Exception):
+    """A workflow file that can't be submitted as it is."""
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class WorkflowStep(object):
+    """One step of a workflow.
+
+    name  : what the other steps call it in their 'after' lists
+    spec  : JobSpec for the step's inputs
+    after : names of the steps it waits for, None to work them out from
+            the checkpoint files
+    """
+
+    def __init__(self, name, spec, after=None):
+        self.name = name
+        self.spec = spec
+        self.after = after
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def expand_inputs(workdir, inputs):
+    """Input names relative to workdir, with glob patterns expanded."""
+
+    if not isinstance(inputs, list):
+        inputs = [inputs]
+    expanded = []
+    for pattern in inputs:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(os.path.join(workdir, pattern)))
+            expanded.extend(os.path.relpath(match, workdir)
+                            for match in matches)
+        else:
+            expanded.append(pattern)
+    return expanded
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_workflow(path):
+    """Read a workflow file into a list of WorkflowSteps.
+
+    Inputs are relative to the directory of the file, or to its
+    'workdir' if it has one.
+    """
+
+    try:
+        with open(path) as f:
+            workflow = json.load(f)
+    except (IOError, OSError, ValueError) as error:
+        raise WorkflowError('%s: %s' % (path, error))
+    if not isinstance(workflow, dict) or not workflow.get('steps'):
+        raise WorkflowError('%s: no steps to submit' % path)
+
+    unknown = set(workflow) - set(WORKFLOW_KEYS) - set(['steps', 'workdir'])
+    if unknown:
+        raise WorkflowError('%s: unknown setting(s) %s'
+                            % (path, ', '.join(sorted(unknown))))
+    defaults = dict((key, value) for key, value in workflow.items()
+                    if key in WORKFLOW_KEYS)
+    workdir = os.path.join(os.path.dirname(os.path.abspath(path)),
+                           workflow.get('workdir', ''))
+
+    steps, names = [], set()
+    for i, step in enumerate(workflow['steps']):
+        name = str(step.get('name', 'step%d' % (i+1)))
+        if name in names:
+            raise WorkflowError('there are two steps called %s' % name)
+        names.add(name)
+        unknown = set(step) - set(WORKFLOW_KEYS) - set(['name', 'inputs',
+                                                        'after'])
+        if unknown:
+            raise WorkflowError('step %s: unknown setting(s) %s'
+                                % (name, ', '.join(sorted(unknown))))
+        settings = dict(defaults)
+        settings.update((key, value) for key, value in step.items()
+                        if key in WORKFLOW_KEYS)
+        if not settings.get('allocation'):
+            raise WorkflowError('step %s: no allocation given' % name)
+        inputs = expand_inputs(workdir, step.get('inputs', []))
+        if not inputs:
+            raise WorkflowError('step %s: no inputs found' % name)
+        settings = dict((str(key), value) for key, value in settings.items())
+        after = step.get('after')
+        if after is not None and not isinstance(after, list):
+            after = [after]
+        steps.append(WorkflowStep(name, JobSpec(inputs, workdir=workdir,
+                                                **settings),
+                                  after and [str(other) for other in after]))
+    return steps
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def checkpoint_path(workdir, name):
+    """Full name of a checkpoint file, Gaussian adds .chk if it has none."""
+
+    if not os.path.splitext(name)[1]:
+        name += '.chk'
+    return os.path.normpath(os.path.join(workdir, name))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def checkpoint_files(model, workdir):
+    """(reads, writes), the checkpoints an input starts from and writes."""
+
+    reads, writes = set(), set()
+    chk = model.link0_value('chk')
+    oldchk = model.link0_value('oldchk')
+    if chk:
+        writes.add(checkpoint_path(workdir, chk))
+    if oldchk:
+        reads.add(checkpoint_path(workdir, oldchk))
+    elif chk and ('check' in model.keywords.get('geom', '') or
+                  'read' in model.keywords.get('guess', '') or
+                  'readfc' in model.keywords.get('opt', '')):
+        reads.add(checkpoint_path(workdir, chk))
+    return reads, writes
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def link_workflow(steps):
+    """Fill in what each step waits for and put them in submission order.
+
+    A step without 'after' waits for every other step that writes a
+    checkpoint one of its inputs reads. Steps that write the same
+    checkpoint have to wait for one another, otherwise they could both
+    be writing it at once.
+    """
+
+    by_name = dict((step.name, step) for step in steps)
+    files = {}
+    for step in steps:
+        reads, writes = set(), set()
+        for gauss_input in step.spec.inputs:
+            path = step.spec.path(gauss_input)
+            if not os.path.isfile(path):
+                raise WorkflowError('step %s: %s not found'
+                                    % (step.name, path))
+            input_reads, input_writes = checkpoint_files(load_input(path),
+                                                         step.spec.workdir)
+            shared = writes & input_writes
+            if shared:
+                raise WorkflowError('step %s: more than one input writes %s'
+                                    % (step.name, shared.pop()))
+            reads |= input_reads
+            writes |= input_writes
+        files[step.name] = (reads, writes)
+
+    for step in steps:
+        if step.after is None:
+            reads = files[step.name][0]
+            step.after = [other.name for other in steps
+                          if other is not step and reads & files[other.name][1]]
+        for name in step.after:
+            if name not in by_name:
+                raise WorkflowError('step %s: waits for unknown step %s'
+                                    % (step.name, name))
+
+    # Kahn's algorithm, keeping the order of the file where it can
+    ordered, done = [], set()
+    while len(ordered) < len(steps):
+        ready = [step for step in steps if step.name not in done and
+                 all(name in done for name in step.after)]
+        if not ready:
+            raise WorkflowError('steps %s wait for each other, use "after" '
+                                'to order them' % ', '.join(
+                                step.name for step in steps
+                                if step.name not in done))
+        ordered.append(ready[0])
+        done.add(ready[0].name)
+
+    ancestors = {}
+    for step in ordered:
+        ancestors[step.name] = set(step.after)
+        for name in step.after:
+            ancestors[step.name] |= ancestors[name]
+    for i, step in enumerate(ordered):
+        for other in ordered[:i]:
+            shared = files[step.name][1] & files[other.name][1]
+            if shared and other.name not in ancestors[step.name]:
+                raise WorkflowError('steps %s and %s both write %s, one of '
+                                    'them has to wait for the other'
+                                    % (other.name, step.name, shared.pop()))
+    return ordered
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def submit_workflow(steps, dry_run=False):
+    """Write and submit every step, each after the steps it waits for.
+
+    All of the steps are submitted straight away, Slurm holds each one
+    until the jobs it depends on have finished. Returns a list of
+    (step, script, job ID, error). A step isn't submitted if any step
+    it waits for could not be.
+    """
+
+    job_ids, results = {}, []
+    for step in link_workflow(steps):
+        scripts = [step.spec.path(script)
+                   for script in write_jobs(step.spec, dry_run=dry_run)]
+        failed = [name for name in step.after if job_ids[name] is None]
+        if dry_run:
+            job_ids[step.name] = ['<%s>' % step.name]
+            submitted = [(script, None, None) for script in scripts]
+        elif failed:
+            job_ids[step.name] = None
+            submitted = [(script, None, 'not submitted, step %s failed'
+                          % ', '.join(failed)) for script in scripts]
+        else:
+            after = [job_id for name in step.after
+                     for job_id in job_ids[name]]
+            submitted = submit_scripts(scripts, after=after)
+            job_ids[step.name] = [job_id for script, job_id, error
+                                  in submitted]
+            if None in job_ids[step.name]:
+                job_ids[step.name] = None
+        results.extend((step, script, job_id, error)
+                       for script, job_id, error in submitted)
+    return results
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_workflow(argv):
+    """gaussian-sub.py workflow [--dry-run] file.json"""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py workflow',
+        description='Submit a chain of dependent Gaussian jobs in one go')
+    parser.add_argument('workflow', help='JSON file with the steps')
+    parser.add_argument('--dry-run', action='store_true',
+        help='print the scripts and the order they would be submitted in')
+    args = parser.parse_args(argv)
+
+    try:
+        results = submit_workflow(read_workflow(args.workflow), args.dry_run)
+    except WorkflowError as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    if print_workflow(results, args.dry_run):
+        sys.exit(1)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_workflow(results, dry_run=False):
+    """Print what submit_workflow() did, returns how many failed."""
+
+    failed = 0
+    for step, script, job_id, error in results:
+        after = ', '.join(step.after) or 'nothing'
+        if dry_run:
+            print('%-12s %-30s after %s' % (step.name, script, after))
+        elif job_id is None:
+            print('ERROR: %s: %s' % (step.name, error))
+            failed += 1
+        else:
+            print('%-12s %-30s job %-12s after %s'
+                  % (step.name, script, job_id, after))
+    if not dry_run:
+        print('\nSubmitted %d of %d script(s), the job IDs are in %s\n'
+              % (len(results)-failed, len(results), LEDGER_FILE))
+    return failed
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def split_input(gauss_input, dry_run=False):
+    """Write each --Link1-- step of an input to <name>_step<n><ext>.
+
+    The steps are cut out of the file as they are, comments and all.
+    Returns the names of the new inputs.
+    """
+
+    base, extension = os.path.splitext(gauss_input)
+    steps = [[]]
+    with open(gauss_input, 'r') as f:
+        for line in f:
+            if line.split('!', 1)[0].strip().lower() == '--link1--':
+                steps.append([])
+            else:
+                steps[-1].append(line)
+    names = []
+    for i, lines in enumerate(steps):
+        names.append('%s_step%d%s' % (base, i+1, extension))
+        write_output(names[-1], ''.join(lines), dry_run)
+    return names
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def split_steps(spec, gauss_input, dry_run=False):
+    """Turn an input with --Link1-- steps into a workflow of one job a step.
+
+    Writes the step inputs and <name>_steps.json, which runs each step
+    after the one before. The most demanding step gets what spec asks
+    for, the others only the cores and memory estimated for them, so a
+    cheap step doesn't hold a big node. Returns the workflow file.
+    """
+
+    model = load_input(spec.path(gauss_input))
+    estimate = estimate_steps(model)
+    base = os.path.splitext(gauss_input)[0]
+    names = split_input(spec.path(gauss_input), dry_run)
+
+    steps = []
+    for i, (name, needs) in enumerate(zip(names, estimate['steps'])):
+        step = dict((key, getattr(spec, key)) for key in WORKFLOW_KEYS)
+        if i+1 != estimate['step']:
+            step['cores'] = min(spec.cores, needs['cores'])
+            # The job script leaves 10 Gb of the node for the OS
+            step['memory'] = needs['memory'] + 10
+            if spec.memory:
+                step['memory'] = min(spec.memory, step['memory'])
+            if not model.steps[i].has_link0('lindaworkers', 'lindaworker'):
+                step['nodes'] = 1
+        step['name'] = '%s_step%d' % (os.path.basename(base), i+1)
+        step['inputs'] = [os.path.relpath(os.path.abspath(name),
+                                          spec.workdir)]
+        step['after'] = [steps[-1]['name']] if steps else []
+        steps.append(step)
+
+    workflow = spec.path(base+'_steps.json')
+    write_output(workflow, json.dumps({'steps': steps}, indent=2,
+                                      sort_keys=True)+'\n', dry_run)
+    return workflow
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def split_jobs(spec, outputs=None, dry_run=False, submit=False):
+    """Move the inputs of spec with --Link1-- steps into workflows.
+
+    Each of them is split_steps() and, with submit, submitted. The
+    other inputs are left in spec. Returns their outputs and how many
+    step jobs could not be submitted.
+    """
+
+    multi = [gauss_input for gauss_input in spec.inputs
+             if load_input(spec.path(gauss_input)).link1]
+    failed = 0
+    for gauss_input in multi:
+        workflow = split_steps(spec, gauss_input, dry_run)
+        print('Splitting the %d steps of %s into %s\n'
+              % (len(load_input(spec.path(gauss_input)).steps), gauss_input,
+                 workflow))
+        if dry_run:
+            continue
+        if not submit:
+            print("""Please run 'gaussian-sub.py workflow %s' to submit """
+                  """them\n""" % workflow)
+            continue
+        try:
+            failed += print_workflow(submit_workflow(read_workflow(workflow)))
+        except WorkflowError as error:
+            print('ERROR: %s\n' % error)
+            failed += 1
+
+    if outputs:
+        outputs = [output for gauss_input, output in zip(spec.inputs, outputs)
+                   if gauss_input not in multi]
+    spec.inputs = [gauss_input for gauss_input in spec.inputs
+                   if gauss_input not in multi]
+    return outputs, failed
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class GenerateError(Exception):
+    """A template or geometry file that inputs can't be made from."""
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def format_atom(element, xyz):
+    """A Cartesian molecule specification line."""
+
+    return '%-2s %14s %14s %14s' % (element, xyz[0], xyz[1], xyz[2])
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_xyz_frames(path):
+    """Yield (title, atom lines) for each frame of a multi-frame XYZ file."""
+
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if not line: return
+            if not line.strip(): continue
+            try:
+                n_atoms = int(line.split()[0])
+            except ValueError:
+                raise GenerateError('%s: expected a number of atoms, found %r'
+                                    % (path, line.strip()))
+            title = f.readline().strip()
+            atoms = []
+            for i in range(n_atoms):
+                fields = f.readline().split()
+                if len(fields) < 4:
+                    raise GenerateError('%s: frame "%s" has fewer than %d '
+                                        'atoms' % (path, title, n_atoms))
+                atoms.append(format_atom(fields[0], fields[1:4]))
+            yield title, atoms
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_sdf_frames(path):
+    """Yield (title, atom lines) for each molecule of a V2000 SDF file."""
+
+    with open(path) as f:
+        while True:
+            title = f.readline()
+            if not title: return
+            f.readline()
+            f.readline()
+            counts = f.readline()
+            if 'V3000' in counts:
+                raise GenerateError('%s: only V2000 molfiles can be read'
+                                    % path)
+            try:
+                n_atoms = int(counts[:3])
+            except ValueError:
+                raise GenerateError('%s: "%s" has no counts line'
+                                    % (path, title.strip()))
+            atoms = []
+            for i in range(n_atoms):
+                fields = f.readline().split()
+                if len(fields) < 4:
+                    raise GenerateError('%s: "%s" has fewer than %d atoms'
+                                        % (path, title.strip(), n_atoms))
+                atoms.append(format_atom(fields[3], fields[0:3]))
+            line = f.readline()
+            while line and not line.startswith('$$$$'):
+                line = f.readline()
+            yield title.strip(), atoms
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def parse_grid(grid):
+    """[(name, values)] from NAME=a,b,c or NAME=start:stop:step options."""
+
+    parsed = []
+    for option in grid:
+        name, values = split_outside_parentheses(option, '=')
+        if values is None or not re.match(r'^\w+$', name):
+            raise GenerateError('--grid %s should be NAME=VALUES' % option)
+        if re.match(r'^[^,]*:[^,]*:[^,]*$', values):
+            try:
+                start, stop, step = [float(x) for x in values.split(':')]
+                n_values = int(round((stop-start)/step))+1
+            except (ValueError, ZeroDivisionError):
+                raise GenerateError('--grid %s: start:stop:step must be '
+                                    'numbers' % option)
+            values = ['%g' % (start+i*step) for i in range(max(0, n_values))]
+        else:
+            values = values.split(',')
+        parsed.append((name, values))
+    return parsed
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def geometry_template(text):
+    """text with its molecule specification replaced by {geometry}."""
+
+    lines = text.split('\n')
+    section, start = 'link0', None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if section == 'link0':
+            if stripped.startswith('#'): section = 'route'
+        elif section in ('route', 'title'):
+            if not stripped:
+                section = 'title' if section == 'route' else 'charge'
+        elif section == 'charge':
+            if stripped:
+                section, start = 'atoms', i+1
+        elif not stripped:
+            return '\n'.join(lines[:start]+['{geometry}']+lines[i:])
+    if start is None:
+        raise GenerateError('the template has no molecule to replace, mark '
+                            'where the geometry goes with {geometry}')
+    return '\n'.join(lines[:start]+['{geometry}', ''])
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def derive_inputs(template, prefix, frames=None, grid=()):
+    """Yield (name, text) for every frame and grid point, one at a time.
+
+    {geometry}, {name}, {index}, {job} and the grid names in template
+    are filled in. Without {geometry} the template's own molecule is
+    replaced by each frame. Each input gets its own %chk.
+    """
+
+    if frames is not None and '{geometry}' not in template:
+        template = geometry_template(template)
+    template = re.sub(r'(?im)^%chk=.*$', '%chk={job}.chk', template)
+    known = set(['geometry', 'name', 'index', 'job'] +
+                [name for name, values in grid])
+    unknown = set(re.findall(GENERATE_FIELD, template)) - known
+    if unknown:
+        raise GenerateError('nothing to fill in {%s} with'
+                            % '}, {'.join(sorted(unknown)))
+    if frames is None:
+        frames = [(None, None)]
+
+    index = 0
+    for title, atoms in frames:
+        for values in itertools.product(*[values for name, values in grid]):
+            index += 1
+            job = GENERATED_NAME % (prefix, index)
+            fields = dict(zip([name for name, values in grid], values))
+            fields.update({'index': str(index), 'job': job,
+                           'name' : title or 'frame %d' % index,
+                           'geometry': '\n'.join(atoms or [])})
+            yield job+'.com', re.sub(GENERATE_FIELD,
+                                     lambda match: fields[match.group(1)],
+                                     template)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def report_submissions(results):
+    """Print what submit_scripts() did, returns how many failed."""
+
+    failed = 0
+    for script, job_id, error in results:
+        if job_id is None:
+            print('ERROR: '+error)
+            failed += 1
+        elif len(results) <= 20:
+            print('Submitted %s as job %s' % (script, job_id))
+    print('Submitted %d of %d script(s), the job IDs are in %s\n'
+          % (len(results)-failed, len(results), LEDGER_FILE))
+    return failed
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_generate(argv):
+    """gaussian-sub.py generate template.com [--xyz F|--sdf F] [--grid ..]
+
+    Any other options are the usual ones for the jobs. The first input
+    made answers the prompts and is checked, then the rest are written
+    and turned into job arrays GENERATE_BATCH at a time.
+    """
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py generate',
+        usage='%(prog)s template.com [--xyz FILE | --sdf FILE] '
+              '[--grid NAME=VALUES] [--prefix NAME] [options]',
+        description='Make inputs from a template for every frame of an XYZ '
+                    'or SDF file and/or every point of a grid, then write '
+                    'job arrays for them. Any other options are passed on.')
+    parser.add_argument('template', help='input with {NAME} fields to fill')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--xyz', metavar='FILE',
+        help='multi-frame XYZ file of geometries')
+    source.add_argument('--sdf', metavar='FILE',
+        help='SDF file of geometries')
+    parser.add_argument('--grid', action='append', default=[],
+        metavar='NAME=VALUES',
+        help='values for {NAME}, as a,b,c or start:stop:step')
+    parser.add_argument('--prefix',
+        help='start of the generated file names (default: template name)')
+    args, options = parser.parse_known_args(argv)
+    prefix = args.prefix or \
+        os.path.splitext(os.path.basename(args.template))[0].replace('.', '_')
+
+    try:
+        with open(args.template) as f:
+            template = f.read()
+        frames = None
+        if args.xyz: frames = read_xyz_frames(args.xyz)
+        if args.sdf: frames = read_sdf_frames(args.sdf)
+        inputs = derive_inputs(template, prefix, frames,
+                               parse_grid(args.grid))
+        first = next(inputs, None)
+    except (IOError, OSError, GenerateError) as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    if first is None:
+        print('No inputs to make')
+        sys.exit()
+
+    write_text(first[0], first[1])
+    if '--pack' not in options:
+        options.append('--array')
+    sys.argv[1:] = options+['--output', GENERATED_PART % (prefix, 1),
+                            first[0]]
+    job = get_user_input()
+    check_Gaussian_input(job, gen)
+
+    n_inputs, part, results = 0, 0, []
+    inputs = itertools.chain([first], inputs)
+    while True:
+        try:
+            batch = list(itertools.islice(inputs, min(GENERATE_BATCH,
+                                                      job.max_array_size)))
+        except (IOError, OSError, GenerateError) as error:
+            print('\nERROR: %s\n' % error)
+            sys.exit(1)
+        if not batch: break
+        for name, text in batch:
+            write_text(name, text)
+        n_inputs += len(batch)
+        part += 1
+        job.inputs = [name for name, text in batch]
+        if not settings['no_cache']:
+            skip_cached(job)
+        if job.inputs:
+            scripts = write_jobs(job, [GENERATED_PART % (prefix, part)],
+                                 settings['dry_run'])
+            if not settings['dry_run']:
+                for script in scripts:
+                    print('Writing %d input files to %s\n'
+                          % (len(job.inputs), script))
+                if settings['submit']:
+                    results.extend(submit_scripts(scripts))
+        # Nothing from this batch is needed again
+        parsed_inputs.clear()
+
+    print('Made %d input(s) from %s\n' % (n_inputs, args.template))
+    if settings['submit'] and not settings['dry_run']:
+        if report_submissions(results):
+            sys.exit(1)
+    elif not settings['dry_run']:
+        print("""Please run 'sbatch' on the scripts to submit them\n""")
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def last_match(text, marker, pattern):
+    """pattern matched at the last marker in text, or None."""
+
+    at = text.rfind(marker)
+    if at < 0: return None
+    return re.match(pattern, text[at:at+200])
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def summarize_log(log):
+    """The results in a Gaussian log, read through mmap.
+
+    Returns a dict with the result ('normal', 'error' or None before
+    Gaussian is done), the number of terminations, energy (the last
+    SCF), zero_point and free_energy (Hartree), optimized (None without
+    an optimization), geometry ([element, x, y, z] of the last
+    orientation, Angstrom) and frequencies (cm-1, of the last frequency
+    calculation). Everything but the terminations is found searching
+    back from the end, so even logs of many Gb are quick.
+    """
+
+    summary = {'log'         : os.path.abspath(log),
+               'result'      : None,
+               'terminations': 0,
+               'energy'      : None,
+               'zero_point'  : None,
+               'free_energy' : None,
+               'optimized'   : None,
+               'geometry'    : [],
+               'frequencies' : []}
+    with open(log, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return summary
+        text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        normal = text.rfind(b'Normal termination')
+        error = text.rfind(b'Error termination')
+        if normal >= 0 or error >= 0:
+            summary['result'] = 'normal' if normal > error else 'error'
+        summary['terminations'] = len(re.findall(
+            b'(?:Normal|Error) termination', text))
+
+        for field, marker, pattern in [
+                ('energy', b'SCF Done:', br'SCF Done:\s+E\(\S+\)\s+=\s+(\S+)'),
+                ('zero_point', b'Zero-point correction=',
+                 br'Zero-point correction=\s+(\S+)'),
+                ('free_energy', b'Sum of electronic and thermal Free',
+                 br'Sum of electronic and thermal Free Energies=\s+(\S+)')]:
+            match = last_match(text, marker, pattern)
+            if match:
+                summary[field] = float(match.group(1))
+
+        if text.rfind(b'Stationary point found') >= 0:
+            summary['optimized'] = True
+        elif text.rfind(b'Step number') >= 0:
+            summary['optimized'] = False
+
+        # Title, dashes, two header lines, dashes, the atoms, dashes
+        at = max(text.rfind(b'Standard orientation:'),
+                 text.rfind(b'Input orientation:'))
+        if at >= 0:
+            start = text.find(b'\n -----', text.find(b'\n -----', at)+1)
+            end = text.find(b'\n -----', start+1)
+            if 0 <= start < end:
+                for line in text[start:end].splitlines():
+                    specs = line.split()
+                    if len(specs) != 6 or not specs[1].isdigit(): continue
+                    number = int(specs[1])
+                    summary['geometry'].append(
+                        [ELEMENTS[number] if number < len(ELEMENTS) else 'X']
+                        + [float(xyz) for xyz in specs[3:]])
+
+        at = text.rfind(b'Harmonic frequencies')
+        if at >= 0:
+            end = text.find(b'- Thermochemistry -', at)
+            for values in re.findall(br' Frequencies --(.*)',
+                                     text[at:end if end >= 0 else len(text)]):
+                summary['frequencies'].extend(float(value)
+                                              for value in values.split())
+    finally:
+        text.close()
+    return summary
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def numbered_logs(directory):
+    """Map every name a numbered log copy could belong to, to the copies.
+
+    The ckpt scripts keep earlier logs as <name><n>.log. g12.log could
+    be the 2nd copy of g1 or the log of g12, so it is listed under both
+    and post_tasks() sorts it out.
+    """
+
+    copies = {}
+    for entry in os.listdir(directory):
+        stem, ext = os.path.splitext(entry)
+        if ext != '.log': continue
+        digits = len(stem) - len(stem.rstrip('0123456789'))
+        for k in range(1, min(digits, len(stem)-1)+1):
+            copies.setdefault(stem[:-k], []).append(entry)
+    return copies
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def post_tasks(path, actions, copies=None):
+    """The work for run_post_task() to tidy up after one run.
+
+    path is the input or the log. The summary is made for any log,
+    everything else only once Gaussian finished normally, so nothing
+    a restart needs is touched. copies is numbered_logs() for its
+    directory.
+    """
+
+    base = os.path.splitext(path)[0]
+    log = base+'.log'
+    tasks = []
+    if not os.path.isfile(log):
+        return tasks
+    if 'summary' in actions:
+        tasks.append(('summary', log))
+    if not finished_normally(log):
+        return tasks
+
+    if 'prune' in actions:
+        directory = os.path.dirname(log) or '.'
+        if copies is None:
+            copies = numbered_logs(directory)
+        name = os.path.basename(base)
+        for entry in copies.get(name, []):
+            stem = os.path.splitext(os.path.join(directory, entry))[0]
+            # The log of another input, not a copy
+            if os.path.exists(stem+'.com') or os.path.exists(stem+'.gjf'):
+                continue
+            tasks.append(('gzip', stem+'.log'))
+
+    if 'formchk' in actions or 'compress' in actions:
+        chk = base+'.chk'
+        for ext in ('.com', '.gjf'):
+            if os.path.isfile(base+ext):
+                name = parse_gaussian_input(base+ext).link0_value('chk')
+                if name:
+                    chk = checkpoint_path(os.path.dirname(base), name)
+                break
+        if os.path.isfile(chk):
+            tasks.append(('chk', chk, 'formchk' in actions,
+                          'compress' in actions))
+    return tasks
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def gzip_file(path):
+    """Replace a file with a gzipped copy, returns the bytes saved.
+
+    An existing path.gz is never replaced, the ckpt job scripts number
+    their log copies without counting the ones already compressed.
+    """
+
+    if os.path.exists(path+'.gz'):
+        raise IOError('%s.gz already exists' % path)
+    size = os.path.getsize(path)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               prefix='.tmp-')
+    os.close(fd)
+    try:
+        with open(path, 'rb') as source:
+            with gzip.open(tmp, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024*1024)
+        shutil.copymode(path, tmp)
+        os.rename(tmp, path+'.gz')
+    except:
+        os.remove(tmp)
+        raise
+    os.remove(path)
+    return size - os.path.getsize(path+'.gz')
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_post_task(task):
+    """Carry out one task from post_tasks().
+
+    Returns (kind, path, bytes saved, error), error is None when it
+    worked.
+    """
+
+    kind, path = task[0], task[1]
+    saved = 0
+    try:
+        if kind == 'summary':
+            write_json(os.path.splitext(path)[0]+'.summary.json',
+                       summarize_log(path))
+        elif kind == 'gzip':
+            saved = gzip_file(path)
+        elif kind == 'remove':
+            saved = os.path.getsize(path)
+            os.remove(path)
+        elif kind == 'chk':
+            formchk, compress = task[2], task[3]
+            if formchk:
+                fchk = os.path.splitext(path)[0]+'.fchk'
+                process = Popen(['formchk', path, fchk], stdout=PIPE,
+                                stderr=PIPE)
+                error = process.communicate()[1]
+                if process.returncode != 0 or not os.path.isfile(fchk):
+                    if not isinstance(error, str):
+                        error = error.decode('utf-8', 'replace')
+                    return kind, path, 0, 'formchk %s: %s' % (
+                        path, error.strip() or 'failed')
+                saved = os.path.getsize(path) - os.path.getsize(fchk)
+                os.remove(path)
+                path = fchk
+            if compress:
+                saved += gzip_file(path)
+    except (IOError, OSError, ValueError) as error:
+        return kind, path, saved, '%s: %s' % (path, error)
+    return kind, path, saved, None
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scratch_leftovers(scratch, days=POST_SCRATCH_DAYS):
+    """Gaussian scratch files in scratch untouched for days days."""
+
+    since = time.time() - days*86400
+    leftovers = []
+    for path in glob.glob(os.path.join(scratch, 'Gau-*')):
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < since:
+                leftovers.append(path)
+        except OSError:
+            pass
+    return leftovers
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def post_process(paths, actions, scratch=None, workers=None):
+    """Summarize and tidy up after the runs of many inputs or logs.
+
+    The tasks run in a pool of worker processes, so several large files
+    are compressed at once. Returns the results of run_post_task().
+    """
+
+    tasks, listings = [], {}
+    for path in paths:
+        directory = os.path.dirname(path) or '.'
+        if 'prune' in actions and directory not in listings:
+            listings[directory] = numbered_logs(directory)
+        tasks.extend(post_tasks(path, actions, listings.get(directory)))
+    # A copy can only be pruned once, even if it was listed twice
+    tasks = list(sorted(set(tasks), key=tasks.index))
+    if 'prune' in actions and scratch:
+        tasks.extend(('remove', path) for path in scratch_leftovers(scratch))
+
+    if workers is None:
+        workers = min(multiprocessing.cpu_count(), MAX_WORKERS)
+    workers = min(workers, len(tasks))
+    if workers < 2:
+        return [run_post_task(task) for task in tasks]
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(run_post_task, tasks, 1)
+    finally:
+        pool.close()
+        pool.join()
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def post_actions(actions):
+    """Split a comma separated list of POST_ACTIONS, checking each one."""
+
+    actions = [action.strip() for action in actions.split(',')
+               if action.strip()]
+    unknown = [action for action in actions if action not in POST_ACTIONS]
+    if unknown:
+        raise ValueError('unknown post-processing %s, choose from %s'
+                         % (', '.join(unknown), ', '.join(POST_ACTIONS)))
+    return actions
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_post(argv):
+    """gaussian-sub.py post [--actions A,B] [--manifest FILE] [file ...]"""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py post',
+        description='Summarize finished Gaussian runs and tidy up the '
+                    'files they leave behind')
+    parser.add_argument('files', nargs='*',
+        help='inputs or logs of the runs')
+    parser.add_argument('--manifest', metavar='FILE',
+        help='also do the inputs listed in FILE, one per line')
+    parser.add_argument('--actions', default=POST_DEFAULT,
+        help='any of %s (default: %s)' % (', '.join(POST_ACTIONS),
+                                          POST_DEFAULT))
+    parser.add_argument('--scratch', metavar='DIR',
+        default='/gscratch/scrubbed/%s' % user_name(),
+        help='where to prune Gaussian scratch files untouched for %d days '
+             '(default: %%(default)s)' % POST_SCRATCH_DAYS)
+    parser.add_argument('--workers', type=int,
+        help='number of worker processes (default: one per core)')
+    args = parser.parse_args(argv)
+
+    try:
+        actions = post_actions(args.actions)
+        paths = list(args.files)
+        if args.manifest:
+            with open(args.manifest) as f:
+                paths.extend(line.strip() for line in f if line.strip())
+    except (IOError, OSError, ValueError) as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    scratch = args.scratch if os.path.isdir(args.scratch) else None
+
+    done, saved, failed = {}, 0, 0
+    for kind, path, size, error in post_process(paths, actions, scratch,
+                                                args.workers):
+        if error:
+            print('ERROR: '+error)
+            failed += 1
+            continue
+        done[kind] = done.get(kind, 0) + 1
+        saved += size
+    print('Summarized %d log(s), compressed %d log copies and %d checkpoint '
+          'file(s), removed %d scratch file(s), %.1f Gb freed'
+          % (done.get('summary', 0), done.get('gzip', 0), done.get('chk', 0),
+             done.get('remove', 0), max(saved, 0)/1e9))
+    if failed:
+        sys.exit(1)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+class ScalingError(Exception):
+    """An input or a study that scaling can't be measured from."""
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scaling_key(features):
+    """Class of method and NBasis band that a scaling result applies to.
+
+    features is input_features() or estimate_resources(), both have the
+    class and n_basis.
+    """
+
+    n_basis = features['n_basis']
+    low = max([0]+[band for band in SCALING_BANDS if band <= n_basis])
+    high = [band for band in SCALING_BANDS if band > n_basis]
+    return '%s/%d-%s' % (features['class'], low, high[0] if high else '')
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_scaling():
+    """The recommendations in SCALING_FILE, by scaling_key()."""
+
+    try:
+        with open(SCALING_FILE) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scaling_route(model, cycles):
+    """Route section for a single point cut off after cycles SCF cycles.
+
+    The job types are dropped and IOp(5/13=1) lets Gaussian carry on to
+    a normal termination when the SCF hasn't converged. #p makes it
+    print how long each link took.
+    """
+
+    keywords = dict(model.keywords)
+    for job in JOB_TYPES:
+        keywords.pop(job, None)
+    scf = [option for option in keywords.get('scf', '').split(',')
+           if option and not option.startswith('maxcyc')]
+    keywords['scf'] = ','.join(scf+['maxcycle=%d' % cycles])
+    iop = [option for option in keywords.pop('iop', '').split(',') if option]
+
+    route = ['#p']
+    if model.method and model.basis:
+        route.append(model.method+'/'+model.basis)
+    elif model.method or model.basis:
+        route.append(model.method or model.basis)
+    for keyword in sorted(keywords):
+        options = keywords[keyword]
+        if options: route.append('%s=(%s)' % (keyword, options))
+        else: route.append(keyword)
+    route.append('iop(%s)' % ','.join(iop+['5/13=1']))
+    return ' '.join(route)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scaling_input(gauss_input, cycles, nodes=1):
+    """Text of a copy of an input cut down to a few SCF cycles.
+
+    The %mem and %nprocshared lines are there for the job script to
+    fill in, as is %LindaWorkers on more than one node. The title and
+    everything after it are kept as they are.
+    """
+
+    model = load_input(gauss_input)
+    if model.link1:
+        raise ScalingError('%s has more than one job step, use an input '
+                           'with only the step to measure' % gauss_input)
+    if not model.atoms or 'check' in model.keywords.get('geom', '') or \
+       'read' in model.keywords.get('guess', ''):
+        raise ScalingError('%s reads from a checkpoint file, use an input '
+                           'with its own geometry and guess' % gauss_input)
+
+    with open(gauss_input) as f:
+        lines = f.read().splitlines()
+    start = 0
+    while start < len(lines) and not lines[start].lstrip().startswith('#'):
+        start += 1
+    while start < len(lines) and lines[start].strip():
+        start += 1
+
+    text = ['%mem=1GB', '%nprocshared=1']
+    if nodes > 1:
+        text.append('%LindaWorkers=localhost')
+    text.append(scaling_route(model, cycles))
+    return '\n'.join(text+lines[start:])+'\n'
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_seconds(log):
+    """Elapsed seconds of a finished run from its #p log, or None."""
+
+    if not finished_normally(log):
+        return None
+    with open(log) as f:
+        text = f.read()
+    links = re.findall(r'Leave Link\s+\d+ at .*?elap:\s+([\d.]+)', text)
+    if links:
+        return sum(float(seconds) for seconds in links)
+    match = re.search(r'Elapsed time:\s+(\d+) days\s+(\d+) hours\s+'
+                      r'(\d+) minutes\s+([\d.]+) seconds', text)
+    if match:
+        days, hours, minutes, seconds = [float(x) for x in match.groups()]
+        return ((days*24 + hours)*60 + minutes)*60 + seconds
+    return None
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def solve_linear(matrix, vector):
+    """Solve a small linear system by Gaussian elimination, or None."""
+
+    n = len(vector)
+    rows = [list(matrix[i])+[vector[i]] for i in range(n)]
+    for i in range(n):
+        pivot = max(range(i, n), key=lambda r: abs(rows[r][i]))
+        if abs(rows[pivot][i]) < 1e-12:
+            return None
+        rows[i], rows[pivot] = rows[pivot], rows[i]
+        for r in range(n):
+            if r != i:
+                factor = rows[r][i]/rows[i][i]
+                rows[r] = [x - factor*y for x, y in zip(rows[r], rows[i])]
+    return [rows[i][n]/rows[i][i] for i in range(n)]
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def fit_scaling(points):
+    """Fit (cores, nodes, seconds) to T = a + b/(cores*nodes) + c*(nodes-1).
+
+    a is the part that doesn't speed up, b the part that does and c
+    what each Linda node adds. c is only fitted when there are runs on
+    more than one node. Returns (a, b, c), none of them negative.
+    """
+
+    linda = len(set(nodes for cores, nodes, seconds in points)) > 1
+    columns = [lambda p, n: 1.0, lambda p, n: 1.0/p]
+    if linda:
+        columns.append(lambda p, n: n-1.0)
+    rows = [[column(cores*nodes, nodes) for column in columns]
+            for cores, nodes, seconds in points]
+    times = [seconds for cores, nodes, seconds in points]
+    k = len(columns)
+    fit = solve_linear(
+        [[sum(row[i]*row[j] for row in rows) for j in range(k)]
+         for i in range(k)],
+        [sum(row[i]*t for row, t in zip(rows, times)) for i in range(k)])
+    if fit is None:
+        raise ScalingError('the runs need at least two different core '
+                           'counts to fit')
+    a, b = max(0.0, fit[0]), max(0.0, fit[1])
+    c = max(0.0, fit[2]) if linda else 0.0
+    return a, b, c
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scaling_configs(cores, nodes, node_cores):
+    """The (cores, nodes) to run, from comma separated lists.
+
+    By default that is 1, 2, 4, ... cores up to a whole node, and the
+    Linda node counts only with whole nodes.
+    """
+
+    if cores:
+        core_counts = [int(n) for n in cores.split(',')]
+    else:
+        core_counts = [n for n in (2**i for i in range(10)) if n < node_cores]
+        core_counts.append(node_cores)
+    configs = [(n, 1) for n in core_counts]
+    for n in [int(n) for n in nodes.split(',')]:
+        if n > 1:
+            configs.append((node_cores, n))
+    return configs
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def collect_scaling(study):
+    """Fit the runs of a study and save its recommendation.
+
+    study is the study.json a scale-study wrote. Returns the rows of
+    the results (cores, nodes, seconds, fitted seconds, efficiency)
+    and the recommendation.
+    """
+
+    with open(study) as f:
+        record = json.load(f)
+    directory = os.path.dirname(os.path.abspath(study))
+    points = []
+    for run in record['runs']:
+        log = os.path.join(directory, os.path.splitext(run['input'])[0]+'.log')
+        seconds = run_seconds(log) if os.path.isfile(log) else None
+        if seconds:
+            points.append((run['cores'], run['nodes'], seconds))
+    if len(points) < 2:
+        raise ScalingError('only %d of the %d runs in %s have finished'
+                           % (len(points), len(record['runs']), directory))
+
+    a, b, c = fit_scaling(points)
+    one_core = a + b
+    rows = []
+    for cores, nodes, seconds in sorted(points, key=lambda p: (p[1], p[0])):
+        fitted = a + b/(cores*nodes) + c*(nodes-1)
+        rows.append({'cores'     : cores,
+                     'nodes'     : nodes,
+                     'seconds'   : seconds,
+                     'fitted'    : fitted,
+                     'efficiency': one_core/(cores*nodes*fitted)})
+    # The fastest that doesn't waste too much, fewer cores on a tie
+    good = [row for row in rows if row['efficiency'] >= SCALING_EFFICIENCY]
+    best = min(good or rows[:1], key=lambda row: (
+        round(row['fitted'], 1), row['cores']*row['nodes']))
+
+    recommendation = {'cores'     : best['cores'],
+                      'nodes'     : best['nodes'],
+                      'efficiency': best['efficiency'],
+                      'serial'    : a/one_core if one_core else 0.0,
+                      'node_cost' : c,
+                      'node_cores': record['node_cores'],
+                      'input'     : record['input'],
+                      'updated'   : time.time()}
+    scaling = read_scaling()
+    scaling[record['key']] = recommendation
+    write_json(SCALING_FILE, scaling)
+    return rows, recommendation
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_scale_study(argv):
+    """gaussian-sub.py scale-study input.com [--collect] [options]
+
+    The first run writes and, with --submit, submits the sweep. Run it
+    again with --collect once the jobs are done.
+    """
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py scale-study',
+        usage='%(prog)s input.com [--cycles N] [--sweep-cores LIST] '
+              '[--sweep-nodes LIST] [--collect] [options]',
+        description='Run a few SCF cycles of an input on a sweep of core '
+                    'and Linda node counts, then fit how well it scales and '
+                    'recommend a configuration for inputs like it. Any other '
+                    'options are passed on.')
+    parser.add_argument('input', help='representative Gaussian input')
+    parser.add_argument('--cycles', type=int, default=SCALING_CYCLES,
+        help='SCF cycles to run (default: %(default)s)')
+    parser.add_argument('--sweep-cores', metavar='N[,N]',
+        help='core counts to run on one node (default: 1, 2, 4, ... up to '
+             'a whole node)')
+    parser.add_argument('--sweep-nodes', metavar='N[,N]', default='1,2,4',
+        help='Linda node counts to run with whole nodes, for methods that '
+             'can use Linda (default: %(default)s)')
+    parser.add_argument('--collect', action='store_true',
+        help='fit the timings of the finished runs and save the '
+             'recommendation')
+    args, options = parser.parse_known_args(argv)
+    directory = os.path.splitext(args.input)[0]+'_scaling'
+    study = os.path.join(directory, 'study.json')
+
+    if args.collect:
+        try:
+            rows, best = collect_scaling(study)
+        except (IOError, OSError, ValueError, KeyError, ScalingError) as error:
+            print('\nERROR: %s\n' % error)
+            sys.exit(1)
+        print('%5s %5s %10s %10s %10s' % ('Cores', 'Nodes', 'Time(s)',
+                                          'Fit(s)', 'Efficiency'))
+        for row in rows:
+            print('%5d %5d %10.1f %10.1f %9.0f%%' % (row['cores'],
+                  row['nodes'], row['seconds'], row['fitted'],
+                  100*row['efficiency']))
+        print('\nRecommended: %d core(s) on %d node(s), %.0f%% efficient. '
+              'Saved in %s for later inputs like %s\n'
+              % (best['cores'], best['nodes'], 100*best['efficiency'],
+                 SCALING_FILE, args.input))
+        return
+
+    try:
+        first = scaling_input(args.input, args.cycles)
+    except (IOError, OSError, ScalingError) as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    name = os.path.join(directory, 'c%03d_n%d.com')
+    write_text(name % (1, 1), first)
+    sys.argv[1:] = options+['--output', 'c%03d_n%d.sh' % (1, 1),
+                            name % (1, 1)]
+    job = get_user_input()
+    model = load_input(args.input)
+    linda = estimate_resources(model)['linda']
+
+    try:
+        configs = scaling_configs(args.sweep_cores,
+                                  args.sweep_nodes if linda else '1',
+                                  job.cores)
+    except ValueError as error:
+        print('\nERROR: %s\n' % error)
+        sys.exit(1)
+    runs, scripts = [], []
+    for cores, nodes in configs:
+        spec = copy.copy(job)
+        spec.cores, spec.nodes = cores, nodes
+        spec.array = spec.pack = False
+        spec.inputs = [name % (cores, nodes)]
+        script = os.path.splitext(spec.inputs[0])[0]+'.sh'
+        write_output(spec.path(spec.inputs[0]),
+                     scaling_input(args.input, args.cycles, nodes),
+                     settings['dry_run'])
+        write_output(spec.path(script), render_script(spec, spec.inputs[0]),
+                     settings['dry_run'])
+        runs.append({'cores': cores, 'nodes': nodes,
+                     'input': os.path.basename(spec.inputs[0])})
+        scripts.append(script)
+    if settings['dry_run']:
+        return
+    write_json(study, {'input'     : os.path.abspath(args.input),
+                       'key'       : scaling_key(input_features(model)),
+                       'node_cores': job.cores,
+                       'runs'      : runs,
+                       'created'   : time.time()})
+
+    print('Wrote %d runs of %d SCF cycles to %s\n'
+          % (len(runs), args.cycles, directory))
+    if settings['submit']:
+        if report_submissions(submit_scripts(scripts)):
+            sys.exit(1)
+    else:
+        print("Please run 'sbatch' on the scripts in %s to submit them\n"
+              % directory)
+    print("Once they have finished, run 'gaussian-sub.py scale-study %s "
+          "--collect'\n" % args.input)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_help():
+    """Print a description of the script for the user."""
+ 
+    print(textwrap.dedent("""\
+        NAME
+           \tGaussian-Submit
+        DESCRIPTION
+          \tThis program will help submit Gaussian calculations to
+          \tthe Hyak Ikt and Mox clusters. The script will ask questions 
+          \tabout the calculation to help set up the .pbs/.sh script.
+
+          \tIt will check for the types of nodes available to
+          \tset appropriate defaults. It will also read your input
+          \tfile to check for potential issues if using the STF
+          \tallocation.
+
+          \tAny question can be answered ahead of time with a command
+          \tline option or a saved profile (see OPTIONS). Only the
+          \tquestions that are still unanswered are asked.
+        EXAMPLES
+          \tpython gaussian-sub.py input{.gjf,.com}
+          \tpython gaussian-sub.py -q batch -a hyak-stf -c 28 -t 4 input.com
+          \tpython gaussian-sub.py -p mox-stf-28core-g16 -y *.com
+          \tpython gaussian-sub.py --save-profile mox-stf-28core-g16 input.com
+        AUTHOR
+          \tPatrick J. Lestrange <patricklestrange@gmail.com>
+        OPTIONS"""))
+    print(build_parser().format_help())
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def read_ledger(days=STATUS_DAYS):
+    """Ledger records of the jobs submitted in the last days days."""
+
+    since = time.time() - days*86400
+    records = []
+    try:
+        with open(LEDGER_FILE) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('submitted', 0) >= since:
+                    records.append(record)
+    except (IOError, OSError):
+        pass
+    return records
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def script_tasks(script):
+    """The inputs a job script runs, as a list of (task, log).
+
+    task is the array task ID, None for single jobs and task farms.
+    The logs are absolute paths, next to the inputs.
+    """
+
+    try:
+        with open(script) as f:
+            text = f.read()
+    except (IOError, OSError):
+        return []
+    match = re.search(r'^#SBATCH --chdir=(.*)$', text, re.M)
+    workdir = match.group(1) if match else os.path.dirname(script)
+
+    def log(gauss_input):
+        return os.path.join(workdir, os.path.splitext(gauss_input)[0]+'.log')
+
+    def manifest_lines(manifest):
+        try:
+            with open(os.path.join(workdir, manifest)) as f:
+                return f.read().split()
+        except (IOError, OSError):
+            return []
+
+    match = re.search(r"^export inputfile='(.*)'$", text, re.M)
+    if match:
+        return [(None, log(match.group(1)))]
+    match = re.search(r'SLURM_ARRAY_TASK_ID \+ (\d+)\)\)p" (\S+)\)', text)
+    if match:
+        offset, manifest = int(match.group(1)), match.group(2)
+        size = int(re.search(r'--array=0-(\d+)', text).group(1))+1
+        inputs = manifest_lines(manifest)[offset-1:offset-1+size]
+        return [(task, log(gauss_input))
+                for task, gauss_input in enumerate(inputs)]
+    match = re.search(r"^export manifest='(.*)'$", text, re.M)
+    if match:
+        return [(None, log(gauss_input))
+                for gauss_input in manifest_lines(match.group(1))]
+    return []
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def scheduler_states(since):
+    """State and elapsed time of the user's jobs, by job ID.
+
+    One squeue call for the jobs still in the queue and one sacct call
+    for the ones that have left it. Array tasks are keyed like 123_4.
+    """
+
+    states = {}
+    start = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(since))
+    command = ('sacct -n -P -X -S %s -o JobID,State,Elapsed 2>/dev/null'
+               % start)
+    for line in run_command(command).splitlines():
+        fields = line.split('|')
+        if len(fields) == 3:
+            states[fields[0]] = (fields[1].split()[0], fields[2])
+    command = 'squeue -h -r -u %s -o "%%i|%%T|%%M" 2>/dev/null' % user_name()
+    for line in run_command(command).splitlines():
+        fields = line.split('|')
+        if len(fields) == 3:
+            states[fields[0]] = (fields[1], fields[2])
+    return states
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def log_progress(log, progress):
+    """Bring the progress of one Gaussian log up to date.
+
+    progress is what was found last time (or {}), with the offset read
+    up to. Only the lines written since then are read. A log that got
+    shorter or was replaced, as on a ckpt restart, is read again from
+    the start.
+    """
+
+    try:
+        stat = os.stat(log)
+    except OSError:
+        return {}
+    if progress.get('inode') != stat.st_ino or \
+       progress.get('offset', 0) > stat.st_size:
+        progress = {'inode': stat.st_ino, 'offset': 0}
+    if stat.st_size == progress['offset']:
+        return progress
+
+    with open(log, 'rb') as f:
+        f.seek(progress['offset'])
+        while True:
+            data = f.read(STATUS_BLOCK)
+            # Leave a line that is still being written for next time
+            end = data.rfind(b'\n')+1
+            if end == 0: break
+            f.seek(end-len(data), 1)
+            progress['offset'] += end
+            update_progress(progress, data[:end].decode('utf-8', 'replace'))
+    return progress
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def update_progress(progress, text):
+    """Update progress with the last of each PROGRESS marker in text."""
+
+    found = {}
+    for field, marker, pattern in PROGRESS:
+        at = text.rfind(marker)
+        match = re.match(pattern, text[at:at+200]) if at >= 0 else None
+        if match:
+            found[field] = at
+            progress[field] = (float if field == 'energy' else int)(
+                match.group(1))
+    # A new optimization step starts its SCF from scratch
+    if found.get('step', -1) > found.get('scf', -1):
+        progress.pop('scf', None)
+
+    normal = text.rfind('Normal termination')
+    error = text.rfind('Error termination')
+    if normal >= 0 or error >= 0:
+        progress['result'] = 'normal' if normal > error else 'error'
+        progress['terminations'] = (progress.get('terminations', 0) +
+            text.count('Normal termination') + text.count('Error termination'))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def job_status(days=STATUS_DAYS):
+    """The state and progress of every input of the tracked jobs.
+
+    Returns a list of dicts with job_id, state, elapsed, log, scf,
+    step, energy and result (normal or error, the last termination).
+    """
+
+    records = read_ledger(days)
+    if not records: return []
+    states = scheduler_states(min(r['submitted'] for r in records)-60)
+    try:
+        with open(STATUS_FILE) as f:
+            offsets = json.load(f)
+    except (IOError, OSError, ValueError):
+        offsets = {}
+
+    rows, seen = [], {}
+    for record in records:
+        for task, log in script_tasks(record['script']):
+            job_id = record['job_id']
+            if task is not None:
+                job_id = '%s_%d' % (job_id, task)
+            state, elapsed = states.get(job_id,
+                                        states.get(record['job_id'], ('', '')))
+            progress = log_progress(log, offsets.get(log, {}))
+            seen[log] = progress
+            rows.append({'job_id' : job_id,
+                         'state'  : state or 'UNKNOWN',
+                         'elapsed': elapsed,
+                         'log'    : log,
+                         'scf'    : progress.get('scf'),
+                         'step'   : progress.get('step'),
+                         'energy' : progress.get('energy'),
+                         'result' : progress.get('result')})
+    try:
+        write_json(STATUS_FILE, seen)
+    except (IOError, OSError):
+        pass
+    return rows
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def print_status(rows):
+    """One line for every input of the tracked jobs."""
+
+    print('%-12s %-10s %11s %-30s %4s %4s %16s %-6s' % ('JobID', 'State',
+          'Elapsed', 'Log', 'SCF', 'Step', 'Energy', 'Result'))
+    for row in rows:
+        print('%-12s %-10s %11s %-30s %4s %4s %16s %-6s' % (row['job_id'],
+              row['state'][:10], row['elapsed'],
+              os.path.relpath(row['log'])[-30:],
+              '' if row['scf'] is None else row['scf'],
+              '' if row['step'] is None else row['step'],
+              '' if row['energy'] is None else '%.8f' % row['energy'],
+              row['result'] or ''))
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def run_status(argv):
+    """gaussian-sub.py status [--json] [--days N]"""
+
+    parser = argparse.ArgumentParser(prog='gaussian-sub.py status',
+        description='State and progress of the jobs submitted with --submit')
+    parser.add_argument('--json', action='store_true',
+        help='print JSON instead of a table')
+    parser.add_argument('--days', type=float, default=STATUS_DAYS,
+        help='show jobs submitted in the last DAYS days (default: %d)'
+             % STATUS_DAYS)
+    args = parser.parse_args(argv)
+
+    rows = job_status(args.days)
+    if args.json:
+        print(json.dumps(rows, indent=1))
+    elif not rows:
+        print('No jobs submitted with --submit in the last %g days'
+              % args.days)
+    else:
+        print_status(rows)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+def main():
+    """Ask about the job, check the inputs and write the scripts."""
+
+    if sys.argv[1:2] == ['benchmark']:
+        run_benchmark(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['status']:
+        run_status(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['workflow']:
+        run_workflow(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['index']:
+        run_index(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['generate']:
+        run_generate(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['budget']:
+        run_budget(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['post']:
+        run_post(sys.argv[2:])
+        sys.exit()
+    if sys.argv[1:2] == ['scale-study']:
+        run_scale_study(sys.argv[2:])
+        sys.exit()
+    job = get_user_input()
+    outputs = f_output
+    if not settings['rebuild']:
+        outputs = skip_unchanged(job, outputs, settings['submit'])
+        if not job.inputs:
+            sys.exit()
+    check_Gaussian_input(job, gen)
+    if not settings['no_cache']:
+        outputs = skip_cached(job, outputs, settings['link_cached'])
+        if not job.inputs:
+            sys.exit()
+    failed = 0
+    if settings['split_steps']:
+        if job.array or job.pack or settings['spread']:
+            print('\nERROR: --split-steps runs each step as a job of its own, '
+                  'it can\'t be used with --array, --pack or --spread\n')
+            sys.exit(1)
+        outputs, failed = split_jobs(job, outputs, settings['dry_run'],
+                                     settings['submit'])
+        if not job.inputs:
+            sys.exit(1 if failed else 0)
+    if (job.array or job.pack) and len(f_output) != 1:
+        outputs = [settings['output']] if settings.get('output') else None
+    jobs = [(job, outputs)]
+    if settings['spread']:
+        try:
+            jobs = spread_jobs(job, account_budgets(
+                user_allocations(user_groups(), inventory['partitions']),
+                inventory, job.cores, job.memory), outputs)
+        except (BudgetError, IOError, OSError, ValueError) as error:
+            print('\nERROR: %s\n' % error)
+            sys.exit(1)
+        for spec, spec_outputs in jobs:
+            print('Spreading %d job(s) to %s on the %s queue'
+                  % (len(spec.inputs), spec.allocation, spec.queue))
+        print()
+
+    written = []
+    for spec, spec_outputs in jobs:
+        if (spec.array or spec.pack) and not settings['dry_run']:
+            manifest = array_name(spec, spec_outputs[0] if spec_outputs
+                                  else None)+'.manifest'
+            print('Writing %d input files to %s\n'
+                  % (len(spec.inputs), manifest))
+        written.append((spec, write_jobs(spec, spec_outputs,
+                                         settings['dry_run'])))
+    if settings['dry_run']:
+        return
+    scripts = [script for spec, spec_scripts in written
+               for script in spec_scripts]
+    for script in scripts:
+        print('Writing to '+script+'\n')
+        if not settings['submit']:
+            print("""Please run 'sbatch %s' to submit to the scheduler\n""" 
+                  % script)
+    results = None
+    if settings['submit']:
+        results = submit_scripts(scripts)
+    for spec, spec_scripts in written:
+        queue_budget(spec, spec_scripts, results)
+    index_scripts(written, results)
+    if results is not None and report_submissions(results):
+        sys.exit(1)
+    if failed:
+        sys.exit(1)
+#----------------------------------------------------------------------------
+
+#----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
+#----------------------------------------------------------------------------
+
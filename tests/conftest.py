@@ -0,0 +1,117 @@
+import os
+import sys
+import tempfile
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the caches, profiles and calibration of whoever runs the tests out
+# of them; this has to happen before the module reads the environment.
+HOME = tempfile.mkdtemp(prefix='gaussian-sub-tests-')
+os.environ['XDG_CACHE_HOME'] = os.path.join(HOME, 'cache')
+os.environ['XDG_CONFIG_HOME'] = os.path.join(HOME, 'config')
+for name in ('GAUSSIAN_SUB_ACCOUNTING', 'GAUSSIAN_SUB_LEDGER',
+             'GAUSSIAN_SUB_CALIBRATION', 'GAUSSIAN_SUB_PROFILES'):
+    os.environ.pop(name, None)
+
+import gaussian_sub
+
+STATE_FILES = ['LEDGER_FILE', 'HISTORY_FILE', 'RESULT_INDEX', 'SCRIPT_INDEX',
+               'BUDGET_FILE', 'STATUS_FILE', 'SCALING_FILE']
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run each test in its own directory with its own cache files."""
+
+    cache = tmp_path / 'cache'
+    monkeypatch.setattr(gaussian_sub, 'CACHE_DIR', str(cache))
+    for name in STATE_FILES:
+        path = os.path.basename(getattr(gaussian_sub, name))
+        monkeypatch.setattr(gaussian_sub, name, str(cache / path))
+    monkeypatch.setattr(gaussian_sub, 'CALIBRATION_FILE',
+                        str(tmp_path / 'calibration.ini'))
+    monkeypatch.setattr(gaussian_sub, 'parsed_inputs', {})
+    monkeypatch.setattr(gaussian_sub, 'input_records', {})
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def write_input(workdir):
+    """Write a Gaussian input into the test directory, returns its name."""
+
+    def write(name, text):
+        with open(str(workdir / name), 'w') as f:
+            f.write(textwrap.dedent(text).lstrip('\n'))
+        return name
+    return write
+
+
+FAKE_SBATCH = r"""#!/bin/bash
+# Fake sbatch: every call is logged without its --comment, transient*.sh
+# fails once with a timeout, accepted*.sh is queued but times out the
+# first time, bad*.sh is always refused, the rest get job IDs from 1001.
+dir=$(dirname $0)
+script=${@: -1}
+args=() comment=
+for arg in "$@"; do
+    case $arg in
+    --comment=*) comment=${arg#--comment=} ;;
+    *) args+=($arg) ;;
+    esac
+done
+echo "${args[@]}" >> $dir/calls.log
+name=$(basename $script)
+fail_once() {
+    if [ ! -f $dir/$name.failed ]; then
+        touch $dir/$name.failed
+        echo "sbatch: error: Socket timed out on send/recv operation" >&2
+        exit 1
+    fi
+}
+case $name in
+transient*) fail_once ;;
+bad*)
+    echo "sbatch: error: Invalid account or account/partition combination" >&2
+    exit 1 ;;
+esac
+exec 9> $dir/next.lock
+flock 9
+n=$(cat $dir/next 2>/dev/null || echo 1001)
+echo $((n + 1)) > $dir/next
+echo "$n|$comment" >> $dir/queue
+case $name in
+accepted*) fail_once ;;
+esac
+echo "$n;mox"
+"""
+
+# Fake squeue: the jobs fake sbatch queued, or an error with squeue.down
+FAKE_SQUEUE = r"""#!/bin/bash
+dir=$(dirname $0)
+if [ -f $dir/squeue.down ]; then
+    echo "squeue: error: Socket timed out on send/recv operation" >&2
+    exit 1
+fi
+cat $dir/queue 2>/dev/null
+exit 0
+"""
+
+
+@pytest.fixture
+def fake_sbatch(workdir, monkeypatch):
+    """Put a fake sbatch and squeue on PATH, returns their directory."""
+
+    bin_dir = workdir / 'bin'
+    bin_dir.mkdir()
+    for name, text in [('sbatch', FAKE_SBATCH), ('squeue', FAKE_SQUEUE)]:
+        command = bin_dir / name
+        command.write_text(text)
+        command.chmod(0o755)
+    monkeypatch.setenv('PATH', str(bin_dir)+os.pathsep+os.environ['PATH'])
+    monkeypatch.setattr(gaussian_sub, 'SUBMIT_BACKOFF', 0.0)
+    return bin_dir
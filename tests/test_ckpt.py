@@ -0,0 +1,28 @@
+import subprocess
+
+import gaussian_sub
+
+RESTART = """\
+%chk=water.chk
+%Mem=4GB
+%NProcShared=4
+%NProcLinda=2
+%LindaWorkers=n1,n2
+#p b3lyp/6-31g(d) opt=restart geom=allcheck guess=read
+
+"""
+
+
+def test_restart_input_keeps_its_linda_lines(workdir):
+    spec = gaussian_sub.JobSpec(['water.com'], 'hyak-stf', queue='ckpt',
+                                cores=28, memory=100, hours=2)
+    text = gaussian_sub.render_script(spec, 'water.com')
+    start = text.index('if [ -f "$restartfile" ]')
+    block = text[start:text.index('\nfi\n', start)+4]
+    with open('water_restart.com', 'w') as f:
+        f.write(RESTART)
+    subprocess.check_call(['bash', '-c', 'gbmem=90 num_threads=28 '
+                           'restartfile=water_restart.com\n' + block])
+    with open('water_restart.com') as f:
+        assert f.read() == RESTART.replace('%Mem=4GB', '%mem=90GB') \
+            .replace('%NProcShared=4', '%nprocshared=28')
@@ -0,0 +1,80 @@
+import gaussian_sub
+
+WATER = """
+    %mem=10GB
+    %nprocshared=16
+    #p hf/sto-3g
+
+    water
+
+    0 1
+    O  0.0  0.0   0.0
+    H  0.0  0.76  0.59
+    H  0.0 -0.76  0.59
+
+"""
+
+INVENTORY = {'partitions': ['stf'],
+             'node_types': {'stf': [[10, 28, 128000], [4, 40, 192000]]}}
+
+
+def test_estimate_is_never_below_the_input_link0(write_input):
+    model = gaussian_sub.load_input(write_input('water.com', WATER))
+    estimate = gaussian_sub.estimate_steps(model)
+    assert estimate['memory'] == 10
+    assert estimate['cores'] == 16
+    assert estimate['nproc'] == 16
+
+
+def test_estimate_covers_the_largest_link1_step(write_input):
+    text = WATER + """--Link1--
+    %mem=30GB
+    %nprocshared=4
+    #p hf/sto-3g geom=check guess=read
+
+    again
+
+    0 1
+
+    """
+    model = gaussian_sub.load_input(write_input('water.com', text))
+    estimate = gaussian_sub.estimate_steps(model)
+    assert estimate['memory'] == 30
+    assert estimate['cores'] == 16
+    assert estimate['step'] == 2
+    assert [step['memory'] for step in estimate['steps']] == [10, 30]
+
+
+def test_default_memory_keeps_the_input_mem(write_input):
+    model = gaussian_sub.load_input(write_input('water.com', WATER))
+    recommendation = gaussian_sub.recommend_resources([model], INVENTORY,
+                                                      'stf')
+    assert recommendation['memory'] == 10
+    assert recommendation['nprocshared'] == 16
+
+
+def test_scaling_does_not_lower_the_input_nprocshared(write_input):
+    model = gaussian_sub.load_input(write_input('water.com', WATER))
+    key = gaussian_sub.scaling_key(gaussian_sub.estimate_steps(model))
+    gaussian_sub.write_json(gaussian_sub.SCALING_FILE,
+                            {key: {'cores': 2, 'nodes': 1,
+                                   'efficiency': 0.9, 'input': 'x.com'}})
+    recommendation = gaussian_sub.recommend_resources([model], INVENTORY,
+                                                      'stf')
+    assert recommendation['scaling'] is not None
+    assert recommendation['nprocshared'] == 16
+
+
+def test_print_estimates_without_main(write_input, capsys):
+    inputs = [write_input('w%d.com' % i, WATER) for i in range(3)]
+    recommendation = gaussian_sub.recommend_resources(
+        gaussian_sub.load_inputs(inputs), INVENTORY, 'stf')
+
+    gaussian_sub.print_estimates(inputs, recommendation, max_rows=2)
+    output = capsys.readouterr()[0]
+    assert 'w0.com' not in output
+    assert 'Recommended: %mem=10GB and %nprocshared=16' in output
+
+    gaussian_sub.print_estimates(inputs, recommendation, max_rows=2,
+                                 show_all=True)
+    assert 'w2.com' in capsys.readouterr()[0]
@@ -0,0 +1,16 @@
+import subprocess
+
+import pytest
+
+import gaussian_sub
+
+
+@pytest.mark.parametrize('instrument', [False, True])
+def test_farm_script_is_not_indented(instrument):
+    spec = gaussian_sub.JobSpec(['a.com', 'b.com', 'c.com'], 'hyak-stf',
+                                cores=28, memory=100, hours=2, pack=True,
+                                slots=2, instrument=instrument)
+    text = gaussian_sub.render_farm(spec, 'manifest.txt', 'farm')
+    assert not [line for line in text.split('\n') if line.startswith('    ')]
+    assert ('\n\t\tperf_watch $!\n' in text) == instrument
+    assert subprocess.call(['bash', '-n', '-c', text]) == 0
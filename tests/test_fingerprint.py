@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import gaussian_sub
+
+WATER = """
+    %chk=water.chk
+    %mem=4GB
+    %nprocshared=8
+    #p b3lyp/6-31g(d) opt freq
+
+    water
+
+    0 1
+    O  0.0  0.0   0.0
+    H  0.0  0.76  0.59
+    H  0.0 -0.76  0.59
+
+"""
+
+
+def fingerprint(write_input, name, text):
+    return gaussian_sub.input_fingerprint(write_input(name, text))
+
+
+@pytest.mark.parametrize('text', [
+    # cosmetic Link 0 lines
+    WATER.replace('%mem=4GB', '%mem=32GB')
+         .replace('%nprocshared=8', '%nprocshared=28'),
+    WATER.replace('%chk=water.chk', '%chk=other.chk\n    %rwf=water.rwf'),
+    WATER.replace('    %mem=4GB\n', ''),
+    # title, comments, spacing and keyword order
+    WATER.replace('water\n', 'another title\n'),
+    WATER.replace('opt freq', 'freq  opt ! comment'),
+    WATER.replace('#p b3lyp', '#P B3LYP'),
+    WATER.replace('O  0.0  0.0   0.0', 'O 0.00000 0.0 0.0')])
+def test_same_calculation(write_input, text):
+    assert fingerprint(write_input, 'a.com', WATER) == \
+        fingerprint(write_input, 'b.com', text)
+
+
+@pytest.mark.parametrize('text', [
+    WATER.replace('6-31g(d)', '6-311g(d)'),
+    WATER.replace('opt freq', 'opt'),
+    WATER.replace('0 1', '1 2'),
+    WATER.replace('0.76', '0.77', 1),
+    WATER.replace('%mem=4GB', '%mem=4GB\n    %kjob=l502')])
+def test_different_calculation(write_input, text):
+    assert fingerprint(write_input, 'a.com', WATER) != \
+        fingerprint(write_input, 'b.com', text)
+
+
+@pytest.mark.parametrize('text', [
+    WATER + '--Link1--\n%chk=water.chk\n#p b3lyp/6-31g(d) geom=check\n\n',
+    WATER.replace('%chk=water.chk', '%oldchk=old.chk\n    %chk=water.chk'),
+    WATER.replace('opt freq', 'opt freq guess=read'),
+    """
+    #p b3lyp/6-31g(d) opt
+
+    water
+
+    0 1
+    O
+    H 1 0.96
+    H 1 0.96 2 104.5
+
+    """])
+def test_never_cached(write_input, text):
+    assert fingerprint(write_input, 'a.com', text) is None
+
+
+def test_finished_log_is_found(write_input):
+    write_input('water.com', WATER)
+    assert gaussian_sub.index_results(['water.com']) == 1
+    index = gaussian_sub.read_result_index()
+    write_input('copy.com', WATER.replace('%mem=4GB', '%mem=8GB'))
+    assert gaussian_sub.cached_result('copy.com', index) is None
+
+    with open('water.log', 'w') as f:
+        f.write(' Normal termination of Gaussian 16\n')
+    found = gaussian_sub.cached_result('copy.com', index)
+    assert found == os.path.abspath('water.log')
+
+    # the input changed after its log was written
+    stamp = os.path.getmtime('water.log') + 10
+    os.utime('water.com', (stamp, stamp))
+    assert gaussian_sub.cached_result('copy.com', index) is None
@@ -0,0 +1,142 @@
+import json
+import os
+
+import pytest
+
+import gaussian_sub
+
+OPT_FREQ = """
+    %chk=water.chk
+    %mem=40GB
+    %nprocshared=16
+    #p mp2/aug-cc-pvtz opt
+
+    water
+
+    0 1
+    O  0.0  0.0   0.0
+    H  0.0  0.76  0.59
+    H  0.0 -0.76  0.59
+
+    --Link1--
+    %chk=water.chk
+    %mem=2GB
+    %nprocshared=4
+    #p hf/sto-3g geom=check guess=read pop=full ! cheap
+
+    population
+
+    0 1
+
+    --link1--
+    %oldchk=water.chk
+    %chk=water_td.chk
+    #p td b3lyp/6-31g(d) geom=allcheck guess=read
+
+"""
+
+
+@pytest.fixture
+def model(write_input):
+    return gaussian_sub.load_input(write_input('water.com', OPT_FREQ))
+
+
+def test_steps(model):
+    assert model.link1
+    assert len(model.steps) == 3
+    assert model.steps[0] is model
+    assert [step.method for step in model.steps] == ['mp2', 'hf', 'b3lyp']
+    assert [step.nproc() for step in model.steps] == [16, 4, 1]
+    assert [step.memory_mb() for step in model.steps] == [40000, 2000, None]
+    assert 'pop' in model.steps[1].keywords
+    assert model.steps[2].has_link0('oldchk')
+    assert not model.steps[1].has_link0('oldchk')
+
+
+def test_steps_read_the_geometry_before_them(model):
+    first, second, third = model.steps
+    assert second.atoms == first.atoms
+    assert third.atoms == first.atoms
+    assert (second.charge, second.multiplicity) == (0, 1)
+
+
+def test_single_step(write_input):
+    model = gaussian_sub.load_input(write_input(
+        'single.com', OPT_FREQ.split('--Link1--')[0]))
+    assert not model.link1
+    assert model.steps == [model]
+
+
+def test_estimate_takes_the_largest_step(model):
+    estimate = gaussian_sub.estimate_steps(model)
+    assert estimate['step'] == 1
+    assert estimate['nproc'] == 16
+    assert estimate['memory'] >= 40
+    assert [step['cores'] >= nproc for step, nproc
+            in zip(estimate['steps'], [16, 4, 1])] == [True]*3
+
+
+def test_split_input_keeps_each_step(model):
+    names = gaussian_sub.split_input('water.com')
+    assert names == ['water_step1.com', 'water_step2.com', 'water_step3.com']
+    with open('water_step2.com') as f:
+        text = f.read()
+    assert text.startswith('%chk=water.chk\n')
+    assert 'pop=full ! cheap' in text
+    for name, step in zip(names, model.steps):
+        split = gaussian_sub.load_input(name)
+        assert not split.link1
+        assert split.route == step.route
+
+
+def test_split_steps_chains_the_steps(model):
+    spec = gaussian_sub.JobSpec(['water.com'], 'hyak-stf', nodes=2,
+                                cores=28, memory=120, hours=8)
+    workflow = gaussian_sub.split_steps(spec, 'water.com')
+    assert os.path.abspath(workflow) == os.path.abspath('water_steps.json')
+    with open(workflow) as f:
+        steps = json.load(f)['steps']
+    assert [(step['name'], step['inputs'], step['after'])
+            for step in steps] == [
+        ('water_step1', ['water_step1.com'], []),
+        ('water_step2', ['water_step2.com'], ['water_step1']),
+        ('water_step3', ['water_step3.com'], ['water_step2'])]
+
+    # the biggest step keeps what was asked for
+    assert (steps[0]['nodes'], steps[0]['cores'], steps[0]['memory']) == \
+        (2, 28, 120)
+    # the others get what they need on one node
+    needs = gaussian_sub.estimate_steps(model)['steps']
+    for step, need in zip(steps[1:], needs[1:]):
+        assert step['nodes'] == 1
+        assert step['cores'] == min(28, need['cores'])
+        assert step['memory'] == min(120, need['memory']+10)
+        assert step['hours'] == 8 and step['allocation'] == 'hyak-stf'
+
+    # and the workflow can be read back and ordered
+    ordered = gaussian_sub.link_workflow(gaussian_sub.read_workflow(workflow))
+    assert [step.name for step in ordered] == \
+        ['water_step1', 'water_step2', 'water_step3']
+
+
+def test_split_jobs_leaves_single_step_inputs(model, write_input):
+    write_input('single.com', OPT_FREQ.split('--Link1--')[0])
+    spec = gaussian_sub.JobSpec(['water.com', 'single.com'], 'hyak-stf',
+                                cores=28, hours=8)
+    outputs, failed = gaussian_sub.split_jobs(spec, ['water.log',
+                                                     'single.log'])
+    assert (spec.inputs, outputs, failed) == (['single.com'],
+                                              ['single.log'], 0)
+    assert os.path.isfile('water_steps.json')
+
+
+def test_split_jobs_submits_the_workflow(model, fake_sbatch):
+    spec = gaussian_sub.JobSpec(['water.com'], 'hyak-stf', cores=28, hours=8)
+    outputs, failed = gaussian_sub.split_jobs(spec, submit=True)
+    assert failed == 0 and spec.inputs == []
+    with open(str(fake_sbatch / 'calls.log')) as f:
+        calls = [line.split() for line in f]
+    assert [call[-1] for call in calls] == \
+        ['water_step1.sh', 'water_step2.sh', 'water_step3.sh']
+    assert '--dependency=afterok:1001' in calls[1]
+    assert '--dependency=afterok:1002' in calls[2]
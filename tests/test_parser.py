@@ -0,0 +1,111 @@
+import pytest
+
+import gaussian_sub
+
+INPUT = """
+    %Mem=16GB
+    %NProcShared = 8
+    %chk=ethane.chk   ! the checkpoint
+    #P B3LYP/6-31+G(d,p) Opt=(TS, CalcFC) Freq
+       SCF = Tight
+
+    memory and nproc in the title, chk too
+
+    0,1
+    C    0.000   0.000   0.765
+    C1   0.000   0.000  -0.765
+    H    1.018   0.000   1.164
+    H-H_ -1.018  0.000   1.164
+    1    0.000   1.018  -1.164
+    H   0  0.0  -1.018  -1.164
+
+    B 1 2 F
+
+"""
+
+
+@pytest.fixture
+def model(write_input):
+    return gaussian_sub.parse_gaussian_input(write_input('ethane.com', INPUT))
+
+
+def test_link0(model):
+    assert model.link0 == [('mem', '16GB'), ('nprocshared', '8'),
+                           ('chk', 'ethane.chk')]
+    assert model.memory_mb() == 16000
+    assert model.nproc() == 8
+    assert model.link0_value('chk') == 'ethane.chk'
+    assert not model.has_link0('lindaworkers')
+
+
+def test_route(model):
+    assert model.method == 'b3lyp'
+    assert model.basis == '6-31+g(d,p)'
+    assert model.keywords == {'opt': 'ts,calcfc', 'freq': '', 'scf': 'tight'}
+    assert model.job_types() == ['opt', 'freq']
+
+
+def test_title_words_are_not_link0(model):
+    assert model.title == 'memory and nproc in the title, chk too'
+    assert len(model.link0) == 3
+
+
+def test_molecule(model):
+    assert (model.charge, model.multiplicity) == (0, 1)
+    assert [atom[0] for atom in model.atoms] == ['C', 'C', 'H', 'H', 'H', 'H']
+    assert model.atoms[1] == ('C', 0.0, 0.0, -0.765)
+    # Frozen atom flag in front of the coordinates
+    assert model.atoms[5] == ('H', 0.0, -1.018, -1.164)
+    assert model.trailing == ['B 1 2 F']
+    assert not model.link1
+    assert model.steps == [model]
+
+
+def test_zmatrix_and_checkpoint_geometry(write_input):
+    zmatrix = gaussian_sub.parse_gaussian_input(write_input('z.com', """
+        #p hf/sto-3g
+
+        water
+
+        0 1
+        O
+        H 1 r
+        H 1 r 2 a
+
+        r=0.96
+        a=104.5
+
+    """))
+    assert [atom[0] for atom in zmatrix.atoms] == ['O', 'H', 'H']
+    assert all(atom[1] is None for atom in zmatrix.atoms)
+    assert zmatrix.trailing == ['r=0.96\na=104.5']
+
+    allcheck = gaussian_sub.parse_gaussian_input(write_input('c.com', """
+        %oldchk=water.chk
+        #p b3lyp/6-31g(d) freq geom=allcheck guess=read
+
+    """))
+    assert allcheck.atoms == []
+    assert allcheck.charge is None
+    assert allcheck.keywords['geom'] == 'allcheck'
+
+
+@pytest.mark.parametrize('value, mb', [('10GB', 10000), ('500MB', 500),
+                                       ('2gw', 16000), ('1000000', 8.0),
+                                       ('lots', None), (None, None)])
+def test_parse_memory(value, mb):
+    assert gaussian_sub.parse_memory(value) == mb
+
+
+def test_cpu_list(write_input):
+    model = gaussian_sub.parse_gaussian_input(write_input('cpu.com', """
+        %cpu=0-7,16-23/2
+        #p hf/sto-3g
+
+        t
+
+        0 1
+        He 0 0 0
+
+    """))
+    assert model.nproc() == 12
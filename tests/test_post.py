@@ -0,0 +1,31 @@
+import gzip
+import os
+
+import gaussian_sub
+
+
+def test_gzip_replaces_the_file():
+    with open('water2.log', 'w') as f:
+        f.write(' SCF Done\n' * 1000)
+    saved = gaussian_sub.gzip_file('water2.log')
+    assert not os.path.exists('water2.log')
+    assert saved == 10000 - os.path.getsize('water2.log.gz')
+    with gzip.open('water2.log.gz', 'rb') as f:
+        assert f.read() == b' SCF Done\n' * 1000
+
+
+def test_gzip_never_replaces_an_older_copy():
+    with gzip.open('water2.log.gz', 'wb') as f:
+        f.write(b'first run\n')
+    with open('water2.log', 'w') as f:
+        f.write('second run\n')
+
+    kind, path, saved, error = gaussian_sub.run_post_task(('gzip',
+                                                           'water2.log'))
+    assert (saved, error) == (0, 'water2.log: water2.log.gz already exists')
+    with gzip.open('water2.log.gz', 'rb') as f:
+        assert f.read() == b'first run\n'
+    with open('water2.log') as f:
+        assert f.read() == 'second run\n'
+    assert [name for name in os.listdir('.')
+            if name.startswith('.tmp-')] == []
@@ -0,0 +1,140 @@
+import os
+
+import gaussian_sub
+
+WATER = """
+    %mem=4GB
+    %nprocshared=4
+    #p hf/sto-3g
+
+    water
+
+    0 1
+    O  0.0  0.0   0.0
+    H  0.0  0.76  0.59
+    H  0.0 -0.76  0.59
+
+"""
+
+
+def write_and_submit(spec, job_ids):
+    """Index the inputs and write their scripts like main() does."""
+
+    gaussian_sub.load_input_records(spec.inputs)
+    scripts = gaussian_sub.write_jobs(spec)
+    results = [(script, job_id, None)
+               for script, job_id in zip(scripts, job_ids)]
+    gaussian_sub.index_scripts([(spec, scripts)], results)
+    return scripts
+
+
+def rerun(inputs):
+    """A later run: a new spec and nothing remembered in memory."""
+
+    gaussian_sub.input_records.clear()
+    gaussian_sub.parsed_inputs.clear()
+    gaussian_sub.load_input_records(inputs)
+    return gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20)
+
+
+def rewrite_like_the_job_script(name):
+    """What the job script's sed lines do to a running input."""
+
+    with open(name) as f:
+        lines = f.read().splitlines(True)
+    lines = ['%mem=10GB\n' if line.startswith('%mem') else
+             '%nprocshared=28\n' if line.startswith('%nproc') else line
+             for line in lines]
+    with open(name, 'w') as f:
+        f.write('%chk=' + os.path.splitext(name)[0] + '.chk\n')
+        f.writelines(lines)
+
+
+def test_unchanged_inputs_are_skipped(write_input):
+    inputs = [write_input('w%d.com' % i, WATER) for i in (1, 2, 3)]
+    write_and_submit(gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20),
+                     ['1001', '1002', '1003'])
+
+    spec = rerun(inputs)
+    gaussian_sub.skip_unchanged(spec, submit=True)
+    assert spec.inputs == []
+
+
+def test_a_running_job_does_not_make_its_input_new(write_input):
+    inputs = [write_input('w%d.com' % i, WATER) for i in (1, 2, 3)]
+    write_and_submit(gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20),
+                     ['1001', '1002', '1003'])
+    rewrite_like_the_job_script('w1.com')
+
+    spec = rerun(inputs)
+    gaussian_sub.skip_unchanged(spec, submit=True)
+    # Resubmitting w1.com would run job 1001 a second time
+    assert spec.inputs == []
+    assert gaussian_sub.input_records[os.path.abspath('w1.com')]['job'] \
+        == '1001'
+
+
+def test_changed_inputs_and_settings_are_written_again(write_input):
+    inputs = [write_input('w%d.com' % i, WATER) for i in (1, 2, 3)]
+    write_and_submit(gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20),
+                     ['1001', '1002', '1003'])
+    write_input('w2.com', WATER.replace('hf/sto-3g', 'b3lyp/6-31g(d)'))
+
+    spec = rerun(inputs)
+    gaussian_sub.skip_unchanged(spec, submit=True)
+    assert spec.inputs == ['w2.com']
+
+    spec = rerun(inputs)
+    spec.hours = 4
+    gaussian_sub.skip_unchanged(spec)
+    assert spec.inputs == inputs
+
+
+def test_written_but_not_submitted_scripts_are_submitted(write_input):
+    inputs = [write_input('w1.com', WATER)]
+    write_and_submit(gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20),
+                     [])
+
+    spec = rerun(inputs)
+    gaussian_sub.skip_unchanged(spec)
+    assert spec.inputs == []
+    spec = rerun(inputs)
+    gaussian_sub.skip_unchanged(spec, submit=True)
+    assert spec.inputs == inputs
+
+
+def test_new_mem_and_nproc_are_estimated_again(write_input):
+    inputs = [write_input('w1.com', WATER)]
+    write_and_submit(gaussian_sub.JobSpec(inputs, 'hyak-stf', memory=20),
+                     ['1001'])
+    write_input('w1.com', WATER.replace('%mem=4GB', '%mem=60GB')
+                               .replace('%nprocshared=4', '%nprocshared=24'))
+
+    rerun(inputs)
+    record = gaussian_sub.input_records[os.path.abspath('w1.com')]
+    assert record['unchanged']
+    assert record['estimate']['memory'] >= 60
+    assert record['estimate']['cores'] >= 24
+    assert record['estimate']['nproc'] == 24
+
+    # and the new estimate is what the next run starts from
+    gaussian_sub.index_scripts([])
+    rerun(inputs)
+    record = gaussian_sub.input_records[os.path.abspath('w1.com')]
+    assert record['estimate']['memory'] >= 60
+
+
+def test_a_new_checkpoint_is_a_change(write_input):
+    text = WATER.replace('%mem', '%chk=first.chk\n    %mem')
+    inputs = [write_input('w1.com', text)]
+    spec = gaussian_sub.JobSpec(inputs, 'hyak-stf', queue='ckpt', memory=20)
+    write_and_submit(spec, ['1001'])
+    write_input('w1.com', text.replace('first.chk', 'second.chk'))
+
+    spec = rerun(inputs)
+    spec.queue = 'ckpt'
+    gaussian_sub.skip_unchanged(spec, submit=True)
+    assert spec.inputs == inputs
+    gaussian_sub.write_jobs(spec)
+    with open('w1_restart.com') as f:
+        assert f.readline() == '%chk=second.chk\n'
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import gaussian_sub
+
+INVENTORY = {'partitions'  : ['stf', 'chem', 'ckpt'],
+             'allocations' : [],
+             'node_types'  : {'stf' : [[2, 28, 128000]],
+                              'chem': [[1, 40, 192000]],
+                              'ckpt': [[100, 28, 128000], [20, 40, 192000]]}}
+# Nothing idle on ckpt unless a test says otherwise
+STATE = {'ckpt': {'types'  : {(28, 128000): {'idle': 0},
+                              (40, 192000): {'idle': 0}},
+                  'pending': 0}}
+ALLOCATIONS = ['hyak-stf', 'hyak-chem']
+
+
+def accounting(workdir, accounts, pending=()):
+    path = str(workdir / 'accounting.json')
+    with open(path, 'w') as f:
+        json.dump({'accounts': accounts, 'pending': list(pending)}, f)
+    return gaussian_sub.FakeAccounting(path)
+
+
+def spread(backend, n_jobs, cores=28, hours=1, state=STATE):
+    spec = gaussian_sub.JobSpec(['in%d.com' % i for i in range(n_jobs)],
+                                'hyak-stf', cores=cores, hours=hours)
+    budgets = gaussian_sub.account_budgets(ALLOCATIONS, INVENTORY, cores, 0,
+                                           backend, state)
+    return budgets, gaussian_sub.spread_jobs(spec, budgets)
+
+
+def placed(jobs):
+    return dict(('%s/%s' % (spec.allocation, spec.queue), len(spec.inputs))
+                for spec, outputs in jobs)
+
+
+def test_jobs_fill_the_free_batch_cores_first(workdir):
+    backend = accounting(workdir, {'stf': {'limit': 1000}, 'chem': {}})
+    budgets, jobs = spread(backend, 3)
+    # Two 28 core nodes on stf, one 40 core node on chem
+    assert placed(jobs) == {'hyak-stf/batch': 2, 'hyak-chem/batch': 1}
+
+
+def test_busy_accounts_get_the_least_backlog(workdir):
+    backend = accounting(workdir, {'stf': {'cores': 56}, 'chem': {}})
+    budgets, jobs = spread(backend, 4)
+    # chem's free node first, then whichever has the least queued for
+    # its size; ckpt has no idle nodes so it comes last.
+    assert placed(jobs) == {'hyak-stf/batch': 2, 'hyak-chem/batch': 2}
+
+
+def test_exhausted_budget_raises(workdir):
+    backend = accounting(workdir, {'stf'     : {'limit': 100, 'used': 40},
+                                   'chem'    : {'limit': 30},
+                                   'stf-ckpt': {'limit': 0},
+                                   'chem-ckpt': {'limit': 0}})
+    with pytest.raises(gaussian_sub.BudgetError) as error:
+        spread(backend, 5)
+    # 60 core-hours left on stf is two jobs of 28, chem has room for one
+    assert 'Only 3 of the 5 jobs' in str(error.value)
+
+
+def test_queued_jobs_count_against_the_budget(workdir):
+    backend = accounting(workdir, {'stf'      : {'limit': 60},
+                                   'chem'     : {'limit': 0},
+                                   'stf-ckpt' : {'limit': 0},
+                                   'chem-ckpt': {'limit': 0}})
+    budgets, jobs = spread(backend, 2)
+    for spec, outputs in jobs:
+        gaussian_sub.queue_budget(spec, ['in%d.sh' % i
+                                         for i in range(len(spec.inputs))])
+    with pytest.raises(gaussian_sub.BudgetError):
+        spread(backend, 1)
+
+
+def test_allocation_too_small_for_the_job(workdir):
+    backend = accounting(workdir, {'stf': {}, 'chem': {}})
+    budgets, jobs = spread(backend, 2, cores=40)
+    # stf only has 28 core nodes, its ckpt account can use 40 core ones
+    assert 'stf' not in [budget['account'] for budget in budgets]
+    assert 'stf-ckpt' in [budget['account'] for budget in budgets]
+    assert all(spec.allocation != 'hyak-stf' or spec.queue == 'ckpt'
+               for spec, outputs in jobs)
+
+
+def test_no_allocation_fits(workdir):
+    backend = accounting(workdir, {})
+    with pytest.raises(gaussian_sub.BudgetError) as error:
+        spread(backend, 1, cores=64)
+    assert 'None of your allocations' in str(error.value)
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+
+import gaussian_sub
+
+
+def scripts(*names):
+    for name in names:
+        with open(name, 'w') as f:
+            f.write('#!/bin/bash\n')
+    return list(names)
+
+
+def calls(bin_dir):
+    with open(str(bin_dir / 'calls.log')) as f:
+        return [line.split() for line in f]
+
+
+def ledger():
+    with open(gaussian_sub.LEDGER_FILE) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_transient_error_is_retried(fake_sbatch):
+    results = gaussian_sub.submit_scripts(scripts('transient.sh'))
+    assert results == [('transient.sh', '1001', None)]
+    assert [call[-1] for call in calls(fake_sbatch)] == ['transient.sh']*2
+
+
+def test_permanent_error_is_not_retried(fake_sbatch):
+    results = gaussian_sub.submit_scripts(scripts('bad.sh', 'good.sh'))
+    script, job_id, error = results[0]
+    assert (script, job_id) == ('bad.sh', None)
+    assert 'Invalid account' in error
+    assert results[1] == ('good.sh', '1001', None)
+    assert [call[-1] for call in calls(fake_sbatch)].count('bad.sh') == 1
+
+
+def test_ledger_has_a_record_per_job(fake_sbatch):
+    names = scripts('a.sh', 'b.sh', 'bad.sh', 'c.sh')
+    before = time.time()
+    results = gaussian_sub.submit_scripts(names)
+
+    records = ledger()
+    assert sorted(record['job_id'] for record in records) == \
+        sorted(job_id for script, job_id, error in results if job_id)
+    assert len(records) == 3
+    for record in records:
+        assert set(record) == set(['job_id', 'script', 'submitted'])
+        assert os.path.isabs(record['script'])
+        assert os.path.basename(record['script']) != 'bad.sh'
+        assert before <= record['submitted'] <= time.time()
+
+
+def test_dependencies_are_passed_to_sbatch(fake_sbatch):
+    gaussian_sub.submit_scripts(scripts('a.sh'), after=['7', '8'])
+    assert calls(fake_sbatch) == [['--parsable',
+                                   '--dependency=afterok:7:8',
+                                   '--kill-on-invalid-dep=yes', 'a.sh']]
+
+
+def test_rate_limiter_spaces_calls_out():
+    limiter = gaussian_sub.RateLimiter(20.0)
+    start = time.time()
+    for i in range(5):
+        limiter.wait()
+    # The first call goes straight away, the other four 0.05 s apart
+    assert 0.19 <= time.time() - start < 1.0
+
+
+def test_submissions_keep_to_the_rate(fake_sbatch):
+    names = scripts('a.sh', 'b.sh', 'c.sh', 'd.sh')
+    start = time.time()
+    results = gaussian_sub.submit_scripts(names, workers=4, rate=10.0)
+    assert time.time() - start >= 0.29
+    assert sorted(job_id for script, job_id, error in results) == \
+        ['1001', '1002', '1003', '1004']
+
+
+def test_job_queued_before_a_timeout_is_not_submitted_again(fake_sbatch):
+    results = gaussian_sub.submit_scripts(scripts('accepted.sh'))
+    assert results == [('accepted.sh', '1001', None)]
+    assert [call[-1] for call in calls(fake_sbatch)] == ['accepted.sh']
+    assert [record['job_id'] for record in ledger()] == ['1001']
+
+
+def test_timeout_is_not_retried_when_squeue_cannot_say(fake_sbatch):
+    (fake_sbatch / 'squeue.down').write_text(u'')
+    results = gaussian_sub.submit_scripts(scripts('transient.sh'))
+    script, job_id, error = results[0]
+    assert job_id is None
+    assert 'squeue could not say' in error
+    assert [call[-1] for call in calls(fake_sbatch)] == ['transient.sh']
+
+
+def test_each_submission_has_its_own_comment(fake_sbatch):
+    gaussian_sub.submit_scripts(scripts('a.sh', 'b.sh'))
+    with open(str(fake_sbatch / 'queue')) as f:
+        comments = [line.strip().split('|')[1] for line in f]
+    assert len(set(comments)) == 2
+    assert all(comment.startswith('gaussian-sub:') for comment in comments)
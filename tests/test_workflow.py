@@ -0,0 +1,151 @@
+import json
+
+import pytest
+
+import gaussian_sub
+
+OPT = """
+    %chk=water.chk
+    #p b3lyp/6-31g(d) opt
+
+    water
+
+    0 1
+    O  0.0  0.0   0.0
+    H  0.0  0.76  0.59
+    H  0.0 -0.76  0.59
+
+"""
+FREQ = """
+    %oldchk=water.chk
+    %chk=water_freq.chk
+    #p b3lyp/6-31g(d) freq geom=allcheck guess=read
+
+"""
+TD = """
+    %chk=water.chk
+    #p td b3lyp/6-31g(d) geom=check guess=read
+
+    water
+
+    0 1
+
+"""
+
+
+def workflow(workdir, steps, **defaults):
+    defaults.setdefault('allocation', 'hyak-stf')
+    defaults['steps'] = steps
+    with open(str(workdir / 'flow.json'), 'w') as f:
+        json.dump(defaults, f)
+    return gaussian_sub.read_workflow(str(workdir / 'flow.json'))
+
+
+@pytest.fixture
+def inputs(write_input):
+    write_input('opt.com', OPT)
+    write_input('freq.com', FREQ)
+    write_input('td.com', TD)
+
+
+def order(steps):
+    return [(step.name, step.after) for step in
+            gaussian_sub.link_workflow(steps)]
+
+
+def test_dependencies_come_from_the_checkpoints(workdir, inputs):
+    steps = workflow(workdir, [{'name': 'freq', 'inputs': 'freq.com'},
+                               {'name': 'td',   'inputs': 'td.com'},
+                               {'name': 'opt',  'inputs': 'opt.com'}])
+    assert order(steps) == [('opt', []), ('td', ['opt']),
+                            ('freq', ['td', 'opt'])]
+
+
+def test_after_overrides_the_checkpoints(workdir, inputs):
+    steps = workflow(workdir, [{'name': 'freq', 'inputs': 'freq.com',
+                                'after': 'td'},
+                               {'name': 'td',   'inputs': 'td.com'},
+                               {'name': 'opt',  'inputs': 'opt.com'}])
+    assert order(steps) == [('opt', []), ('td', ['opt']),
+                            ('freq', ['td'])]
+
+
+def test_kahn_keeps_the_file_order_where_it_can(workdir, inputs,
+                                                write_input):
+    write_input('other.com', OPT.replace('water.chk', 'other.chk'))
+    steps = workflow(workdir, [{'name': 'a', 'inputs': 'opt.com'},
+                               {'name': 'c', 'inputs': 'freq.com',
+                                'after': ['b']},
+                               {'name': 'b', 'inputs': 'td.com',
+                                'after': ['a']},
+                               {'name': 'd', 'inputs': 'other.com',
+                                'after': []}])
+    assert [name for name, after in order(steps)] == ['a', 'b', 'c', 'd']
+
+
+def test_cycle_is_an_error(workdir, inputs):
+    steps = workflow(workdir, [{'name': 'a', 'inputs': 'freq.com',
+                                'after': 'b'},
+                               {'name': 'b', 'inputs': 'freq.com',
+                                'after': 'a'}])
+    with pytest.raises(gaussian_sub.WorkflowError) as error:
+        order(steps)
+    assert 'steps a, b wait for each other' in str(error.value)
+
+
+def test_missing_dependency_is_an_error(workdir, inputs):
+    steps = workflow(workdir, [{'name': 'a', 'inputs': 'opt.com',
+                                'after': 'nowhere'}])
+    with pytest.raises(gaussian_sub.WorkflowError) as error:
+        order(steps)
+    assert 'waits for unknown step nowhere' in str(error.value)
+
+
+def test_unordered_writers_of_one_checkpoint(workdir, inputs):
+    steps = workflow(workdir, [{'name': 'a', 'inputs': 'opt.com',
+                                'after': []},
+                               {'name': 'b', 'inputs': 'td.com',
+                                'after': []}])
+    with pytest.raises(gaussian_sub.WorkflowError) as error:
+        order(steps)
+    assert 'both write' in str(error.value)
+
+
+@pytest.mark.parametrize('steps, message', [
+    ([{'name': 'a', 'inputs': 'opt.com'}, {'name': 'a', 'inputs': 'td.com'}],
+     'two steps called a'),
+    ([{'name': 'a', 'inputs': 'opt.com', 'colour': 'red'}],
+     'unknown setting(s) colour'),
+    ([{'name': 'a', 'inputs': []}], 'no inputs found'),
+    ([], 'no steps to submit')])
+def test_bad_workflow_files(workdir, inputs, steps, message):
+    with pytest.raises(gaussian_sub.WorkflowError) as error:
+        workflow(workdir, steps)
+    assert message in str(error.value)
+
+
+def test_steps_are_submitted_after_their_dependencies(workdir, inputs,
+                                                      fake_sbatch):
+    steps = workflow(workdir, [{'name': 'opt', 'inputs': 'opt.com'},
+                               {'name': 'freq', 'inputs': 'freq.com'}],
+                     hours=2)
+    results = gaussian_sub.submit_workflow(steps)
+    assert [(step.name, job_id, error)
+            for step, script, job_id, error in results] == \
+        [('opt', '1001', None), ('freq', '1002', None)]
+    with open(str(fake_sbatch / 'calls.log')) as f:
+        calls = [line.split() for line in f]
+    assert calls[0] == ['--parsable', 'opt.sh']
+    assert calls[1] == ['--parsable', '--dependency=afterok:1001',
+                        '--kill-on-invalid-dep=yes', 'freq.sh']
+
+
+def test_failed_step_holds_back_the_rest(workdir, write_input, fake_sbatch):
+    write_input('bad.com', OPT)
+    write_input('freq.com', FREQ)
+    steps = workflow(workdir, [{'name': 'opt', 'inputs': 'bad.com'},
+                               {'name': 'freq', 'inputs': 'freq.com'}])
+    results = gaussian_sub.submit_workflow(steps)
+    assert [job_id for step, script, job_id, error in results] == \
+        [None, None]
+    assert 'step opt failed' in results[1][3]